@@ -0,0 +1,23 @@
+"""add keyset pagination indexes
+
+Revision ID: 0002_pagination_indexes
+Revises: 0001_create_tables
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0002_pagination_indexes'
+down_revision = '0001_create_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_message_session_id_created_at_id', 'message', ['session_id', 'created_at', 'id'])
+    op.create_index('ix_session_user_id_created_at', 'session', ['user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_session_user_id_created_at', table_name='session')
+    op.drop_index('ix_message_session_id_created_at_id', table_name='message')
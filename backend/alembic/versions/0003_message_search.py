@@ -0,0 +1,52 @@
+"""full-text search over message content
+
+SQLite: FTS5 external-content table kept in sync by triggers.
+Postgres: GIN index on to_tsvector('simple', content).
+
+Revision ID: 0003_message_search
+Revises: 0002_pagination_indexes
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0003_message_search'
+down_revision = '0002_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE message_fts USING fts5("
+            "content, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER message_fts_ai AFTER INSERT ON message BEGIN "
+            "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER message_fts_ad AFTER DELETE ON message BEGIN "
+            "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER message_fts_au AFTER UPDATE OF content ON message BEGIN "
+            "INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+            "INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX ix_message_content_fts ON message USING GIN (to_tsvector('simple', content))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS message_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS message_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS message_fts_ai")
+        op.execute("DROP TABLE IF EXISTS message_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_message_content_fts")
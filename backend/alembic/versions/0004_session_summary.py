@@ -0,0 +1,30 @@
+"""add rolling session summaries
+
+Revision ID: 0004_session_summary
+Revises: 0003_message_search
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_session_summary'
+down_revision = '0003_message_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sessionsummary',
+        sa.Column('session_id', sa.Integer(), sa.ForeignKey('session.id'), primary_key=True, nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('through_created_at', sa.DateTime(), nullable=False),
+        sa.Column('through_message_id', sa.Integer(), nullable=False),
+        sa.Column('messages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('sessionsummary')
@@ -0,0 +1,51 @@
+"""add the cold-message archive
+
+Revision ID: 0005_message_archive
+Revises: 0004_session_summary
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_message_archive'
+down_revision = '0004_session_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archivedmessage',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False, nullable=False),
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('content', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        'ix_archivedmessage_session_id_created_at_id', 'archivedmessage', ['session_id', 'created_at', 'id']
+    )
+
+
+def downgrade():
+    # archived rows are moved back first so downgrading loses nothing
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, session_id, role, content, created_at FROM archivedmessage")).fetchall()
+    if rows:
+        import zlib
+
+        bind.execute(
+            sa.text(
+                "INSERT INTO message (id, session_id, role, content, created_at) "
+                "VALUES (:id, :session_id, :role, :content, :created_at)"
+            ),
+            [
+                {"id": r.id, "session_id": r.session_id, "role": r.role,
+                 "content": zlib.decompress(r.content).decode("utf-8"), "created_at": r.created_at}
+                for r in rows
+            ],
+        )
+    op.drop_index('ix_archivedmessage_session_id_created_at_id', table_name='archivedmessage')
+    op.drop_table('archivedmessage')
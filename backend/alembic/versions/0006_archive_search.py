@@ -0,0 +1,60 @@
+"""full-text search over archived messages
+
+Archived content is zlib-compressed, so the index keeps its own copy of
+the text. SQLite: standalone FTS5 table. Postgres: a text table with a
+GIN index on to_tsvector('simple', content). Already archived messages
+are indexed here; the archiver adds new ones.
+
+Revision ID: 0006_archive_search
+Revises: 0005_message_archive
+Create Date: 2026-10-18 00:00:00.000000
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_archive_search'
+down_revision = '0005_message_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE archivedmessage_fts USING fts5("
+            "content, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER archivedmessage_fts_ad AFTER DELETE ON archivedmessage BEGIN "
+            "DELETE FROM archivedmessage_fts WHERE rowid = old.id; END"
+        )
+        insert = sa.text("INSERT INTO archivedmessage_fts (rowid, content) VALUES (:id, :content)")
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE archivedmessage_fts ("
+            "id INTEGER PRIMARY KEY REFERENCES archivedmessage (id) ON DELETE CASCADE, content TEXT NOT NULL)"
+        )
+        op.execute(
+            "CREATE INDEX ix_archivedmessage_fts_content ON archivedmessage_fts "
+            "USING GIN (to_tsvector('simple', content))"
+        )
+        insert = sa.text("INSERT INTO archivedmessage_fts (id, content) VALUES (:id, :content)")
+    else:
+        return
+    rows = bind.execute(sa.text("SELECT id, content FROM archivedmessage")).fetchall()
+    if rows:
+        bind.execute(insert, [{"id": r.id, "content": zlib.decompress(r.content).decode("utf-8")} for r in rows])
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS archivedmessage_fts_ad")
+        op.execute("DROP TABLE IF EXISTS archivedmessage_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP TABLE IF EXISTS archivedmessage_fts")
@@ -0,0 +1,28 @@
+"""make user.username unique
+
+Registration checks for an existing username before inserting, which two
+concurrent requests can both pass; the unique index makes the database
+the arbiter. Fails if duplicate usernames were already registered, which
+have to be merged or renamed first.
+
+Revision ID: 0007_unique_username
+Revises: 0006_archive_search
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0007_unique_username'
+down_revision = '0006_archive_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_user_username', table_name='user')
+    op.create_index('ix_user_username', 'user', ['username'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_username', table_name='user')
+    op.create_index('ix_user_username', 'user', ['username'])
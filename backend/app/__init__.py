@@ -0,0 +1,7 @@
+# Load backend/.env before any module reads its settings at import time
+try:
+    from dotenv import load_dotenv
+except ModuleNotFoundError:  # settings come from the real environment (e.g. on Render)
+    pass
+else:
+    load_dotenv()
@@ -0,0 +1,194 @@
+"""
+Moves cold messages out of the hot `message` table.
+
+Messages older than ARCHIVE_AFTER_DAYS, and every message of a session
+with nothing newer than ARCHIVE_INACTIVE_DAYS, are copied into
+`archivedmessage` with zlib-compressed content and deleted from
+`message`, keeping their ids and timestamps. Both rules archive a
+prefix of a session in (created_at, id) order, so crud.get_messages can
+serve the archived part first and the hot part after it, decompressing
+only the rows it returns. Their text also goes into archivedmessage_fts
+(search.index_archived), so /api/search keeps finding them.
+
+Run one pass by hand from backend/:
+    python -m app.archive
+"""
+import asyncio
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from . import db
+from .models import ArchivedMessage, Message
+from .search import index_archived
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+# 0 disables a rule
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_INACTIVE_DAYS = float(os.getenv("ARCHIVE_INACTIVE_DAYS", "30"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+# messages moved per transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_COMPRESS_LEVEL = int(os.getenv("ARCHIVE_COMPRESS_LEVEL", "6"))
+
+# sessions per IN (...) list in the inactive-session pass
+_SESSION_CHUNK = 500
+
+
+def compress_content(content: str, level: int = ARCHIVE_COMPRESS_LEVEL) -> bytes:
+    return zlib.compress(content.encode("utf-8"), level)
+
+
+def decompress_content(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+class MessageArchiver:
+    def __init__(
+        self,
+        after_days: float = ARCHIVE_AFTER_DAYS,
+        inactive_days: float = ARCHIVE_INACTIVE_DAYS,
+        interval: float = ARCHIVE_INTERVAL,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        session_factory: Optional[Callable] = None,
+        enabled: bool = ARCHIVE_ENABLED,
+    ):
+        self.after_days = after_days
+        self.inactive_days = inactive_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._session_factory = session_factory
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.archived_messages = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.last_run_seconds = 0.0
+        self.last_run_archived = 0
+
+    async def _move(self, factory, where, max_id: int) -> int:
+        """Archive the hot rows matching `where`, `batch_size` per transaction, in id order."""
+        messages = Message.__table__
+        moved, last_id = 0, 0
+        while True:
+            async with factory() as session:
+                rows = (
+                    await session.execute(
+                        select(messages)
+                        .where(where, messages.c.id > last_id, messages.c.id < max_id)
+                        .order_by(messages.c.id)
+                        .limit(self.batch_size)
+                    )
+                ).all()
+                if not rows:
+                    return moved
+                now = datetime.utcnow()
+                archived = [
+                    {
+                        "id": r.id,
+                        "session_id": r.session_id,
+                        "role": r.role,
+                        "content": compress_content(r.content),
+                        "created_at": r.created_at,
+                        "archived_at": now,
+                    }
+                    for r in rows
+                ]
+                await session.execute(insert(ArchivedMessage.__table__), archived)
+                await index_archived(session, ({"id": r.id, "content": r.content} for r in rows))
+                await session.execute(delete(messages).where(messages.c.id.in_([r.id for r in rows])))
+                await session.commit()
+            last_id = rows[-1].id
+            moved += len(rows)
+            self.raw_bytes += sum(len(r.content.encode("utf-8")) for r in rows)
+            self.stored_bytes += sum(len(a["content"]) for a in archived)
+
+    async def archive_once(self, now: Optional[datetime] = None) -> int:
+        """One pass over both rules; returns how many messages were archived."""
+        factory = self._session_factory or db.AsyncSessionLocal
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        async with factory() as session:
+            max_id = (await session.execute(select(func.max(Message.id)))).scalar()
+            inactive = []
+            if self.inactive_days > 0:
+                inactive = (
+                    await session.execute(
+                        select(Message.session_id)
+                        .group_by(Message.session_id)
+                        .having(func.max(Message.created_at) < now - timedelta(days=self.inactive_days))
+                    )
+                ).scalars().all()
+        moved = 0
+        if max_id is not None:
+            # the newest row stays hot: SQLite hands out max(id) + 1, which must not reuse an archived id
+            if self.after_days > 0:
+                moved += await self._move(factory, Message.created_at < now - timedelta(days=self.after_days), max_id)
+            for i in range(0, len(inactive), _SESSION_CHUNK):
+                moved += await self._move(factory, Message.session_id.in_(inactive[i : i + _SESSION_CHUNK]), max_id)
+        self.runs += 1
+        self.archived_messages += moved
+        self.last_run_archived = moved
+        self.last_run_seconds = round(time.perf_counter() - started, 3)
+        if moved:
+            logger.info("archived %d messages in %.1fs", moved, self.last_run_seconds)
+        return moved
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.archive_once()
+            except Exception:
+                self.failures += 1
+                logger.exception("message archival failed")
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # a pass is batch-transactional: cancelling mid-run leaves no half-moved batch
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "runs": self.runs,
+            "failures": self.failures,
+            "archived_messages": self.archived_messages,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "reclaimed_bytes": self.raw_bytes - self.stored_bytes,
+            "last_run_archived": self.last_run_archived,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+archiver = MessageArchiver()
+
+
+if __name__ == "__main__":
+    import json
+
+    async def _once() -> dict:
+        await archiver.archive_once()
+        await db.get_engine().dispose()
+        return archiver.stats()
+
+    print(json.dumps(asyncio.run(_once()), indent=2))
@@ -1,36 +1,149 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException
 from .db import get_session
-from .crud import get_user_by_username
+from .crud import get_user_by_username, update_user_password
 from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
 from .models import User
+from .usercache import auth_cache
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2 cost parameters; hashes made with other values are upgraded on login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Threads doing hash work off the event loop (argon2-cffi releases the GIL)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+_pwd_context = None
+_dummy_hash: Optional[str] = None
+
+
+def get_pwd_context():
+    """Argon2 CryptContext, built on first use: passlib and argon2 stay out of the import path."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(
+            schemes=["argon2"],
+            deprecated="auto",
+            argon2__time_cost=ARGON2_TIME_COST,
+            argon2__memory_cost=ARGON2_MEMORY_COST,
+            argon2__parallelism=ARGON2_PARALLELISM,
+        )
+    return _pwd_context
+
+
+def __getattr__(name: str):
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _encode_token(claims: dict) -> str:
+    # python-jose pulls in `cryptography` (~40 ms); imported when the first token is handled
+    from jose import jwt
+
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _decode_token(token: str) -> Optional[dict]:
+    """Claims of a correctly signed, unexpired token, else None."""
+    from jose import JWTError, jwt
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True)
+        _hash_executor = None
 
 class TokenData(BaseModel):
     username: Optional[str] = None
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
     except Exception:
         return False
 
 
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return get_pwd_context().verify_and_update(plain_password, hashed_password)
+    except Exception:
+        return False, None
+
+
+async def _run_in_hash_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the bounded hash pool, so the event loop keeps serving."""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash) where new_hash is set when the stored hash uses outdated Argon2 parameters."""
+    return await _run_in_hash_pool(_verify_and_update, plain_password, hashed_password)
+
+
+async def _get_dummy_hash() -> str:
+    """A hash with the current parameters that no password matches, made once."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await get_password_hash_async(os.urandom(16).hex())
+    return _dummy_hash
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    """Check a login; re-hash with the current parameters when the stored hash needs_update."""
+    user = await get_user_by_username(db, username)
+    if user is None:
+        # verify anyway, so an unknown username takes as long as a wrong password
+        await verify_and_update_async(password, await _get_dummy_hash())
+        return None
+    valid, new_hash = await verify_and_update_async(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        user = await update_user_password(db, user.id, new_hash)
+    return user
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -38,15 +151,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return _encode_token(to_encode)
 
 
 def create_password_reset_token(username: str, expires_minutes: int = 15) -> str:
     to_encode = {"sub": username}
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
     to_encode.update({"exp": expire, "reset": True})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return _encode_token(to_encode)
 
 
 def verify_password_reset_token(token: str) -> str:
@@ -54,15 +166,20 @@ def verify_password_reset_token(token: str) -> str:
         status_code=400,
         detail="Invalid or expired reset token",
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        is_reset = payload.get("reset", False)
-        if not username or not is_reset:
-            raise credentials_exception
-        return username
-    except JWTError:
+    payload = _decode_token(token)
+    if payload is None:
+        raise credentials_exception
+    username: str = payload.get("sub")
+    is_reset = payload.get("reset", False)
+    if not username or not is_reset:
         raise credentials_exception
+    return username
+
+
+def username_from_token(token: str) -> Optional[str]:
+    """Subject of a valid access token, without touching the database."""
+    payload = _decode_token(token)
+    return payload.get("sub") if payload is not None else None
 
 
 async def get_current_user(token: str = Depends(lambda: None), db: AsyncSession = Depends(get_session)) -> User:
@@ -78,18 +195,26 @@ async def get_user_from_token(token: str, db: AsyncSession) -> Optional[User]:
         status_code=401,
         detail="Could not validate credentials",
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    username = auth_cache.get_subject(token)
+    if username is None:
+        payload = _decode_token(token)
+        subject: Optional[str] = payload.get("sub") if payload is not None else None
+        if subject is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = await get_user_by_username(db, token_data.username)
+        token_data = TokenData(username=subject)
+        username = token_data.username
+        auth_cache.put_subject(token, username, payload.get("exp"))
+
+    cached = auth_cache.get_user(username)
+    if cached is not None:
+        # attach a copy to this request's session without a SELECT
+        return await db.merge(cached, load=False)
+    user = await get_user_by_username(db, username)
     if user is None:
         raise credentials_exception
-    return user
+    db.expunge(user)
+    auth_cache.put_user(username, user)
+    return await db.merge(user, load=False)
 
 # Helper for FastAPI header-based dependency
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
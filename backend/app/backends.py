@@ -0,0 +1,211 @@
+"""
+Pool of Ollama hosts for llm_service.
+
+Requests go to the host with the fewest outstanding requests among those
+that serve the model (per their /api/tags) and whose circuit breaker is
+closed. LLM_BREAKER_FAILURES consecutive failures eject a host for
+LLM_BREAKER_COOLDOWN seconds; after that one trial request, or a passing
+background health check, decides whether it comes back.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Iterable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# comma-separated base URLs; empty -> the single OLLAMA_HOST
+OLLAMA_HOSTS = os.getenv("OLLAMA_HOSTS", "")
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+# extra hosts tried when one fails before anything was relayed
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "1"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "15"))
+
+
+class NoBackendAvailable(Exception):
+    """Every host is ejected, already tried, or lacks the requested model."""
+
+
+def configured_hosts() -> list[str]:
+    hosts = [h.strip() for h in OLLAMA_HOSTS.split(",") if h.strip()]
+    return hosts or [os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")]
+
+
+def model_name(name: str) -> str:
+    """Ollama treats a bare model name as its :latest tag."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class Backend:
+    def __init__(self, url: str, failure_threshold: int, cooldown: float):
+        self.url = url.rstrip("/")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.models: Optional[set[str]] = None  # unknown until the first /api/tags answer
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.last_error = ""
+        self.last_check = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model_name(model) in self.models
+
+    def begin(self) -> bool:
+        """Count a request against the host; returns True if it is the half-open trial, to pass to end()."""
+        trial = self.state == "half_open"
+        if trial:
+            self.trial_in_flight = True
+        self.outstanding += 1
+        self.requests += 1
+        return trial
+
+    def end(self, ok: Optional[bool], error: str = "", trial: bool = False) -> None:
+        """ok=None: the request ended without saying anything about the host (e.g. client gone)."""
+        self.outstanding -= 1
+        if trial:
+            # requests that started before the host was ejected don't end its trial
+            self.trial_in_flight = False
+        if ok is True:
+            self.record_success()
+        elif ok is False:
+            self.record_failure(error)
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.opened_at is not None:
+            logger.info("LLM backend %s is back", self.url)
+            self.opened_at = None
+
+    def record_failure(self, error: str) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        # a failed trial re-opens at once; a closed breaker opens at the threshold
+        if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.ejections += 1
+                logger.warning("ejecting LLM backend %s after %d failures: %s", self.url, self.consecutive_failures, error)
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "up": int(self.state == "closed"),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "models": sorted(self.models) if self.models is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    def __init__(
+        self,
+        hosts: Iterable[str],
+        failure_threshold: int = LLM_BREAKER_FAILURES,
+        cooldown: float = LLM_BREAKER_COOLDOWN,
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        health_timeout: float = OLLAMA_HEALTH_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._task: Optional[asyncio.Task] = None
+        self.reset(hosts)
+
+    def reset(self, hosts: Optional[Iterable[str]] = None) -> None:
+        """Forget all host state, optionally switching to a new host list."""
+        urls = list(hosts) if hosts is not None else [b.url for b in self.backends]
+        self.backends = [Backend(url, self.failure_threshold, self.cooldown) for url in urls]
+        self.failovers = 0
+        self.unavailable = 0
+        self._rr = 0
+
+    def _candidates(self, model: str, exclude: Iterable[Backend]) -> list[Backend]:
+        return [b for b in self.backends if b not in exclude and b.available() and b.serves(model)]
+
+    def has_candidate(self, model: str, exclude: Iterable[Backend] = ()) -> bool:
+        return bool(self._candidates(model, exclude))
+
+    def pick(self, model: str, exclude: Iterable[Backend] = ()) -> Backend:
+        """Least outstanding requests wins; ties rotate so idle hosts share the load."""
+        candidates = self._candidates(model, list(exclude))
+        if not candidates:
+            self.unavailable += 1
+            raise NoBackendAvailable(f"no available LLM backend serves model {model!r}")
+        self._rr = (self._rr + 1) % len(candidates)
+        candidates = candidates[self._rr:] + candidates[: self._rr]
+        return min(candidates, key=lambda b: b.outstanding)
+
+    async def check(self, client: httpx.AsyncClient, backend: Backend) -> None:
+        backend.last_check = time.time()
+        try:
+            r = await client.get(f"{backend.url}/api/tags", timeout=self.health_timeout)
+            r.raise_for_status()
+            backend.models = {model_name(m.get("name") or m.get("model", "")) for m in r.json().get("models", [])}
+        except (httpx.HTTPError, ValueError) as e:
+            backend.record_failure(f"health check: {e!r}")
+            return
+        backend.record_success()
+
+    async def check_all(self, client: httpx.AsyncClient) -> None:
+        await asyncio.gather(*(self.check(client, b) for b in self.backends))
+
+    async def _run(self, get_client: Callable[[], httpx.AsyncClient]) -> None:
+        while True:
+            try:
+                await self.check_all(get_client())
+            except Exception:
+                logger.exception("LLM backend health check failed")
+            await asyncio.sleep(self.health_interval)
+
+    def start(self, get_client: Callable[[], httpx.AsyncClient]) -> None:
+        if self._task is None and self.health_interval > 0:
+            self._task = asyncio.create_task(self._run(get_client))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "hosts": len(self.backends),
+            "available": sum(1 for b in self.backends if b.available()),
+            "outstanding": sum(b.outstanding for b in self.backends),
+            "failovers": self.failovers,
+            "unavailable": self.unavailable,
+            "host": {b.url: b.stats() for b in self.backends},
+        }
+
+
+backend_pool = BackendPool(configured_hosts())
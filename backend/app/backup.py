@@ -0,0 +1,293 @@
+"""
+Online backups of the backend's database.
+
+SQLite is copied with the online backup API, BACKUP_STEP_PAGES pages at
+a time with BACKUP_STEP_SLEEP seconds between steps, so the app's
+writers only ever wait for one short step; the copy is then gzipped.
+If writers keep restarting the copy (every write by another connection
+does), it is finished in a single step after BACKUP_MAX_RESTARTS, which
+under WAL still does not block writers. Postgres is streamed from
+`pg_dump --format=custom` straight to disk.
+
+Every backup gets a sha256sum-compatible `.sha256` file, and only the
+BACKUP_KEEP newest are kept. `verify` checks the checksum and restores
+into a scratch location (SQLite: integrity_check and row counts;
+Postgres: pg_restore --list).
+
+From backend/:
+    python -m app.backup create
+    python -m app.backup verify backups/backup-20260101T000000Z.sqlite.gz [--restore-to restored.db]
+    python -m app.backup list
+"""
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.engine import URL, make_url
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# newest backups kept by rotation; 0 keeps all
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_STEP_PAGES = int(os.getenv("BACKUP_STEP_PAGES", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.05"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "20"))
+BACKUP_COMPRESS_LEVEL = int(os.getenv("BACKUP_COMPRESS_LEVEL", "6"))
+PG_DUMP = os.getenv("PG_DUMP", "pg_dump")
+PG_RESTORE = os.getenv("PG_RESTORE", "pg_restore")
+
+SQLITE_SUFFIX = ".sqlite.gz"
+POSTGRES_SUFFIX = ".dump"
+_CHUNK = 1 << 20
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_checksum(path: Path, digest: str) -> None:
+    Path(f"{path}.sha256").write_text(f"{digest}  {path.name}\n")
+
+
+def backups(out_dir: Path) -> list[Path]:
+    """Finished backups in `out_dir`, oldest first."""
+    if not out_dir.is_dir():
+        return []
+    return sorted(
+        p for p in out_dir.iterdir() if p.name.startswith("backup-") and p.name.endswith((SQLITE_SUFFIX, POSTGRES_SUFFIX))
+    )
+
+
+def rotate(out_dir: Path, keep: int = BACKUP_KEEP) -> list[Path]:
+    """Delete all but the `keep` newest backups (and their checksums); returns what was removed."""
+    if keep <= 0:
+        return []
+    removed = backups(out_dir)[:-keep]
+    for path in removed:
+        path.unlink()
+        Path(f"{path}.sha256").unlink(missing_ok=True)
+    return removed
+
+
+def backup_sqlite(
+    path: str,
+    out_dir: Path,
+    pages: int = BACKUP_STEP_PAGES,
+    sleep: float = BACKUP_STEP_SLEEP,
+    max_restarts: int = BACKUP_MAX_RESTARTS,
+    level: int = BACKUP_COMPRESS_LEVEL,
+) -> dict:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    name = f"backup-{_timestamp()}"
+    target = out_dir / f"{name}{SQLITE_SUFFIX}"
+    steps = restarts = 0
+    last_remaining: Optional[int] = None
+
+    def progress(status, remaining, total):
+        nonlocal steps, restarts, last_remaining
+        steps += 1
+        # a write through another connection restarts the copy from the first page
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _Restarted()
+        last_remaining = remaining
+        # sqlite3 only sleeps after a busy step; pausing here is what lets writers in between steps
+        if remaining and sleep > 0:
+            time.sleep(sleep)
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=out_dir) as scratch:
+        copy = Path(scratch) / f"{name}.db"
+        src = sqlite3.connect(path)
+        dst = sqlite3.connect(copy)
+        try:
+            try:
+                src.backup(dst, pages=pages, progress=progress)
+            except _Restarted:
+                logger.warning("backup restarted %d times under write load; finishing in one step", restarts)
+                src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        partial = out_dir / f".{target.name}.partial"
+        with open(copy, "rb") as f, gzip.open(partial, "wb", compresslevel=level) as gz:
+            shutil.copyfileobj(f, gz, _CHUNK)
+        size = copy.stat().st_size
+    partial.rename(target)
+    digest = _sha256(target)
+    _write_checksum(target, digest)
+    return {
+        "path": str(target),
+        "sha256": digest,
+        "database_bytes": size,
+        "bytes": target.stat().st_size,
+        "steps": steps,
+        "restarts": restarts,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _libpq(url) -> tuple[str, dict]:
+    """A pg_dump-friendly URL without the password, which goes in PGPASSWORD instead of argv."""
+    env = dict(os.environ)
+    if url.password:
+        env["PGPASSWORD"] = str(url.password)
+    plain = URL.create("postgresql", url.username, None, url.host, url.port, url.database, url.query)
+    return plain.render_as_string(hide_password=False), env
+
+
+def backup_postgres(url, out_dir: Path, level: int = BACKUP_COMPRESS_LEVEL) -> dict:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    target = out_dir / f"backup-{_timestamp()}{POSTGRES_SUFFIX}"
+    partial = out_dir / f".{target.name}.partial"
+    conn_url, env = _libpq(url)
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    # pg_dump reads one consistent snapshot without locking out writers; its output is hashed as it streams
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(
+            [PG_DUMP, "--format=custom", f"--compress={level}", "--no-owner", conn_url],
+            stdout=subprocess.PIPE, stderr=errors, env=env,
+        )
+        try:
+            with open(partial, "wb") as out:
+                while chunk := proc.stdout.read(_CHUNK):
+                    digest.update(chunk)
+                    out.write(chunk)
+            if proc.wait() != 0:
+                errors.seek(0)
+                raise BackupError(f"pg_dump failed: {errors.read().decode('utf-8', 'replace').strip()}")
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            partial.unlink(missing_ok=True)
+            raise
+    partial.rename(target)
+    _write_checksum(target, digest.hexdigest())
+    return {
+        "path": str(target),
+        "sha256": digest.hexdigest(),
+        "bytes": target.stat().st_size,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def create(database_url: Optional[str] = None, out_dir: Optional[str] = None, keep: int = BACKUP_KEEP) -> dict:
+    """Back up the database at `database_url` (default: the app's) and rotate old backups."""
+    if database_url is None:
+        from .db import DATABASE_URL as database_url
+    url = make_url(database_url)
+    out = Path(out_dir or BACKUP_DIR)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            raise BackupError("an in-memory SQLite database cannot be backed up")
+        if not os.path.exists(url.database):
+            raise BackupError(f"no database at {url.database}")
+        result = backup_sqlite(url.database, out)
+    elif backend == "postgresql":
+        result = backup_postgres(url, out)
+    else:
+        raise BackupError(f"no backup method for {backend}")
+    result["rotated"] = [str(p) for p in rotate(out, keep)]
+    return result
+
+
+def verify_checksum(path: Path) -> str:
+    recorded = Path(f"{path}.sha256")
+    if not recorded.exists():
+        raise BackupError(f"{recorded.name} is missing")
+    expected = recorded.read_text().split()[0]
+    actual = _sha256(path)
+    if actual != expected:
+        raise BackupError(f"checksum mismatch for {path.name}: {actual} != {expected}")
+    return actual
+
+
+def verify(path: str, restore_to: Optional[str] = None) -> dict:
+    """Check the checksum and that the backup restores; SQLite backups can be kept at `restore_to`."""
+    backup = Path(path)
+    digest = verify_checksum(backup)
+    if backup.name.endswith(POSTGRES_SUFFIX):
+        listing = subprocess.run([PG_RESTORE, "--list", str(backup)], capture_output=True, text=True)
+        if listing.returncode != 0:
+            raise BackupError(f"pg_restore cannot read {backup.name}: {listing.stderr.strip()}")
+        tables = [line.split()[-2] for line in listing.stdout.splitlines() if " TABLE DATA " in line]
+        return {"path": path, "sha256": digest, "ok": True, "tables": tables}
+
+    with tempfile.TemporaryDirectory() as scratch:
+        restored = Path(scratch) / "restored.db"
+        with gzip.open(backup, "rb") as gz, open(restored, "wb") as f:
+            shutil.copyfileobj(gz, f, _CHUNK)
+        conn = sqlite3.connect(restored)
+        try:
+            check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            names = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE '%VIRTUAL%'"
+            )]
+            rows = {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in names}
+        finally:
+            conn.close()
+        if check != "ok":
+            raise BackupError(f"integrity_check failed for {backup.name}: {check}")
+        if restore_to:
+            shutil.move(str(restored), restore_to)
+    return {"path": path, "sha256": digest, "ok": True, "rows": rows, "restored_to": restore_to}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description="online backups of the backend database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_create = sub.add_parser("create", help="back up DATABASE_URL and rotate old backups")
+    p_create.add_argument("--url", default=None, help="database URL (default: DATABASE_URL)")
+    p_create.add_argument("--dir", default=None, help=f"backup directory (default: {BACKUP_DIR})")
+    p_create.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    p_verify = sub.add_parser("verify", help="check a backup's checksum and that it restores")
+    p_verify.add_argument("path")
+    p_verify.add_argument("--restore-to", default=None, help="SQLite: keep the restored database here")
+    p_list = sub.add_parser("list", help="list backups, oldest first")
+    p_list.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            result = create(args.url, args.dir, args.keep)
+        elif args.command == "verify":
+            result = verify(args.path, args.restore_to)
+        else:
+            result = [str(p) for p in backups(Path(args.dir or BACKUP_DIR))]
+    except BackupError as e:
+        print(f"backup: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "300"))
+
+
+def make_key(model: str, messages: list[dict]) -> str:
+    """Stable key for a model + normalized message list."""
+    raw = json.dumps([model, messages], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Minimal store interface so the in-process LRU can be swapped for a shared one (e.g. redis)."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Bounded LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int = CHAT_CACHE_MAX_ENTRIES, ttl: float = CHAT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one in-flight task."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield so one cancelled waiter doesn't abort the shared upstream call
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
+
+
+response_cache: ResponseCache = InMemoryResponseCache()
+single_flight = SingleFlight()
+
+
+async def get_or_compute(key: str, fn: Callable[[], Awaitable[str]], cacheable: Callable[[str], bool]) -> str:
+    value = await response_cache.get(key)
+    if value is not None:
+        return value
+
+    async def fill() -> str:
+        result = await fn()
+        if cacheable(result):
+            await response_cache.set(key, result)
+        return result
+
+    return await single_flight.do(key, fill)
+
+
+def stats() -> dict:
+    return {"enabled": CHAT_CACHE_ENABLED, **response_cache.stats(), **single_flight.stats()}
@@ -0,0 +1,129 @@
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bodies smaller than this go out as-is; the headers would eat most of the gain
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+_COMPRESSIBLE = (b"application/json", b"text/", b"application/x-ndjson")
+# bodies above this are compressed on a worker thread instead of the event loop
+_OFFLOAD_SIZE = 256 * 1024
+
+_counters = {"compressed": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def _accepted(accept_encoding: str) -> set:
+    codings = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        codings.add(coding.strip())
+    return codings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    codings = _accepted(accept_encoding)
+    if brotli is not None and "br" in codings:
+        return "br"
+    if "gzip" in codings or "*" in codings:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing complete (single-message) response
+    bodies with brotli when installed and accepted, else gzip. Streaming
+    responses are never buffered: anything sent in several body messages
+    passes through untouched, and `exempt_paths` are skipped outright.
+    """
+
+    def __init__(self, app, exempt_paths: tuple = (), minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.exempt_paths = frozenset(exempt_paths)
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def wrapped_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            if message.get("more_body") or not self._compressible(start, body):
+                await send(start)
+                await send(message)
+                return
+            if len(body) > _OFFLOAD_SIZE:
+                packed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                packed = compress(body, encoding)
+            headers = [(k, v) for k, v in start["headers"] if k not in (b"content-length", b"vary")]
+            vary = [v for k, v in start["headers"] if k == b"vary"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(packed)).encode()),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            _counters["compressed"] += 1
+            _counters["bytes_in"] += len(body)
+            _counters["bytes_out"] += len(packed)
+            await send({**start, "headers": headers})
+            await send({**message, "body": packed})
+
+        await self.app(scope, receive, wrapped_send)
+
+    def _compressible(self, start: dict, body: bytes) -> bool:
+        if len(body) < self.minimum_size or start["status"] in (204, 206, 304):
+            return False
+        content_type = b""
+        for name, value in start["headers"]:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(_COMPRESSIBLE)
+
+
+def stats() -> dict:
+    return dict(_counters)
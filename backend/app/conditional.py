@@ -0,0 +1,44 @@
+"""
+Validators for conditional GETs on the listing endpoints.
+
+Listings are versioned by a cheap aggregate, (count, max id, max created_at),
+read from the pagination indexes, so a matching If-None-Match is answered
+304 before any rows are loaded or serialized. The count catches deletions
+that the maxima would miss.
+
+Only an ETag is sent, no Last-Modified: HTTP dates have one-second
+precision and a delete never moves max(created_at), so If-Modified-Since
+would answer 304 for a listing that changed.
+"""
+import hashlib
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# browsers keep the body but must revalidate every time; never shared between users
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    # weak: the same listing may be sent gzip'd, brotli'd or plain
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    return _etag_matches(request.headers.get("if-none-match", ""), etag)
+
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag))
@@ -1,13 +1,49 @@
+import base64
+from datetime import datetime
+from sqlalchemy import func, insert, tuple_
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from .models import Session as ChatSession, Message, User
-from typing import List, Optional
+from .archive import decompress_content
+from .models import ArchivedMessage, Session as ChatSession, Message, SessionSummary, User
+from .usercache import auth_cache
+from typing import List, Optional, Sequence, Tuple
+
+# Keyset position: (created_at, id) of the last row on the previous page
+Cursor = Tuple[datetime, int]
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+async def _persist(db: AsyncSession, *objs):
+    """
+    Insert objects and commit in one go. The flush fills in primary keys
+    (INSERT .. RETURNING on Postgres, lastrowid on SQLite) and timestamps come
+    from the model defaults, so no refresh() round trip is needed; objects are
+    detached before commit so expire_on_commit doesn't throw that away.
+    """
+    db.add_all(objs)
+    await db.flush()
+    for obj in objs:
+        db.expunge(obj)
+    await db.commit()
+
 
 async def create_user(db: AsyncSession, username: str, hashed_password: str, email: Optional[str] = None) -> User:
     user = User(username=username, hashed_password=hashed_password, email=email)
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
+    await _persist(db, user)
     return user
 
 async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
@@ -20,15 +56,31 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
 
 async def create_session(db: AsyncSession, name: str, user_id: Optional[int] = None) -> ChatSession:
     session = ChatSession(name=name, user_id=user_id)
-    db.add(session)
-    await db.commit()
-    await db.refresh(session)
+    await _persist(db, session)
     return session
 
-async def get_sessions(db: AsyncSession, user_id: Optional[int] = None) -> List[ChatSession]:
-    stmt = select(ChatSession).order_by(ChatSession.created_at.desc())
+async def create_session_with_message(
+    db: AsyncSession, name: str, role: str, content: str, user_id: Optional[int] = None
+) -> Tuple[ChatSession, Message]:
+    """Create a session and its first message in a single transaction."""
+    session = ChatSession(name=name, user_id=user_id)
+    db.add(session)
+    await db.flush()
+    msg = Message(session_id=session.id, role=role, content=content)
+    await _persist(db, session, msg)
+    return session, msg
+
+async def get_sessions(
+    db: AsyncSession, user_id: Optional[int] = None, limit: Optional[int] = None, before: Optional[Cursor] = None
+) -> List[ChatSession]:
+    """Newest first. Pass the (created_at, id) of the last row seen as `before` for the next page."""
+    stmt = select(ChatSession).order_by(ChatSession.created_at.desc(), ChatSession.id.desc())
     if user_id:
         stmt = stmt.where(ChatSession.user_id == user_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(ChatSession.created_at, ChatSession.id) < tuple_(*before))
+    if limit is not None:
+        stmt = stmt.limit(limit)
     q = await db.execute(stmt)
     return q.scalars().all()
 
@@ -43,16 +95,131 @@ async def get_session(db: AsyncSession, session_id: int) -> Optional[ChatSession
     q = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
     return q.scalars().first()
 
+# (row count, max id, max created_at): changes whenever a listing's content would
+ListingVersion = Tuple[int, Optional[int], Optional[datetime]]
+
+
+async def get_sessions_version(db: AsyncSession, user_id: int) -> ListingVersion:
+    stmt = select(func.count(), func.max(ChatSession.id), func.max(ChatSession.created_at)).where(
+        ChatSession.user_id == user_id
+    )
+    return tuple((await db.execute(stmt)).one())
+
+async def get_messages_version(db: AsyncSession, session_id: int) -> ListingVersion:
+    versions = []
+    for model in (Message, ArchivedMessage):
+        stmt = select(func.count(), func.max(model.id), func.max(model.created_at)).where(
+            model.session_id == session_id
+        )
+        versions.append(tuple((await db.execute(stmt)).one()))
+    (hot, hot_id, hot_at), (cold, cold_id, cold_at) = versions
+    # archived rows are always older, so only an all-archived session takes its maxima from the archive
+    return hot + cold, hot_id if hot_id is not None else cold_id, hot_at if hot_at is not None else cold_at
+
 async def create_message(db: AsyncSession, session_id: int, role: str, content: str) -> Message:
     msg = Message(session_id=session_id, role=role, content=content)
-    db.add(msg)
-    await db.commit()
-    await db.refresh(msg)
+    await _persist(db, msg)
     return msg
 
-async def get_messages(db: AsyncSession, session_id: int) -> List[Message]:
-    q = await db.execute(select(Message).where(Message.session_id == session_id).order_by(Message.created_at))
-    return q.scalars().all()
+async def create_messages(db: AsyncSession, messages: Sequence[dict]) -> List[Message]:
+    """
+    Insert many messages (dicts with session_id, role, content) in one transaction.
+    Dialects with multi-row RETURNING (Postgres) use a single INSERT; others
+    fall back to an ORM flush, which still avoids a refresh per row.
+    """
+    if not messages:
+        return []
+    objs = [Message(session_id=m["session_id"], role=m["role"], content=m["content"]) for m in messages]
+    if getattr(db.bind.dialect, "full_returning", False):
+        table = Message.__table__
+        rows = [o.dict() for o in objs]
+        for row in rows:
+            row.pop("id", None)
+        q = await db.execute(insert(table).values(rows).returning(*table.c))
+        created = [Message(**dict(r._mapping)) for r in q]
+        await db.commit()
+        return sorted(created, key=lambda m: m.id)
+    await _persist(db, *objs)
+    return objs
+
+async def create_message_pair(
+    db: AsyncSession, session_id: int, user_content: str, assistant_content: str
+) -> Tuple[Message, Message]:
+    """Write a user prompt and the assistant reply atomically."""
+    user_msg, assistant_msg = await create_messages(
+        db,
+        [
+            {"session_id": session_id, "role": "user", "content": user_content},
+            {"session_id": session_id, "role": "assistant", "content": assistant_content},
+        ],
+    )
+    return user_msg, assistant_msg
+
+def _unarchive(row: ArchivedMessage) -> Message:
+    return Message(
+        id=row.id, session_id=row.session_id, role=row.role, content=decompress_content(row.content), created_at=row.created_at
+    )
+
+def _page(model, session_id: int, limit: Optional[int], after: Optional[Cursor], newest_first: bool = False):
+    order = (model.created_at.desc(), model.id.desc()) if newest_first else (model.created_at, model.id)
+    stmt = select(model).where(model.session_id == session_id).order_by(*order)
+    if after is not None:
+        stmt = stmt.where(tuple_(model.created_at, model.id) > tuple_(*after))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+async def get_messages(
+    db: AsyncSession, session_id: int, limit: Optional[int] = None, after: Optional[Cursor] = None
+) -> List[Message]:
+    """
+    Oldest first. Pass the (created_at, id) of the last row seen as `after` for the next page.
+    Archived messages always precede the hot ones, so they are read first and
+    only the rows returned are decompressed.
+    """
+    rows = [_unarchive(r) for r in (await db.execute(_page(ArchivedMessage, session_id, limit, after))).scalars()]
+    if limit is not None:
+        limit -= len(rows)
+        if limit == 0:
+            return rows
+    q = await db.execute(_page(Message, session_id, limit, after))
+    return rows + q.scalars().all()
+
+async def get_recent_messages(db: AsyncSession, session_id: int, limit: int) -> List[Message]:
+    """The last `limit` messages of a session, oldest first."""
+    rows = (await db.execute(_page(Message, session_id, limit, None, newest_first=True))).scalars().all()
+    if len(rows) < limit:
+        older = await db.execute(_page(ArchivedMessage, session_id, limit - len(rows), None, newest_first=True))
+        rows += [_unarchive(r) for r in older.scalars()]
+    return list(reversed(rows))
+
+async def get_messages_by_ids(db: AsyncSession, ids: Sequence[int]) -> List[Message]:
+    """The messages with these ids, hot or archived, oldest first; ids that no longer exist are skipped."""
+    if not ids:
+        return []
+    rows = (await db.execute(select(Message).where(Message.id.in_(ids)))).scalars().all()
+    if len(rows) < len(ids):
+        archived = await db.execute(select(ArchivedMessage).where(ArchivedMessage.id.in_(ids)))
+        rows += [_unarchive(r) for r in archived.scalars()]
+    return sorted(rows, key=lambda m: (m.created_at, m.id))
+
+async def get_summary(db: AsyncSession, session_id: int) -> Optional[SessionSummary]:
+    return await db.get(SessionSummary, session_id)
+
+async def save_summary(
+    db: AsyncSession, session_id: int, content: str, through: Cursor, folded: int
+) -> SessionSummary:
+    """Create or extend the session's summary to cover messages up to `through`."""
+    summary = await db.get(SessionSummary, session_id)
+    if summary is None:
+        summary = SessionSummary(session_id=session_id, content=content, through_created_at=through[0], through_message_id=through[1])
+    summary.content = content
+    summary.through_created_at, summary.through_message_id = through
+    summary.messages += folded
+    summary.updated_at = datetime.utcnow()
+    db.add(summary)
+    await db.commit()
+    return summary
 
 async def update_user_password(db: AsyncSession, user_id: int, hashed_password: str) -> User:
     user = await db.get(User, user_id)
@@ -62,4 +229,15 @@ async def update_user_password(db: AsyncSession, user_id: int, hashed_password:
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    auth_cache.invalidate_user(user_id=user_id, username=user.username)
     return user
+
+async def delete_user(db: AsyncSession, user_id: int) -> bool:
+    user = await db.get(User, user_id)
+    if not user:
+        return False
+    username = user.username
+    await db.delete(user)
+    await db.commit()
+    auth_cache.invalidate_user(user_id=user_id, username=username)
+    return True
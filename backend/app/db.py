@@ -1,20 +1,144 @@
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from sqlalchemy.orm import sessionmaker
-from typing import AsyncGenerator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import AsyncGenerator, Optional
 import os
 
+from . import metrics
+from .search import ensure_search_index
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./dev.db")
-engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=False, future=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+# Connection pool (server databases, and file-backed SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _flag("DB_POOL_PRE_PING", "true")
+DB_ECHO = _flag("DB_ECHO", "false")
+
+# SQLite pragmas, applied on every new connection
+SQLITE_WAL = _flag("SQLITE_WAL", "true")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# asyncpg: server-side prepared statements cached per connection (0 disables, e.g. behind pgbouncer)
+ASYNCPG_STATEMENT_CACHE_SIZE = int(os.getenv("ASYNCPG_STATEMENT_CACHE_SIZE", "100"))
+
+
+def _sqlite_pragmas(wal: bool, synchronous: str, busy_timeout_ms: int, mmap_size: int):
+    def on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.close()
+
+    return on_connect
+
+
+def build_engine(
+    url: str = DATABASE_URL,
+    *,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: float = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE,
+    pool_pre_ping: bool = DB_POOL_PRE_PING,
+    sqlite_wal: bool = SQLITE_WAL,
+    sqlite_synchronous: str = SQLITE_SYNCHRONOUS,
+    sqlite_busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+    sqlite_mmap_size: int = SQLITE_MMAP_SIZE,
+    statement_cache_size: int = ASYNCPG_STATEMENT_CACHE_SIZE,
+    echo: bool = DB_ECHO,
+) -> AsyncEngine:
+    """Create the async engine with pool and driver settings suited to the backend in `url`."""
+    parsed = make_url(url)
+    kwargs: dict = {"echo": echo, "future": True}
+    backend = parsed.get_backend_name()
+    driver = parsed.get_driver_name()
+
+    if backend == "sqlite":
+        in_memory = parsed.database in (None, "", ":memory:")
+        if not in_memory:
+            # the aiosqlite default is NullPool: a new connection (and thread) per session
+            kwargs.update(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+            )
+        kwargs["connect_args"] = {"check_same_thread": False}
+    else:
+        kwargs.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=pool_pre_ping,
+        )
+        if driver == "asyncpg":
+            kwargs["connect_args"] = {"statement_cache_size": statement_cache_size}
+            if statement_cache_size == 0:
+                parsed = parsed.update_query_dict({"prepared_statement_cache_size": "0"})
+
+    new_engine = create_async_engine(parsed, **kwargs)
+    if backend == "sqlite":
+        event.listen(
+            new_engine.sync_engine,
+            "connect",
+            _sqlite_pragmas(sqlite_wal, sqlite_synchronous, sqlite_busy_timeout_ms, sqlite_mmap_size),
+        )
+    return new_engine
+
+
+_engine: Optional[AsyncEngine] = None
+
+
+def get_engine() -> AsyncEngine:
+    """The app's engine, built on first use (or in the lifespan hook) rather than at import."""
+    global _engine
+    if _engine is None:
+        _engine = build_engine()
+        metrics.instrument_engine(_engine.sync_engine)
+    return _engine
+
+
+def session_factory() -> sessionmaker:
+    # a factory assigned to db.AsyncSessionLocal (e.g. by tests) takes precedence
+    factory = globals().get("AsyncSessionLocal")
+    if factory is None:
+        factory = globals()["AsyncSessionLocal"] = sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+    return factory
+
+
+def __getattr__(name: str):
+    # `engine` and `AsyncSessionLocal` stay importable as module attributes
+    if name == "engine":
+        return get_engine()
+    if name == "AsyncSessionLocal":
+        return session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 async def init_db():
     # create tables
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(ensure_search_index)
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async with AsyncSession(engine) as session:
+    async with session_factory()() as session:
         yield session
-
@@ -0,0 +1,147 @@
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import crud
+from .crud import Cursor
+
+# Max estimated tokens of prior conversation sent with each prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# Messages kept per session in the in-memory tail cache
+HISTORY_TAIL_SIZE = int(os.getenv("HISTORY_TAIL_SIZE", "200"))
+# Sessions kept in the tail cache (LRU)
+HISTORY_MAX_SESSIONS = int(os.getenv("HISTORY_MAX_SESSIONS", "1000"))
+
+# appended to a stored streamed answer that did not run to the end
+TRUNCATED_MARK = "\n\n[answer truncated]"
+
+_ROLES = ("system", "user", "assistant")
+_SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token for English text, plus per-message framing overhead
+    return len(text) // 4 + 4
+
+
+class SessionHistoryCache:
+    """
+    Per-session tail of recent messages, loaded once from the Message table
+    and then kept current by append() as new messages are written. The
+    session's rolling summary (see summarizer.py) is loaded with it and
+    replaces the messages it covers.
+
+    This is process-local; with several workers each one warms its own copy
+    from the database, which is always the source of truth.
+    """
+
+    def __init__(self, tail_size: int = HISTORY_TAIL_SIZE, max_sessions: int = HISTORY_MAX_SESSIONS):
+        self.tail_size = tail_size
+        self.max_sessions = max_sessions
+        self._tails: "OrderedDict[int, Deque[dict]]" = OrderedDict()
+        self._summaries: dict[int, Tuple[str, Cursor]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, role: str, content: str, at: Optional[Cursor] = None) -> dict:
+        # at=None: written after the load without a known id, so newer than any summary
+        return {"role": role, "content": content, "tokens": estimate_tokens(content), "at": at}
+
+    async def _load(self, db: AsyncSession, session_id: int) -> Deque[dict]:
+        tail: Deque[dict] = deque(maxlen=self.tail_size)
+        for m in await crud.get_recent_messages(db, session_id, self.tail_size):
+            if m.role in _ROLES and m.content:
+                tail.append(self._entry(m.role, m.content, (m.created_at, m.id)))
+        summary = await crud.get_summary(db, session_id)
+        if summary is not None:
+            self._summaries[session_id] = (summary.content, (summary.through_created_at, summary.through_message_id))
+        self._tails[session_id] = tail
+        while len(self._tails) > self.max_sessions:
+            evicted, _ = self._tails.popitem(last=False)
+            self._summaries.pop(evicted, None)
+        return tail
+
+    async def get_context(
+        self, db: AsyncSession, session_id: int, budget: int = HISTORY_TOKEN_BUDGET
+    ) -> list[dict]:
+        """Summary (if any) then the most recent uncovered messages, oldest first, within the token budget."""
+        tail = self._tails.get(session_id)
+        if tail is None:
+            self.misses += 1
+            tail = await self._load(db, session_id)
+        else:
+            self.hits += 1
+            self._tails.move_to_end(session_id)
+
+        picked: list[dict] = []
+        used = 0
+        header = None
+        through = None
+        summary = self._summaries.get(session_id)
+        if summary is not None:
+            text, through = summary
+            header = {"role": "system", "content": _SUMMARY_PREFIX + text}
+            used = estimate_tokens(header["content"])
+            if used > budget:
+                header, used = None, 0
+        for entry in reversed(tail):
+            if through is not None and entry["at"] is not None and entry["at"] <= through:
+                break  # this and everything older is in the summary
+            used += entry["tokens"]
+            if used > budget:
+                break
+            picked.append({"role": entry["role"], "content": entry["content"]})
+        picked.reverse()
+        if header is not None:
+            picked.insert(0, header)
+        return picked
+
+    def append(self, session_id: int, role: str, content: str, at: Optional[Cursor] = None) -> None:
+        """Record a newly persisted message; sessions not yet cached are loaded lazily later."""
+        tail = self._tails.get(session_id)
+        if tail is not None and role in _ROLES and content:
+            tail.append(self._entry(role, content, at))
+
+    def invalidate(self, session_id: int) -> None:
+        self._tails.pop(session_id, None)
+        self._summaries.pop(session_id, None)
+
+    def clear(self) -> None:
+        self._tails.clear()
+        self._summaries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._tails),
+            "summaries": len(self._summaries),
+            "max_sessions": self.max_sessions,
+            "tail_size": self.tail_size,
+            "token_budget": HISTORY_TOKEN_BUDGET,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+history_cache = SessionHistoryCache()
+
+
+async def build_context(db: AsyncSession, session_id: int, prompt: str, budget: Optional[int] = None) -> list[dict]:
+    """History for a new turn, leaving room in the budget for the prompt itself."""
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    return await history_cache.get_context(db, session_id, max(0, budget - estimate_tokens(prompt)))
+
+
+async def record_message(db: AsyncSession, session_id: int, role: str, content: str):
+    msg = await crud.create_message(db, session_id, role, content)
+    history_cache.append(session_id, role, content, (msg.created_at, msg.id))
+    return msg
+
+
+async def record_turn(db: AsyncSession, session_id: int, prompt: str, answer: str):
+    """Persist a user prompt + assistant answer atomically and extend the tail cache."""
+    pair = await crud.create_message_pair(db, session_id, prompt, answer)
+    for m in pair:
+        history_cache.append(session_id, m.role, m.content, (m.created_at, m.id))
+    return pair
@@ -1,14 +1,148 @@
 import os
+import asyncio
 import json
-from typing import AsyncGenerator, Optional
+import logging
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Optional
 
 import httpx
-from dotenv import load_dotenv
 
-load_dotenv()
+from . import cache, metrics
+from .backends import OLLAMA_RETRIES, Backend, backend_pool
 
+try:
+    # faster NDJSON decoding for the streaming relay when available
+    from orjson import loads as _json_loads
+except ModuleNotFoundError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# single host; set OLLAMA_HOSTS (see backends.py) to spread load over several
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+# used by the semantic index (semantic.py)
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+# how long Ollama keeps the model loaded after each request ("30m", "1h", seconds, -1 = forever);
+# empty -> Ollama's own default (5m)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Shared HTTP client settings (one pool for every Ollama call)
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+# read timeout between streamed chunks; empty -> wait forever
+OLLAMA_STREAM_READ_TIMEOUT = os.getenv("OLLAMA_STREAM_READ_TIMEOUT", "")
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+OLLAMA_HTTP2 = os.getenv("OLLAMA_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Streaming relay framing: after the first chunk, hold content until a frame
+# has STREAM_FRAME_BYTES or STREAM_FRAME_MAX_DELAY seconds have passed
+STREAM_FRAME_BYTES = int(os.getenv("STREAM_FRAME_BYTES", "64"))
+STREAM_FRAME_MAX_DELAY = float(os.getenv("STREAM_FRAME_MAX_DELAY", "0.01"))
+
+_client: Optional[httpx.AsyncClient] = None
+_in_flight = 0
+_in_flight_peak = 0
+
+
+def _stream_timeout() -> httpx.Timeout:
+    read = float(OLLAMA_STREAM_READ_TIMEOUT) if OLLAMA_STREAM_READ_TIMEOUT else None
+    return httpx.Timeout(connect=OLLAMA_CONNECT_TIMEOUT, read=read, write=OLLAMA_CONNECT_TIMEOUT, pool=OLLAMA_CONNECT_TIMEOUT)
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = OLLAMA_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ModuleNotFoundError:
+            logger.warning("OLLAMA_HTTP2 set but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=OLLAMA_CONNECT_TIMEOUT,
+        read=OLLAMA_READ_TIMEOUT,
+        write=OLLAMA_CONNECT_TIMEOUT,
+        pool=OLLAMA_CONNECT_TIMEOUT,
+    )
+    # no base_url: requests carry the chosen backend's absolute URL, one connection pool per host
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily if the lifespan hook hasn't run."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def startup_client() -> None:
+    get_client()
+    backend_pool.start(get_client)
+
+
+async def shutdown_client() -> None:
+    global _client
+    await backend_pool.stop()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def pool_stats() -> dict:
+    """Snapshot of the shared connection pool, to see whether it is saturated."""
+    stats = {
+        "max_connections": OLLAMA_MAX_CONNECTIONS,
+        "max_keepalive": OLLAMA_MAX_KEEPALIVE,
+        "in_flight": _in_flight,
+        "in_flight_peak": _in_flight_peak,
+        "connections": 0,
+        "idle": 0,
+    }
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    conns = getattr(pool, "connections", None)
+    if conns is not None:
+        stats["connections"] = len(conns)
+        stats["idle"] = sum(1 for c in conns if c.is_idle())
+    return stats
+
+
+def _acquire() -> None:
+    global _in_flight, _in_flight_peak
+    _in_flight += 1
+    if _in_flight > _in_flight_peak:
+        _in_flight_peak = _in_flight
+
+
+def _release() -> None:
+    global _in_flight
+    _in_flight -= 1
+
+
+def keep_alive_value(raw: str):
+    """Ollama parses string keep_alive values as Go durations, so bare numbers must go as numbers."""
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+
+def _chat_payload(prompt: str, history: Optional[list[dict]], model: str, stream: bool) -> dict:
+    payload = {"model": model, "messages": _to_ollama_messages(prompt, history), "stream": stream}
+    if OLLAMA_KEEP_ALIVE:
+        payload["keep_alive"] = keep_alive_value(OLLAMA_KEEP_ALIVE)
+    return payload
 
 
 def _to_ollama_messages(prompt: str, history: Optional[list[dict]] = None) -> list[dict]:
@@ -25,19 +159,105 @@ def _to_ollama_messages(prompt: str, history: Optional[list[dict]] = None) -> li
     return msgs
 
 
+async def _send_chat(
+    payload: dict, stream: bool = False, path: str = "/api/chat"
+) -> tuple[Backend, httpx.Response, bool]:
+    """
+    POST `path` to the least-loaded backend serving the model, failing over
+    to another host (up to OLLAMA_RETRIES times) on connection errors and 5xx
+    answers. For streams only the response head has been read at that point,
+    so nothing has reached the client yet. The caller owns the returned
+    response and must report the outcome with backend.end(..., trial=trial).
+    """
+    client = get_client()
+    model = payload["model"]
+    tried: list[Backend] = []
+    while True:
+        backend = backend_pool.pick(model, exclude=tried)
+        if tried:
+            backend_pool.failovers += 1
+        tried.append(backend)
+        last = len(tried) > OLLAMA_RETRIES or not backend_pool.has_candidate(model, exclude=tried)
+        trial = backend.begin()
+        try:
+            if stream:
+                request = client.build_request("POST", f"{backend.url}{path}", json=payload, timeout=_stream_timeout())
+                r = await client.send(request, stream=True)
+            else:
+                r = await client.post(f"{backend.url}{path}", json=payload)
+        except httpx.TransportError as e:
+            backend.end(False, repr(e), trial)
+            if last:
+                raise
+            logger.warning("LLM backend %s failed (%r); retrying on another host", backend.url, e)
+            continue
+        except BaseException:
+            backend.end(None, trial=trial)
+            raise
+        if r.status_code >= 500 and not last:
+            await r.aclose()
+            backend.end(False, f"HTTP {r.status_code}", trial)
+            logger.warning("LLM backend %s answered %d; retrying on another host", backend.url, r.status_code)
+            continue
+        return backend, r, trial
+
+
 async def call_chat(prompt: str, history: Optional[list[dict]] = None, model: str = OLLAMA_MODEL) -> str:
     """
     Local LLM via Ollama (non-streaming).
-    Requires Ollama running at OLLAMA_HOST.
+    Requires Ollama running at OLLAMA_HOST (or the OLLAMA_HOSTS pool).
     """
-    payload = {"model": model, "messages": _to_ollama_messages(prompt, history), "stream": False}
+    payload = _chat_payload(prompt, history, model, stream=False)
+
+    _acquire()
+    started = time.perf_counter()
+    ok = False
+    try:
+        backend, r, trial = await _send_chat(payload)
+        backend.end(r.status_code < 500, f"HTTP {r.status_code}", trial)
+        ok = r.status_code < 400
+    finally:
+        _release()
+        metrics.observe_llm_chat(time.perf_counter() - started, ok)
+    if r.status_code >= 400:
+        return f"(ollama-http-{r.status_code}) {r.text}"
+    data = r.json()
+    metrics.observe_llm_load(data.get("load_duration"))
+    return (data.get("message") or {}).get("content") or ""
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        r = await client.post(f"{OLLAMA_HOST}/api/chat", json=payload)
-        if r.status_code >= 400:
-            return f"(ollama-http-{r.status_code}) {r.text}"
-        data = r.json()
-        return (data.get("message") or {}).get("content") or ""
+
+async def embed(text: str, model: str = OLLAMA_EMBED_MODEL) -> list[float]:
+    """Embedding vector of `text` from Ollama's /api/embeddings; raises httpx.HTTPError on failure."""
+    payload = {"model": model, "prompt": text}
+    if OLLAMA_KEEP_ALIVE:
+        payload["keep_alive"] = keep_alive_value(OLLAMA_KEEP_ALIVE)
+    backend, r, trial = await _send_chat(payload, path="/api/embeddings")
+    backend.end(r.status_code < 500, f"HTTP {r.status_code}", trial)
+    r.raise_for_status()
+    return r.json()["embedding"]
+
+
+async def call_chat_cached(
+    prompt: str,
+    history: Optional[list[dict]] = None,
+    model: str = OLLAMA_MODEL,
+    upstream: Optional[Callable[[], Awaitable[str]]] = None,
+) -> str:
+    """
+    call_chat behind the response cache (when CHAT_CACHE_ENABLED) with
+    single-flight deduplication of identical concurrent requests.
+    `upstream` replaces the plain call_chat on a miss (e.g. to go through the scheduler).
+    """
+    if upstream is None:
+        upstream = lambda: call_chat(prompt, history, model)  # noqa: E731
+    if not cache.CHAT_CACHE_ENABLED:
+        return await upstream()
+    key = cache.make_key(model, _to_ollama_messages(prompt, history))
+    return await cache.get_or_compute(
+        key,
+        upstream,
+        cacheable=lambda text: not text.startswith("(ollama-http-"),
+    )
 
 
 async def stream_chat(
@@ -46,13 +266,28 @@ async def stream_chat(
     """
     Local LLM via Ollama (streaming). Yields text chunks.
     """
-    payload = {"model": model, "messages": _to_ollama_messages(prompt, history), "stream": True}
+    payload = _chat_payload(prompt, history, model, stream=True)
 
-    async with httpx.AsyncClient(timeout=None) as client:
-        async with client.stream("POST", f"{OLLAMA_HOST}/api/chat", json=payload) as r:
+    _acquire()
+    metrics.llm_streams_in_flight.inc()
+    started = time.perf_counter()
+    first_chunk = -1.0
+    chunks = 0
+    nbytes = 0
+    ok = False
+    backend: Optional[Backend] = None
+    trial = False
+    host_ok: Optional[bool] = None
+    error = ""
+    load_ns = None
+    try:
+        backend, r, trial = await _send_chat(payload, stream=True)
+        host_ok, error = r.status_code < 500, f"HTTP {r.status_code}"
+        try:
             if r.status_code >= 400:
                 yield f"(ollama-http-{r.status_code}) {await r.aread()!r}"
                 return
+            ok = True
 
             async for line in r.aiter_lines():
                 if not line:
@@ -65,6 +300,170 @@ async def stream_chat(
                 msg = evt.get("message") or {}
                 chunk = msg.get("content")
                 if chunk:
+                    if not chunks:
+                        first_chunk = time.perf_counter() - started
+                    chunks += 1
+                    nbytes += len(chunk) if chunk.isascii() else len(chunk.encode("utf-8"))
                     yield chunk
                 if evt.get("done") is True:
+                    load_ns = evt.get("load_duration")
                     return
+        finally:
+            await r.aclose()
+    except httpx.TransportError as e:
+        ok = host_ok = False
+        error = repr(e)
+        raise
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        if backend is not None:
+            backend.end(host_ok, error, trial)
+        _release()
+        metrics.llm_streams_in_flight.dec()
+        metrics.observe_llm_stream(time.perf_counter() - started, first_chunk, chunks, nbytes, ok, load_ns)
+
+
+async def stream_chat_bytes(
+    prompt: str,
+    history: Optional[list[dict]] = None,
+    model: str = OLLAMA_MODEL,
+    pass_through: bool = False,
+    frame_bytes: Optional[int] = None,
+    frame_max_delay: Optional[float] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Local LLM via Ollama (streaming), relayed as UTF-8 frames.
+
+    The raw byte stream is split into NDJSON lines incrementally, decoded
+    with orjson when installed, and content is coalesced into frames of
+    `frame_bytes` or `frame_max_delay` seconds (the first chunk is sent at
+    once so time-to-first-token is unaffected). With pass_through=True the
+    upstream NDJSON bytes are relayed untouched.
+    """
+    payload = _chat_payload(prompt, history, model, stream=True)
+    frame_bytes = STREAM_FRAME_BYTES if frame_bytes is None else frame_bytes
+    delay = STREAM_FRAME_MAX_DELAY if frame_max_delay is None else frame_max_delay
+
+    _acquire()
+    metrics.llm_streams_in_flight.inc()
+    started = time.perf_counter()
+    first_chunk = -1.0
+    chunks = 0
+    nbytes = 0
+    ok = False
+    next_read: Optional[asyncio.Future] = None
+    backend: Optional[Backend] = None
+    trial = False
+    host_ok: Optional[bool] = None
+    error = ""
+    load_ns = None
+    try:
+        backend, r, trial = await _send_chat(payload, stream=True)
+        host_ok, error = r.status_code < 500, f"HTTP {r.status_code}"
+        try:
+            if r.status_code >= 400:
+                yield f"(ollama-http-{r.status_code}) {await r.aread()!r}".encode("utf-8")
+                return
+            ok = True
+
+            if pass_through:
+                async for data in r.aiter_bytes():
+                    if not chunks:
+                        first_chunk = time.perf_counter() - started
+                    chunks += 1
+                    nbytes += len(data)
+                    yield data
+                return
+
+            try:
+                reader = r.aiter_bytes()
+                buf = b""
+                pending: list[str] = []
+                pending_size = 0
+                pending_since = 0.0
+                done = False
+                eof = False
+                while not done and not eof:
+                    if pending and delay > 0 and next_read is None:
+                        next_read = asyncio.ensure_future(reader.__anext__())
+                    if next_read is not None:
+                        # wait for more data, but never hold a pending frame past its deadline;
+                        # the read task survives the timeout so no upstream bytes are lost
+                        remaining = pending_since + delay - time.perf_counter() if pending else None
+                        if remaining is None or remaining > 0:
+                            await asyncio.wait((next_read,), timeout=remaining)
+                        if not next_read.done():
+                            frame = "".join(pending).encode("utf-8")
+                            pending.clear()
+                            pending_size = 0
+                            nbytes += len(frame)
+                            yield frame
+                            continue
+                        task, next_read = next_read, None
+                        try:
+                            data = task.result()
+                        except StopAsyncIteration:
+                            data, eof = b"", True
+                    else:
+                        try:
+                            data = await reader.__anext__()
+                        except StopAsyncIteration:
+                            data, eof = b"", True
+
+                    buf += data
+                    if eof:
+                        lines, buf = [buf], b""
+                    else:
+                        *lines, buf = buf.split(b"\n")
+                    for line in lines:
+                        if not line.strip():
+                            continue
+                        try:
+                            evt = _json_loads(line)
+                        except ValueError:
+                            continue
+                        chunk = (evt.get("message") or {}).get("content")
+                        if chunk:
+                            if not pending:
+                                pending_since = time.perf_counter()
+                            pending.append(chunk)
+                            pending_size += len(chunk)
+                            chunks += 1
+                        if evt.get("done") is True:
+                            load_ns = evt.get("load_duration")
+                            done = True
+                            break
+
+                    if pending and (done or eof or first_chunk < 0 or delay <= 0 or pending_size >= frame_bytes):
+                        if first_chunk < 0:
+                            first_chunk = time.perf_counter() - started
+                        frame = "".join(pending).encode("utf-8")
+                        pending.clear()
+                        pending_size = 0
+                        nbytes += len(frame)
+                        yield frame
+            finally:
+                if next_read is not None:
+                    # a read may still be in flight if the consumer stopped mid-frame
+                    next_read.cancel()
+                    try:
+                        await next_read
+                    except BaseException:
+                        pass
+        finally:
+            await r.aclose()
+    except httpx.TransportError as e:
+        ok = host_ok = False
+        error = repr(e)
+        raise
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        if backend is not None:
+            backend.end(host_ok, error, trial)
+        _release()
+        metrics.llm_streams_in_flight.dec()
+        metrics.observe_llm_stream(time.perf_counter() - started, first_chunk, chunks, nbytes, ok, load_ns)
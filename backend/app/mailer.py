@@ -1,9 +1,20 @@
 import os
+import asyncio
 import logging
-from typing import Optional, Any
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Optional, Any, List
 
 logger = logging.getLogger(__name__)
 
+# Background delivery queue
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "sendgrid")  # sendgrid | stub
+MAIL_QUEUE_MAX = int(os.getenv("MAIL_QUEUE_MAX", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "10"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "4"))
+MAIL_RETRY_BASE_DELAY = float(os.getenv("MAIL_RETRY_BASE_DELAY", "1.0"))
+
 
 def _build_reset_link(*, reset_link: Optional[str], token: Optional[str]) -> Optional[str]:
     if reset_link:
@@ -20,22 +31,8 @@ def _build_reset_link(*, reset_link: Optional[str], token: Optional[str]) -> Opt
     return f"{frontend_url}/reset-password?token={token}"
 
 
-def send_reset_email(*args: Any, **kwargs: Any) -> bool:
-    """
-    Send a password reset email.
-
-    This function is intentionally tolerant about parameters so it won't break
-    if call sites vary. Supported inputs:
-      - send_reset_email(email, token)
-      - send_reset_email(email, reset_link)
-      - send_reset_email(to_email=..., token=...)
-      - send_reset_email(to_email=..., reset_link=...)
-
-    Env vars:
-      - SENDGRID_API_KEY (if missing -> no-op)
-      - SENDGRID_FROM_EMAIL (default: no-op if missing)
-      - FRONTEND_URL (used to build link from token)
-    """
+def _parse_reset_args(args: tuple, kwargs: dict):
+    """(to_email, reset_link) from the loosely-typed call styles enqueue_reset_email accepts."""
     # Try to extract email + token/link from args/kwargs
     to_email = (
         kwargs.get("to_email")
@@ -51,50 +48,278 @@ def send_reset_email(*args: Any, **kwargs: Any) -> bool:
         reset_link = second
 
     reset_link = _build_reset_link(reset_link=reset_link, token=token)
+    return to_email, reset_link
 
-    if not to_email or not isinstance(to_email, str):
-        logger.warning("send_reset_email: missing to_email; skipping email send")
-        return False
-
-    api_key = os.getenv("SENDGRID_API_KEY")
-    from_email = os.getenv("SENDGRID_FROM_EMAIL")
-
-    # If not configured, don't crash production deploys—just no-op.
-    if not api_key or not from_email:
-        logger.info(
-            "send_reset_email: SendGrid not configured (missing SENDGRID_API_KEY or SENDGRID_FROM_EMAIL); skipping"
-        )
-        return False
-
-    if not reset_link:
-        logger.warning("send_reset_email: missing reset link/token (and FRONTEND_URL not set); skipping")
-        return False
 
-    subject = kwargs.get("subject") or "Reset your password"
-    html_content = f"""
+def _reset_html(reset_link: str) -> str:
+    return f"""
     <p>You requested a password reset.</p>
     <p><a href="{reset_link}">Click here to reset your password</a></p>
     <p>If you didn’t request this, you can ignore this email.</p>
     """.strip()
 
-    try:
+
+@dataclass
+class OutgoingEmail:
+    to_email: str
+    subject: str
+    html_content: str
+    attempts: int = field(default=0, compare=False)
+
+
+class MailTransport(ABC):
+    """Delivers a batch of emails; returns one success flag per message."""
+
+    @abstractmethod
+    async def send_batch(self, messages: List[OutgoingEmail]) -> List[bool]:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+class StubTransport(MailTransport):
+    """Keeps sent mail in memory (tests, local dev). `fail_times` simulates transient errors."""
+
+    def __init__(self, fail_times: int = 0):
+        self.outbox: List[OutgoingEmail] = []
+        self.fail_times = fail_times
+
+    async def send_batch(self, messages: List[OutgoingEmail]) -> List[bool]:
+        results = []
+        for msg in messages:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                results.append(False)
+            else:
+                self.outbox.append(msg)
+                results.append(True)
+        return results
+
+
+class SendGridTransport(MailTransport):
+    """
+    One SendGridAPIClient reused for every send. The client is blocking, so
+    each batch runs in a worker thread rather than on the event loop.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, from_email: Optional[str] = None):
+        self.api_key = api_key or os.getenv("SENDGRID_API_KEY")
+        self.from_email = from_email or os.getenv("SENDGRID_FROM_EMAIL")
+        self._client = None
+
+    def _send_sync(self, messages: List[OutgoingEmail]) -> List[bool]:
         # Import lazily so missing dependency doesn't crash app boot.
         from sendgrid import SendGridAPIClient
         from sendgrid.helpers.mail import Mail
 
-        message = Mail(
-            from_email=from_email,
-            to_emails=to_email,
-            subject=subject,
-            html_content=html_content,
-        )
-        sg = SendGridAPIClient(api_key)
-        resp = sg.send(message)
-        logger.info("send_reset_email: sent to=%s status=%s", to_email, getattr(resp, "status_code", None))
+        if self._client is None:
+            self._client = SendGridAPIClient(self.api_key)
+        results = []
+        for msg in messages:
+            try:
+                mail = Mail(
+                    from_email=self.from_email,
+                    to_emails=msg.to_email,
+                    subject=msg.subject,
+                    html_content=msg.html_content,
+                )
+                resp = self._client.send(mail)
+                status = getattr(resp, "status_code", None)
+                logger.info("mail: sent to=%s status=%s", msg.to_email, status)
+                results.append(status is None or status < 400)
+            except Exception:
+                logger.exception("mail: send to %s failed", msg.to_email)
+                results.append(False)
+        return results
+
+    async def send_batch(self, messages: List[OutgoingEmail]) -> List[bool]:
+        if not self.api_key or not self.from_email:
+            logger.info("mail: SendGrid not configured (missing SENDGRID_API_KEY or SENDGRID_FROM_EMAIL); dropping")
+            return [True] * len(messages)  # nothing to retry
+        try:
+            return await asyncio.to_thread(self._send_sync, messages)
+        except ModuleNotFoundError:
+            logger.info("mail: sendgrid package not installed; dropping")
+            return [True] * len(messages)
+
+
+def build_transport(name: str = MAIL_TRANSPORT) -> MailTransport:
+    if name == "stub":
+        return StubTransport()
+    return SendGridTransport()
+
+
+class MailQueue:
+    """
+    In-process delivery queue: handlers enqueue() and return immediately; a
+    background worker sends in batches and retries failures with
+    exponential backoff up to MAIL_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[MailTransport] = None,
+        maxsize: int = MAIL_QUEUE_MAX,
+        batch_size: int = MAIL_BATCH_SIZE,
+        max_attempts: int = MAIL_MAX_ATTEMPTS,
+        retry_base_delay: float = MAIL_RETRY_BASE_DELAY,
+    ):
+        self.transport = transport or build_transport()
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._retries: dict = {}  # TimerHandle -> OutgoingEmail waiting out its backoff
+        self._sending: List[OutgoingEmail] = []
+        self._draining = False
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            # a fresh queue for the current event loop, keeping whatever the old worker left queued
+            old, self._queue = self._queue, asyncio.Queue(maxsize=self.maxsize)
+            while old is not None and not old.empty():
+                self._queue.put_nowait(old.get_nowait())
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def start(self) -> None:
+        self._ensure_worker()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Deliver what is queued, pending retries included, within `timeout`,
+        then stop the worker. Mail still undelivered is logged with its count.
+        """
+        if self._worker is None:
+            return
+        self._draining = True
+        # retries waiting out their backoff get their next attempt now
+        for handle, message in list(self._retries.items()):
+            handle.cancel()
+            del self._retries[handle]
+            self._requeue(message)
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._draining = False
+        undelivered = self._queue.qsize() + len(self._sending)
+        if undelivered:
+            logger.error("mail: %d messages not delivered at shutdown (%d mid-send)", undelivered, len(self._sending))
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await self.transport.aclose()
+
+    def enqueue(self, message: OutgoingEmail) -> bool:
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("mail: queue full; dropping mail to %s", message.to_email)
+            return False
+        self.enqueued += 1
         return True
-    except ModuleNotFoundError:
-        logger.info("send_reset_email: sendgrid package not installed; skipping")
+
+    def _requeue(self, message: OutgoingEmail) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.failed += 1
+            logger.error("mail: queue full; dropping retry of mail to %s", message.to_email)
+
+    def _schedule_retry(self, message: OutgoingEmail) -> None:
+        if self._draining:
+            # shutting down: no time for backoff, attempts still stop at max_attempts
+            self._requeue(message)
+            return
+        delay = self.retry_base_delay * (2 ** (message.attempts - 1))
+        delay *= 0.5 + random.random()  # jitter
+
+        def requeue():
+            del self._retries[handle]
+            self._requeue(message)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries[handle] = message
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._sending = batch
+            try:
+                try:
+                    results = await self.transport.send_batch(batch)
+                except Exception:
+                    logger.exception("mail: transport error")
+                    results = [False] * len(batch)
+                for msg, ok in zip(batch, results):
+                    msg.attempts += 1
+                    if ok:
+                        self.sent += 1
+                    elif msg.attempts < self.max_attempts:
+                        self.retried += 1
+                        self._schedule_retry(msg)
+                    else:
+                        self.failed += 1
+                        logger.error("mail: giving up on mail to %s after %d attempts", msg.to_email, msg.attempts)
+            finally:
+                self._sending = []
+                for _ in batch:
+                    self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "retry_pending": len(self._retries),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+mail_queue = MailQueue()
+
+
+def enqueue_reset_email(*args: Any, **kwargs: Any) -> bool:
+    """
+    Queue a password reset email for background delivery; returns False if
+    it could not be queued. Tolerant about parameters so call sites can vary:
+      - enqueue_reset_email(email, token)
+      - enqueue_reset_email(email, reset_link)
+      - enqueue_reset_email(to_email=..., token=...)
+      - enqueue_reset_email(to_email=..., reset_link=...)
+
+    Env vars:
+      - FRONTEND_URL (used to build the link from a token)
+      - SENDGRID_API_KEY, SENDGRID_FROM_EMAIL (see SendGridTransport)
+    """
+    to_email, reset_link = _parse_reset_args(args, kwargs)
+    if not to_email or not isinstance(to_email, str):
+        logger.warning("enqueue_reset_email: missing to_email; skipping")
         return False
-    except Exception:
-        logger.exception("send_reset_email: failed to send email")
+    if not reset_link:
+        logger.warning("enqueue_reset_email: missing reset link/token (and FRONTEND_URL not set); skipping")
         return False
+    subject = kwargs.get("subject") or "Reset your password"
+    return mail_queue.enqueue(OutgoingEmail(to_email=to_email, subject=subject, html_content=_reset_html(reset_link)))
+
+
+def send_reset_email(*args: Any, **kwargs: Any) -> bool:
+    """Former blocking SendGrid send; now only queues, like enqueue_reset_email."""
+    return enqueue_reset_email(*args, **kwargs)
@@ -1,14 +1,68 @@
+import asyncio
 import os
-from typing import AsyncGenerator, Optional
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import quote
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.background import BackgroundTask
 
-from .llm_service import call_chat, stream_chat
+from . import auth, cache, compression, crud, llm_service, metrics, semantic
+from .db import get_engine, get_session
+from .backends import NoBackendAvailable, backend_pool
+from .conditional import make_etag, not_modified, not_modified_response, validator_headers
+from .archive import archiver
+from .auth import get_current_user_header, username_from_token
+from .history import TRUNCATED_MARK, build_context, history_cache, record_turn
+from .mailer import enqueue_reset_email, mail_queue
+from .models import User
+from .search import search_messages
+from .semantic import semantic_index
+from .streams import StreamGone, stream_registry
+from .summarizer import summarizer
+from .transfer import ImportFormatError, export_lines, import_lines, iter_lines
+from .scheduler import LLM_REQUEST_DEADLINE, SchedulerRejected, iter_with_deadline, scheduler
+from .usercache import auth_cache
+from .warmup import model_keeper
+from .writebehind import message_writer
+from .llm_service import call_chat_cached, stream_chat, stream_chat_bytes
 
-app = FastAPI(title="AI Chat API (Simple)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_engine()
+    await llm_service.startup_client()
+    await model_keeper.start(llm_service.get_client)
+    await message_writer.start()
+    await summarizer.start()
+    await archiver.start()
+    await mail_queue.start()
+    await semantic_index.start()
+    try:
+        yield
+    finally:
+        await stream_registry.stop()
+        await semantic_index.stop()
+        await mail_queue.stop()
+        await archiver.stop()
+        await summarizer.stop()
+        await message_writer.stop()
+        await model_keeper.stop()
+        await llm_service.shutdown_client()
+        auth.shutdown_hash_executor()
+
+
+app = FastAPI(title="AI Chat API (Simple)", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+# the token stream must reach the client as it is produced, never held for compression
+app.add_middleware(compression.CompressionMiddleware, exempt_paths=("/api/chat/stream",))
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +70,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # browsers hide non-safelisted response headers from scripts unless exposed
+    expose_headers=["X-Stream-Id", "X-Stream-Offset"],
 )
 
 
@@ -23,6 +79,77 @@ class ChatRequest(BaseModel):
     prompt: str
     # Optional: client can send conversation context if your llm_service supports it
     history: Optional[list[dict]] = None
+    # Preferred: server builds the context from the stored session history
+    session_id: Optional[int] = None
+    # /api/chat/stream only: relay Ollama's NDJSON events untouched instead of text
+    raw: bool = False
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+async def _resolve_history(
+    req: ChatRequest, request: Request, db: AsyncSession
+) -> tuple[Optional[list[dict]], Optional[int]]:
+    """The context for the new turn and the id of the user owning the session, if any."""
+    if req.session_id is None:
+        return req.history, None
+    # stored sessions are private: only their owner may read them into a prompt or add turns
+    token = _bearer_token(request)
+    if token is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    user = await auth.get_user_from_token(token, db)
+    session = await crud.get_session(db, req.session_id)
+    if session is None or session.user_id != user.id:
+        raise HTTPException(status_code=404, detail="session not found")
+    if message_writer.has_pending(req.session_id):
+        # streamed turns still in the write-behind buffer must be visible to a cold cache load
+        await message_writer.flush()
+    if semantic.HISTORY_RETRIEVAL_ENABLED and session.user_id is not None:
+        return await semantic_index.build_context(db, session.user_id, req.session_id, req.prompt), session.user_id
+    return await build_context(db, req.session_id, req.prompt), session.user_id
+
+
+def _user_key(request: Request) -> str:
+    """Fairness key for the LLM scheduler: token subject, else client address."""
+    token = _bearer_token(request)
+    if token:
+        username = username_from_token(token)
+        if username:
+            return f"user:{username}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _rejected(e: SchedulerRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+
+metrics.register_stats("llm_pool", llm_service.pool_stats)
+metrics.register_stats("llm_backends", backend_pool.stats)
+metrics.register_stats("model_keeper", model_keeper.stats)
+metrics.register_stats("chat_cache", cache.stats)
+metrics.register_stats("compression", compression.stats)
+metrics.register_stats("history_cache", history_cache.stats)
+metrics.register_stats("llm_scheduler", scheduler.stats)
+metrics.register_stats("message_writer", message_writer.stats)
+metrics.register_stats("summarizer", summarizer.stats)
+metrics.register_stats("archive", archiver.stats)
+metrics.register_stats("auth_cache", auth_cache.stats)
+metrics.register_stats("mail_queue", mail_queue.stats)
+metrics.register_stats("semantic", semantic_index.stats)
+metrics.register_stats("streams", stream_registry.stats)
+
+
+class Credentials(BaseModel):
+    username: str
+    password: str
+    email: Optional[str] = None
+
+
+def _token_response(username: str) -> dict:
+    return {"access_token": auth.create_access_token({"sub": username}), "token_type": "bearer"}
 
 
 @app.get("/api/health")
@@ -30,44 +157,336 @@ async def health():
     return {"status": "ok", "env": os.getenv("APP_ENV", "development")}
 
 
+@app.get("/api/stats")
+async def stats():
+    return {
+        "llm_pool": llm_service.pool_stats(),
+        "llm_backends": backend_pool.stats(),
+        "model_keeper": model_keeper.stats(),
+        "chat_cache": cache.stats(),
+        "compression": compression.stats(),
+        "history_cache": history_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "message_writer": message_writer.stats(),
+        "summarizer": summarizer.stats(),
+        "archive": archiver.stats(),
+        "auth_cache": auth_cache.stats(),
+        "mail_queue": mail_queue.stats(),
+        "semantic": semantic_index.stats(),
+        "streams": stream_registry.stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.post("/api/register")
+async def register(creds: Credentials, db: AsyncSession = Depends(get_session)):
+    if len(creds.username) < 3 or len(creds.password) < 8:
+        raise HTTPException(status_code=400, detail="username must be >= 3 chars and password >= 8 chars")
+    if await crud.get_user_by_username(db, creds.username):
+        raise HTTPException(status_code=400, detail="username already registered")
+    hashed = await auth.get_password_hash_async(creds.password)
+    try:
+        await crud.create_user(db, creds.username, hashed, email=creds.email)
+    except IntegrityError:
+        # registered by a concurrent request since the check above
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="username already registered")
+    return _token_response(creds.username)
+
+
+@app.post("/api/login")
+async def login(creds: Credentials, db: AsyncSession = Depends(get_session)):
+    user = await auth.authenticate_user(db, creds.username, creds.password)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    return _token_response(user.username)
+
+
+class PasswordResetRequest(BaseModel):
+    username: Optional[str] = None
+    email: Optional[str] = None
+
+
+class PasswordReset(BaseModel):
+    token: str
+    new_password: str
+
+
+@app.post("/api/request-password-reset")
+async def request_password_reset(req: PasswordResetRequest, db: AsyncSession = Depends(get_session)):
+    user = None
+    if req.username:
+        user = await crud.get_user_by_username(db, req.username)
+    elif req.email:
+        user = await crud.get_user_by_email(db, req.email)
+    # same answer whether or not the account exists
+    body = {"ok": True}
+    if user is not None:
+        token = auth.create_password_reset_token(user.username)
+        if user.email:
+            # delivery happens on the mail queue's worker, not in this request
+            enqueue_reset_email(user.email, token)
+        if os.getenv("APP_ENV", "development") != "production":
+            body["reset_token"] = token
+    return body
+
+
+@app.post("/api/reset-password")
+async def reset_password(req: PasswordReset, db: AsyncSession = Depends(get_session)):
+    username = auth.verify_password_reset_token(req.token)
+    if len(req.new_password) < 8:
+        raise HTTPException(status_code=400, detail="password must be >= 8 chars")
+    user = await crud.get_user_by_username(db, username)
+    if user is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired reset token")
+    await crud.update_user_password(db, user.id, await auth.get_password_hash_async(req.new_password))
+    return {"ok": True}
+
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+
+def _parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return crud.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _set_next_cursor(response: Response, rows: list, limit: int) -> None:
+    # a full page means there may be more; the client passes this back as ?cursor=
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last.created_at, last.id)
+
+
+def _validators(request: Request, response: Response, version: crud.ListingVersion, *scope) -> Optional[Response]:
+    """Set the ETag from a listing version; returns the 304 to send when the client is current."""
+    etag = make_etag(*scope, *version, request.url.query)
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers.update(validator_headers(etag))
+    return None
+
+
+@app.get("/api/sessions")
+async def list_sessions(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user_header),
+    db: AsyncSession = Depends(get_session),
+):
+    before = _parse_cursor(cursor)
+    unchanged = _validators(request, response, await crud.get_sessions_version(db, user.id), "sessions", user.id)
+    if unchanged is not None:
+        return unchanged
+    rows = await crud.get_sessions(db, user_id=user.id, limit=limit, before=before)
+    _set_next_cursor(response, rows, limit)
+    return rows
+
+
+@app.get("/api/sessions/{session_id}/messages")
+async def list_messages(
+    session_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user_header),
+    db: AsyncSession = Depends(get_session),
+):
+    session = await crud.get_session(db, session_id)
+    if session is None or session.user_id != user.id:
+        raise HTTPException(status_code=404, detail="session not found")
+    after = _parse_cursor(cursor)
+    unchanged = _validators(request, response, await crud.get_messages_version(db, session_id), "messages", session_id)
+    if unchanged is not None:
+        return unchanged
+    rows = await crud.get_messages(db, session_id, limit=limit, after=after)
+    _set_next_cursor(response, rows, limit)
+    return rows
+
+
+@app.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10_000),
+    user: User = Depends(get_current_user_header),
+    db: AsyncSession = Depends(get_session),
+):
+    results, next_offset = await search_messages(db, user.id, q, limit=limit, offset=offset)
+    return {"results": results, "next_offset": next_offset}
+
+
+def _attachment(filename: str) -> str:
+    """Content-Disposition for any filename: an ASCII fallback plus the RFC 5987 UTF-8 form."""
+    fallback = re.sub(r"[^A-Za-z0-9._-]", "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+@app.get("/api/export")
+async def export_history(user: User = Depends(get_current_user_header)):
+    """Every session and message of the user as NDJSON, streamed from a server-side cursor."""
+    # queued stream turns belong in the export
+    await message_writer.flush()
+    return StreamingResponse(
+        export_lines(user.id, user.username),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": _attachment(f"{user.username}-export.ndjson")},
+    )
+
+
+@app.post("/api/import")
+async def import_history(request: Request, user: User = Depends(get_current_user_header)):
+    """Add the sessions and messages of an /api/export body to the user's account, all or nothing."""
+    try:
+        counts = await import_lines(user.id, iter_lines(request.stream()))
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"imported": counts}
+
+
 @app.post("/api/chat")
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request, db: AsyncSession = Depends(get_session)):
     if not req.prompt or not req.prompt.strip():
         raise HTTPException(status_code=400, detail="prompt is required")
 
+    history, owner = await _resolve_history(req, request, db)
+    user = _user_key(request)
+
+    async def scheduled() -> str:
+        async with scheduler.slot(user):
+            return await asyncio.wait_for(llm_service.call_chat(req.prompt, history), LLM_REQUEST_DEADLINE)
+
     try:
-        # Adjust if your call_chat signature differs
-        text = await call_chat(prompt=req.prompt, history=req.history)
-        return {"response": text}
-    except TypeError:
-        # fallback if your call_chat only accepts prompt
-        text = await call_chat(req.prompt)
+        text = None
+        if semantic.SEMANTIC_CACHE_ENABLED and owner is not None and not history:
+            # only a conversation's first prompt: later answers depend on what came before
+            text = await semantic_index.lookup_answer(db, owner, req.prompt)
+        if text is None:
+            text = await call_chat_cached(prompt=req.prompt, history=history, upstream=scheduled)
+        if req.session_id is not None and not text.startswith("(ollama-http-"):
+            await record_turn(db, req.session_id, req.prompt, text)
+            summarizer.notify(req.session_id)
+            semantic_index.notify(owner)
+            return {"response": text, "session_id": req.session_id}
         return {"response": text}
+    except SchedulerRejected as e:
+        raise _rejected(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="LLM request deadline exceeded")
+    except NoBackendAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/chat/stream")
-async def chat_stream(req: ChatRequest):
+async def chat_stream(req: ChatRequest, request: Request, db: AsyncSession = Depends(get_session)):
     if not req.prompt or not req.prompt.strip():
         raise HTTPException(status_code=400, detail="prompt is required")
 
-    async def gen() -> AsyncGenerator[bytes, None]:
+    if req.raw and req.session_id is not None:
+        raise HTTPException(status_code=400, detail="raw streams are not stored; drop session_id or raw")
+    history, owner = await _resolve_history(req, request, db)
+    try:
+        acquired = await scheduler.acquire(_user_key(request))
+    except SchedulerRejected as e:
+        raise _rejected(e)
+    deadline = time.monotonic() + LLM_REQUEST_DEADLINE
+    parts: list[bytes] = []
+    complete = False
+
+    def persist() -> None:
+        # queued for the write-behind flusher; no DB round trip on the response path
+        answer = b"".join(parts).decode("utf-8", "replace")
+        if req.session_id is None or not answer or answer.startswith("(ollama-http-"):
+            return
+        if not complete:
+            # cancelled, timed out or failed upstream: keep what the user saw, but not as a finished answer
+            answer += TRUNCATED_MARK
+        message_writer.submit_turn(req.session_id, req.prompt, answer)
+        for role, content in (("user", req.prompt), ("assistant", answer)):
+            history_cache.append(req.session_id, role, content)
+        summarizer.notify(req.session_id)
+        # indexed once the write-behind flush has landed, at the latest on the owner's next turn
+        semantic_index.notify(owner)
+
+    async def produce(generation) -> None:
+        # runs to completion whether or not a client is reading, unless abandoned past the grace period
+        nonlocal complete
         try:
             try:
-                async for chunk in stream_chat(prompt=req.prompt, history=req.history):
-                    yield chunk.encode("utf-8")
+                frames = stream_chat_bytes(prompt=req.prompt, history=history, pass_through=req.raw)
+                async for frame in iter_with_deadline(frames, deadline):
+                    parts.append(frame)
+                    generation.write(frame)
             except TypeError:
-                async for chunk in stream_chat(req.prompt):
-                    yield chunk.encode("utf-8")
+                async for chunk in iter_with_deadline(stream_chat(req.prompt), deadline):
+                    frame = chunk.encode("utf-8")
+                    parts.append(frame)
+                    generation.write(frame)
+            complete = True
+        except asyncio.TimeoutError:
+            generation.write(b"\n[stream error] LLM request deadline exceeded\n")
         except Exception as e:
-            yield f"\n[stream error] {e}\n".encode("utf-8")
+            generation.write(f"\n[stream error] {e}\n".encode("utf-8"))
+        finally:
+            scheduler.release(acquired)
+            persist()
+
+    generation = stream_registry.start(
+        produce, "application/x-ndjson" if req.raw else "text/plain; charset=utf-8", owner=owner
+    )
+    return _stream_response(generation.reader(0))
+
 
+def _stream_response(reader) -> StreamingResponse:
     return StreamingResponse(
-        gen(),
-        media_type="text/plain; charset=utf-8",
+        reader,
+        media_type=reader.generation.media_type,
         headers={
             "Cache-Control": "no-cache",
             "X-Accel-Buffering": "no",
+            # reconnect with GET /api/chat/stream/{id}?offset=<bytes received> to resume
+            "X-Stream-Id": reader.generation.id,
+            "X-Stream-Offset": str(reader.offset),
         },
+        # a disconnect can leave the body iterator suspended; detaching starts the grace period
+        background=BackgroundTask(reader.close),
     )
+
+
+@app.get("/api/chat/stream/{stream_id}")
+async def resume_chat_stream(
+    stream_id: str, request: Request, offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_session)
+):
+    """The rest of a running or recently finished stream, from the byte offset the client already has."""
+    try:
+        owner = stream_registry.get(stream_id).owner
+    except StreamGone as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if owner is not None:
+        # a stream of a stored session is as private as the session
+        token = _bearer_token(request)
+        if token is None:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        user = await auth.get_user_from_token(token, db)
+        if user.id != owner:
+            raise HTTPException(status_code=404, detail="unknown or expired stream")
+    try:
+        reader = stream_registry.resume(stream_id, offset)
+    except StreamGone as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _stream_response(reader)
@@ -0,0 +1,215 @@
+import time
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Own registry so tests/reloads don't trip over duplicate default-registry metrics
+registry = CollectorRegistry(auto_describe=True)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route (time to complete the response)",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+    registry=registry,
+)
+llm_request_duration = Histogram(
+    "llm_upstream_duration_seconds",
+    "Ollama request latency, start to last byte",
+    ["kind", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+    registry=registry,
+)
+llm_first_chunk = Histogram(
+    "llm_time_to_first_chunk_seconds",
+    "Ollama streaming latency to the first content chunk",
+    buckets=_LATENCY_BUCKETS,
+    registry=registry,
+)
+llm_model_load = Histogram(
+    "llm_model_load_seconds",
+    "Model load time reported by Ollama per request (near zero when the model is resident)",
+    buckets=_LATENCY_BUCKETS,
+    registry=registry,
+)
+llm_first_chunk_by_load = Histogram(
+    "llm_time_to_first_chunk_by_load_seconds",
+    "Ollama streaming latency to the first content chunk, by whether the model had to be loaded",
+    ["load"],
+    buckets=_LATENCY_BUCKETS,
+    registry=registry,
+)
+llm_stream_chunks = Counter("llm_stream_chunks_total", "Content chunks relayed from Ollama", registry=registry)
+llm_stream_bytes = Counter("llm_stream_bytes_total", "UTF-8 bytes of content relayed from Ollama", registry=registry)
+llm_streams_in_flight = Gauge("llm_streams_in_flight", "Ollama streams currently open", registry=registry)
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Database statement latency by verb",
+    ["verb"],
+    buckets=_DB_BUCKETS,
+    registry=registry,
+)
+
+# label children resolved once, so hot paths skip the labels() lookup
+_llm_chat_ok = llm_request_duration.labels("chat", "ok")
+_llm_chat_error = llm_request_duration.labels("chat", "error")
+_llm_stream_ok = llm_request_duration.labels("stream", "ok")
+_llm_stream_error = llm_request_duration.labels("stream", "error")
+_llm_first_chunk_cold = llm_first_chunk_by_load.labels("cold")
+_llm_first_chunk_warm = llm_first_chunk_by_load.labels("warm")
+_DB_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT")
+_db_children = {verb: db_query_duration.labels(verb) for verb in _DB_VERBS}
+_db_other = db_query_duration.labels("OTHER")
+
+
+def observe_llm_chat(seconds: float, ok: bool) -> None:
+    (_llm_chat_ok if ok else _llm_chat_error).observe(seconds)
+
+
+# a reported load above this means the model was not resident when the request arrived
+COLD_LOAD_SECONDS = 0.25
+
+
+def observe_llm_load(load_ns: Optional[int]) -> Optional[float]:
+    """Record Ollama's load_duration (nanoseconds) if the response carried one; returns seconds."""
+    if not isinstance(load_ns, (int, float)):
+        return None
+    seconds = load_ns / 1e9
+    llm_model_load.observe(seconds)
+    return seconds
+
+
+def observe_llm_stream(
+    seconds: float, first_chunk: float, chunks: int, nbytes: int, ok: bool, load_ns: Optional[int] = None
+) -> None:
+    """Record one finished stream; callers count chunks/bytes locally and report once."""
+    (_llm_stream_ok if ok else _llm_stream_error).observe(seconds)
+    load = observe_llm_load(load_ns)
+    if first_chunk >= 0:
+        llm_first_chunk.observe(first_chunk)
+        if load is not None:
+            (_llm_first_chunk_cold if load > COLD_LOAD_SECONDS else _llm_first_chunk_warm).observe(first_chunk)
+    if chunks:
+        llm_stream_chunks.inc(chunks)
+        llm_stream_bytes.inc(nbytes)
+
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """Time every statement on `sync_engine` (pass AsyncEngine.sync_engine)."""
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_metrics_start", None)
+        if start is None:
+            return
+        verb = statement[:6].upper()
+        _db_children.get(verb, _db_other).observe(time.perf_counter() - start)
+
+    event.listen(sync_engine, "before_cursor_execute", before)
+    event.listen(sync_engine, "after_cursor_execute", after)
+
+
+class _StatsCollector:
+    """Expose numeric fields of component stats() dicts as gauges, read at scrape time only."""
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def add(self, prefix: str, fn: Callable[[], dict]) -> None:
+        self._sources[prefix] = fn
+
+    def collect(self):
+        for prefix, fn in self._sources.items():
+            for key, value in fn().items():
+                if isinstance(value, dict):
+                    yield from self._labelled(f"{prefix}_{key}", value)
+                    continue
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                g = GaugeMetricFamily(f"{prefix}_{key}", f"{prefix} stats: {key}")
+                g.add_metric([], float(value))
+                yield g
+
+    @staticmethod
+    def _labelled(prefix: str, entries: dict):
+        # {name: {field: number}} -> one gauge per field, labelled by name
+        families: Dict[str, GaugeMetricFamily] = {}
+        for name, fields in entries.items():
+            if not isinstance(fields, dict):
+                continue
+            for field, value in fields.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                g = families.get(field)
+                if g is None:
+                    g = families[field] = GaugeMetricFamily(f"{prefix}_{field}", f"{prefix} stats: {field}", labels=["name"])
+                g.add_metric([str(name)], float(value))
+        yield from families.values()
+
+    def describe(self):
+        return []
+
+
+stats_collector = _StatsCollector()
+registry.register(stats_collector)
+
+
+def register_stats(prefix: str, fn: Callable[[], dict]) -> None:
+    stats_collector.add(prefix, fn)
+
+
+def render() -> tuple:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no response buffering, safe for streaming) recording
+    request latency per route template rather than per raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route_for(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "<unmatched>"
+        path = self._routes.get(endpoint)
+        if path is None:
+            path = "<unknown>"
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            self._routes[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.labels(scope["method"], self._route_for(scope), str(status)).observe(
+                time.perf_counter() - start
+            )
@@ -1,23 +1,51 @@
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    username: str = Field(index=True, nullable=False)
+    username: str = Field(index=True, unique=True, nullable=False)
     email: Optional[str] = Field(default=None, index=True, nullable=True)
     hashed_password: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Session(SQLModel, table=True):
+    __table_args__ = (Index("ix_session_user_id_created_at", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Message(SQLModel, table=True):
+    __table_args__ = (Index("ix_message_session_id_created_at_id", "session_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: int
     role: str
     content: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ArchivedMessage(SQLModel, table=True):
+    """A cold Message moved out of the hot table; same id, content zlib-compressed."""
+
+    __table_args__ = (Index("ix_archivedmessage_session_id_created_at_id", "session_id", "created_at", "id"),)
+
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    session_id: int
+    role: str
+    content: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SessionSummary(SQLModel, table=True):
+    """Rolling summary of a session's older messages, extended as the session grows."""
+
+    session_id: int = Field(primary_key=True, foreign_key="session.id")
+    content: str
+    # (created_at, id) of the last message folded in; later messages are not covered
+    through_created_at: datetime
+    through_message_id: int
+    messages: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Deque, Optional, TypeVar
+
+# Generations allowed to run against Ollama at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Requests allowed to wait for a slot (all users / one user)
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_QUEUE_PER_USER = int(os.getenv("LLM_MAX_QUEUE_PER_USER", "8"))
+# Longest a request may wait in the queue before being turned away
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# Wall-clock budget for one generation, once admitted
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "120"))
+
+T = TypeVar("T")
+
+
+class SchedulerRejected(Exception):
+    """Raised when a request can't be admitted; maps to 429/503 with Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """
+    Admission control in front of llm_service: at most `max_concurrency`
+    generations run; the rest wait in per-user queues that are served
+    round-robin, so one chatty user can't starve everyone else.
+
+    Background work (summaries) waits in a separate lane that only gets a
+    freed slot when no interactive request is queued.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_queue_per_user: int = LLM_MAX_QUEUE_PER_USER,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._queued = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._background: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._wait_max = 0.0
+        self._service_time = 1.0  # EWMA of slot hold time, for Retry-After
+
+    def _retry_after(self) -> int:
+        backlog = (self._queued + 1) / max(1, self.max_concurrency)
+        return max(1, int(backlog * self._service_time + 0.5))
+
+    def _record_wait(self, waited: float) -> None:
+        self._waits.append(waited)
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+    async def acquire(self, user: str, background: bool = False) -> float:
+        """Wait for a slot; returns when it was granted (monotonic), to hand back to release()."""
+        if self._active < self.max_concurrency and self._queued == 0:
+            self._active += 1
+            self.admitted += 1
+            self._record_wait(0.0)
+            return time.monotonic()
+
+        # the user's own limit first: 429 tells them to slow down even when the whole queue is full too
+        lane = self._background if background else self._waiters
+        queue = lane.get(user)
+        if queue is not None and len(queue) >= self.max_queue_per_user:
+            self.rejected += 1
+            raise SchedulerRejected(429, "too many queued requests for this user", self._retry_after())
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerRejected(503, "LLM queue is full", self._retry_after())
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = lane[user] = deque()
+        queue.append(fut)
+        self._queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                fut.cancel()
+                self._discard(lane, user, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise SchedulerRejected(503, "timed out waiting for an LLM slot", self._retry_after())
+            raise
+        self.admitted += 1
+        granted = time.monotonic()
+        self._record_wait(granted - started)
+        return granted
+
+    def _discard(self, lane: "OrderedDict[str, Deque[asyncio.Future]]", user: str, fut: asyncio.Future) -> None:
+        queue = lane.get(user)
+        if queue is None:
+            return
+        try:
+            queue.remove(fut)
+            self._queued -= 1
+        except ValueError:
+            pass
+        if not queue:
+            del lane[user]
+
+    def release(self, acquired: Optional[float] = None) -> None:
+        if acquired is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - acquired)
+        # hand the slot straight to the next user in rotation, interactive requests first
+        for lane in (self._waiters, self._background):
+            while lane:
+                user, queue = next(iter(lane.items()))
+                fut = queue.popleft()
+                self._queued -= 1
+                if queue:
+                    lane.move_to_end(user)
+                else:
+                    del lane[user]
+                if not fut.done():
+                    fut.set_result(None)
+                    return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, user: str, background: bool = False) -> AsyncIterator[None]:
+        acquired = await self.acquire(user, background)
+        try:
+            yield
+        finally:
+            self.release(acquired)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queued": self._queued,
+            "queued_users": len(self._waiters),
+            "queued_background": sum(len(q) for q in self._background.values()),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_p50": pct(0.50),
+            "wait_p95": pct(0.95),
+            "wait_max": self._wait_max,
+        }
+
+
+async def iter_with_deadline(agen: AsyncGenerator[T, None], deadline: float) -> AsyncGenerator[T, None]:
+    """Re-yield from `agen`, raising asyncio.TimeoutError once the monotonic deadline passes."""
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                item = await asyncio.wait_for(agen.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await agen.aclose()
+
+
+scheduler = LLMScheduler()
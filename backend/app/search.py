@@ -0,0 +1,197 @@
+import html
+import re
+import zlib
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# Highlight markers: private-use code points, swapped for <mark> after the
+# snippet has been HTML-escaped so message content can't inject markup.
+_START, _STOP = "\ue000", "\ue001"
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_fts
+    USING fts5(content, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    # archived content is compressed, so the archive index keeps its own copy of the text
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS archivedmessage_fts
+    USING fts5(content, tokenize='unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS archivedmessage_fts_ad AFTER DELETE ON archivedmessage BEGIN
+        DELETE FROM archivedmessage_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+POSTGRES_FTS_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_message_content_fts ON message USING GIN (to_tsvector('simple', content))",
+    """
+    CREATE TABLE IF NOT EXISTS archivedmessage_fts (
+        id INTEGER PRIMARY KEY REFERENCES archivedmessage (id) ON DELETE CASCADE,
+        content TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_archivedmessage_fts_content ON archivedmessage_fts USING GIN (to_tsvector('simple', content))",
+]
+
+
+def ensure_search_index(sync_conn) -> None:
+    """
+    Create the full-text indexes if missing (for create_all setups; migrations
+    do the same in 0003 and 0006). Run via `await conn.run_sync(ensure_search_index)`.
+    """
+    name = sync_conn.dialect.name
+    if name == "sqlite":
+        exists = sync_conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='message_fts'"
+        ).first()
+        archive_exists = sync_conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='archivedmessage_fts'"
+        ).first()
+        for ddl in SQLITE_FTS_DDL:
+            sync_conn.exec_driver_sql(ddl)
+        if not exists:
+            sync_conn.exec_driver_sql("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+        if not archive_exists:
+            _backfill_archive(sync_conn)
+    elif name == "postgresql":
+        for ddl in POSTGRES_FTS_DDL:
+            sync_conn.exec_driver_sql(ddl)
+        if not sync_conn.execute(text("SELECT 1 FROM archivedmessage_fts LIMIT 1")).first():
+            _backfill_archive(sync_conn)
+
+
+def _backfill_archive(sync_conn) -> None:
+    """Index messages archived before the archive index existed."""
+    rows = sync_conn.execute(text("SELECT id, content FROM archivedmessage")).fetchall()
+    if rows:
+        sync_conn.execute(
+            _archive_insert(sync_conn.dialect.name),
+            [{"id": r.id, "content": zlib.decompress(r.content).decode("utf-8")} for r in rows],
+        )
+
+
+def _archive_insert(dialect: str):
+    column = "rowid" if dialect == "sqlite" else "id"
+    return text(f"INSERT INTO archivedmessage_fts ({column}, content) VALUES (:id, :content)")
+
+
+async def index_archived(db: AsyncSession, rows: Iterable[dict]) -> None:
+    """
+    Add archived messages ({"id", "content"} with plain-text content) to the
+    archive index, in the caller's transaction, so they stay searchable.
+    """
+    rows = list(rows)
+    if rows:
+        await db.execute(_archive_insert(db.bind.dialect.name), rows)
+
+
+def _terms(query: str) -> list[str]:
+    return _TERM.findall(query)[:16]
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+# hot and archived messages are ranked together; archivedmessage_fts holds the archived text
+_SQLITE_SEARCH = text(
+    f"""
+    SELECT m.id AS id, m.session_id, m.role, m.created_at, s.name AS session_name,
+           snippet(message_fts, 0, '{_START}', '{_STOP}', '…', 16) AS snippet,
+           bm25(message_fts) AS rank
+    FROM message_fts
+    JOIN message m ON m.id = message_fts.rowid
+    JOIN session s ON s.id = m.session_id
+    WHERE message_fts MATCH :match AND s.user_id = :user_id
+    UNION ALL
+    SELECT a.id AS id, a.session_id, a.role, a.created_at, s.name AS session_name,
+           snippet(archivedmessage_fts, 0, '{_START}', '{_STOP}', '…', 16) AS snippet,
+           bm25(archivedmessage_fts) AS rank
+    FROM archivedmessage_fts
+    JOIN archivedmessage a ON a.id = archivedmessage_fts.rowid
+    JOIN session s ON s.id = a.session_id
+    WHERE archivedmessage_fts MATCH :match AND s.user_id = :user_id
+    ORDER BY rank, id
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+_POSTGRES_SEARCH = text(
+    f"""
+    SELECT m.id AS id, m.session_id, m.role, m.created_at, s.name AS session_name,
+           ts_headline('simple', m.content, q.query,
+                       'StartSel={_START}, StopSel={_STOP}, MaxFragments=2, MaxWords=24, MinWords=8') AS snippet,
+           -ts_rank_cd(to_tsvector('simple', m.content), q.query) AS rank
+    FROM message m
+    JOIN session s ON s.id = m.session_id,
+         plainto_tsquery('simple', :match) AS q(query)
+    WHERE to_tsvector('simple', m.content) @@ q.query AND s.user_id = :user_id
+    UNION ALL
+    SELECT a.id AS id, a.session_id, a.role, a.created_at, s.name AS session_name,
+           ts_headline('simple', f.content, q.query,
+                       'StartSel={_START}, StopSel={_STOP}, MaxFragments=2, MaxWords=24, MinWords=8') AS snippet,
+           -ts_rank_cd(to_tsvector('simple', f.content), q.query) AS rank
+    FROM archivedmessage_fts f
+    JOIN archivedmessage a ON a.id = f.id
+    JOIN session s ON s.id = a.session_id,
+         plainto_tsquery('simple', :match) AS q(query)
+    WHERE to_tsvector('simple', f.content) @@ q.query AND s.user_id = :user_id
+    ORDER BY rank, id
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+
+async def search_messages(
+    db: AsyncSession, user_id: int, query: str, limit: int = 20, offset: int = 0
+) -> tuple[list[dict], Optional[int]]:
+    """
+    Ranked full-text search over one user's messages, hot and archived.
+    Returns (results, next_offset); next_offset is None on the last page.
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], None
+    if db.bind.dialect.name == "postgresql":
+        stmt, match = _POSTGRES_SEARCH, " ".join(terms)
+    else:
+        # quote every term so user input can't use FTS5 query syntax
+        stmt, match = _SQLITE_SEARCH, " ".join(f'"{t}"' for t in terms)
+    rows = (
+        await db.execute(stmt, {"match": match, "user_id": user_id, "limit": limit + 1, "offset": offset})
+    ).mappings().all()
+    results = [
+        {
+            "message_id": r["id"],
+            "session_id": r["session_id"],
+            "session_name": r["session_name"],
+            "role": r["role"],
+            "created_at": r["created_at"],
+            "snippet": _highlight(r["snippet"] or ""),
+            "score": -float(r["rank"]),
+        }
+        for r in rows[:limit]
+    ]
+    return results, (offset + limit if len(rows) > limit else None)
@@ -0,0 +1,403 @@
+"""
+Embedding-backed features on top of a per-user VectorIndex (vectorindex.py).
+
+Semantic response cache: a session's first prompt is embedded and
+compared with every earlier user prompt of the same user; at or above
+SEMANTIC_CACHE_THRESHOLD cosine similarity the stored assistant answer to
+that prompt is returned without calling the model. Later turns depend on
+their conversation and are never served from the cache.
+
+Relevant-history retrieval: instead of filling HISTORY_TOKEN_BUDGET with
+the most recent messages only, the prompt gets the summary and the last
+HISTORY_RETRIEVAL_RECENT_TOKENS of conversation, plus up to
+HISTORY_RETRIEVAL_K earlier messages of the session that are most similar
+to the new prompt.
+
+Indexes are maintained by a background worker: notify(user_id) after new
+messages were written makes it embed the user's messages with an id above
+the index's newest one (hot and archived, in id order) and append them to
+the index on disk, so catching up after a restart or on an existing
+database is the same code path. Ids are not committed in order on
+Postgres, so each catch-up also re-reads the last SEMANTIC_RESCAN_IDS ids
+below the newest indexed one and adds whatever is missing; a message
+committed later than that many ids after its own is only indexed when the
+index is rebuilt (delete its directory). Request handlers only read indexes that
+are already in memory; a user whose index is not loaded yet is served as
+if both features were off and gets notified instead.
+
+At most SEMANTIC_EMBED_CONCURRENCY embedding calls run at once, for the
+worker and request handlers together, so catching up on a long history
+can't crowd generations out of Ollama. The worker holds at most one less
+than that, so a request's prompt embedding never queues behind a whole
+catch-up batch (with a concurrency of 1 they share the single slot).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from sqlalchemy import null, select, union_all
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import crud, db, llm_service
+from .archive import decompress_content
+from .history import HISTORY_TOKEN_BUDGET, TRUNCATED_MARK, estimate_tokens, history_cache
+from .models import ArchivedMessage, Message, Session as ChatSession
+
+if TYPE_CHECKING:
+    # numpy is only imported once the first index is loaded, not with the app
+    import numpy as np
+
+    from .vectorindex import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _flag(name: str) -> bool:
+    return os.getenv(name, "false").lower() in ("1", "true", "yes")
+
+
+SEMANTIC_CACHE_ENABLED = _flag("SEMANTIC_CACHE_ENABLED")
+# Cosine similarity at or above which an earlier answer is reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+HISTORY_RETRIEVAL_ENABLED = _flag("HISTORY_RETRIEVAL_ENABLED")
+# Earlier messages of the session added to the prompt by similarity
+HISTORY_RETRIEVAL_K = int(os.getenv("HISTORY_RETRIEVAL_K", "6"))
+# Part of the history budget always spent on the most recent messages
+HISTORY_RETRIEVAL_RECENT_TOKENS = int(os.getenv("HISTORY_RETRIEVAL_RECENT_TOKENS", "1000"))
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", "semantic_index")
+# Per-user indexes kept in memory (LRU); evicted ones are saved first
+SEMANTIC_MAX_USERS = int(os.getenv("SEMANTIC_MAX_USERS", "100"))
+# Messages read per catch-up step
+SEMANTIC_SYNC_BATCH = int(os.getenv("SEMANTIC_SYNC_BATCH", "32"))
+# Ids below the newest indexed one that every catch-up reads again for late commits
+SEMANTIC_RESCAN_IDS = int(os.getenv("SEMANTIC_RESCAN_IDS", "1000"))
+# Embedding requests in flight at once, background indexing and request path together
+SEMANTIC_EMBED_CONCURRENCY = int(os.getenv("SEMANTIC_EMBED_CONCURRENCY", "2"))
+# Incremental segments on disk before an index is rewritten as one base segment
+SEMANTIC_MAX_SEGMENTS = int(os.getenv("SEMANTIC_MAX_SEGMENTS", "8"))
+# Longer texts are truncated before embedding
+SEMANTIC_MAX_CHARS = int(os.getenv("SEMANTIC_MAX_CHARS", "8000"))
+# Recent prompt embeddings kept so a prompt is embedded once for lookup, retrieval and indexing
+SEMANTIC_MEMO_SIZE = int(os.getenv("SEMANTIC_MEMO_SIZE", "1024"))
+
+_RETRIEVED_PREFIX = "Relevant earlier messages from this conversation:\n"
+
+Embed = Callable[[str], Awaitable[list[float]]]
+
+
+def _is_error(content: str) -> bool:
+    # failed calls and answers cut off mid-stream are neither indexed nor served from the cache
+    return content.startswith("(ollama-http-") or content.endswith(TRUNCATED_MARK)
+
+
+class SemanticIndex:
+    def __init__(
+        self,
+        embed: Optional[Embed] = None,
+        model: str = llm_service.OLLAMA_EMBED_MODEL,
+        directory: str = SEMANTIC_INDEX_DIR,
+        max_users: int = SEMANTIC_MAX_USERS,
+        sync_batch: int = SEMANTIC_SYNC_BATCH,
+        rescan_ids: int = SEMANTIC_RESCAN_IDS,
+        max_segments: int = SEMANTIC_MAX_SEGMENTS,
+        embed_concurrency: int = SEMANTIC_EMBED_CONCURRENCY,
+        session_factory: Optional[Callable] = None,
+        enabled: bool = SEMANTIC_CACHE_ENABLED or HISTORY_RETRIEVAL_ENABLED,
+    ):
+        self._embed = embed or (lambda text: llm_service.embed(text, model=model))
+        self.model = model
+        self.directory = Path(directory)
+        self.max_users = max_users
+        self.sync_batch = sync_batch
+        self.rescan_ids = rescan_ids
+        self.max_segments = max_segments
+        self._session_factory = session_factory
+        self.enabled = enabled
+        # user id -> index, or None when the user has nothing indexed yet
+        self._indexes: "OrderedDict[int, Optional[VectorIndex]]" = OrderedDict()
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pending: dict[int, None] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._saving: Optional[asyncio.Future] = None
+        self._sync_lock = asyncio.Lock()
+        self._embed_slots = asyncio.Semaphore(embed_concurrency)
+        # background indexing leaves one slot to request handlers
+        self._background_slots = asyncio.Semaphore(max(1, embed_concurrency - 1))
+        self.embeddings = 0
+        self.memo_hits = 0
+        self.indexed = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retrievals = 0
+        self.retrieved_messages = 0
+        self.failures = 0
+        self.search_seconds = 0.0
+        self.searches = 0
+
+    # embeddings
+
+    async def embed_text(self, text: str, background: bool = False) -> "np.ndarray":
+        import numpy as np
+
+        text = text[:SEMANTIC_MAX_CHARS]
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        vector = self._memo.get(key)
+        if vector is not None:
+            self.memo_hits += 1
+            self._memo.move_to_end(key)
+            return vector
+        if background:
+            async with self._background_slots, self._embed_slots:
+                vector = np.asarray(await self._embed(text), dtype=np.float32)
+        else:
+            async with self._embed_slots:
+                vector = np.asarray(await self._embed(text), dtype=np.float32)
+        self.embeddings += 1
+        self._memo[key] = vector
+        while len(self._memo) > SEMANTIC_MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return vector
+
+    # background maintenance
+
+    def notify(self, user_id: Optional[int]) -> None:
+        if not self.enabled or user_id is None:
+            return
+        self._pending[user_id] = None
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def start(self) -> None:
+        if self.enabled:
+            self._ensure_worker()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._saving is not None:
+            # a save running in its thread outlives the cancelled worker
+            try:
+                await self._saving
+            except Exception:
+                pass
+        # whatever was embedded but not yet written would otherwise be embedded again on the next start
+        for user_id, index in list(self._indexes.items()):
+            await self._save(user_id, index)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.run_pending()
+
+    async def run_pending(self) -> None:
+        while self._pending:
+            user_id = next(iter(self._pending))
+            del self._pending[user_id]
+            try:
+                await self.sync(user_id)
+            except Exception:
+                self.failures += 1
+                logger.exception("indexing messages of user %s failed", user_id)
+
+    def _path(self, user_id: int) -> Path:
+        return self.directory / f"user-{user_id}"
+
+    async def _save(self, user_id: int, index: "Optional[VectorIndex]") -> None:
+        if index is None or not index.dirty:
+            return
+        self._saving = asyncio.ensure_future(asyncio.to_thread(index.save, self._path(user_id), self.max_segments))
+        await asyncio.shield(self._saving)
+
+    async def _load(self, user_id: int) -> "Optional[VectorIndex]":
+        from .vectorindex import VectorIndex
+
+        if user_id in self._indexes:
+            self._indexes.move_to_end(user_id)
+            return self._indexes[user_id]
+        index = await asyncio.to_thread(VectorIndex.load, self._path(user_id), self.model)
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.max_users:
+            evicted, old = self._indexes.popitem(last=False)
+            await self._save(evicted, old)
+        return index
+
+    async def sync(self, user_id: int) -> int:
+        """Embed and index the user's messages newer than the index; returns how many were added."""
+        async with self._sync_lock:
+            return await self._sync(user_id)
+
+    async def _sync(self, user_id: int) -> int:
+        index = await self._load(user_id)
+        after = max(0, index.max_id - self.rescan_ids) if index is not None else 0
+        factory = self._session_factory or db.session_factory()
+        added = 0
+        async with factory() as session:
+            while True:
+                # messages archived before they were indexed are read from the archive
+                hot = (
+                    select(
+                        Message.id.label("id"), Message.session_id.label("session_id"), Message.role.label("role"),
+                        Message.content.label("content"), null().label("blob"),
+                    )
+                    .join(ChatSession, ChatSession.id == Message.session_id)
+                    .where(ChatSession.user_id == user_id, Message.id > after)
+                )
+                cold = (
+                    select(
+                        ArchivedMessage.id, ArchivedMessage.session_id, ArchivedMessage.role,
+                        null().label("content"), ArchivedMessage.content.label("blob"),
+                    )
+                    .join(ChatSession, ChatSession.id == ArchivedMessage.session_id)
+                    .where(ChatSession.user_id == user_id, ArchivedMessage.id > after)
+                )
+                rows = (await session.execute(union_all(hot, cold).order_by("id").limit(self.sync_batch))).all()
+                if not rows:
+                    break
+                after = rows[-1].id
+                rows = [
+                    (r.id, r.session_id, r.role, r.content if r.blob is None else decompress_content(r.blob))
+                    for r in rows
+                    if r.role in ("user", "assistant")
+                ]
+                rows = [r for r in rows if r[3] and not _is_error(r[3])]
+                if rows and index is not None:
+                    known = index.contains([r[0] for r in rows])
+                    rows = [r for r, seen in zip(rows, known) if not seen]
+                if not rows:
+                    continue
+                vectors = await asyncio.gather(*(self.embed_text(content, background=True) for _, _, _, content in rows))
+                if index is None:
+                    from .vectorindex import VectorIndex
+
+                    index = self._indexes[user_id] = VectorIndex(len(vectors[0]), self.model)
+                ids, session_ids, roles, _ = zip(*rows)
+                index.add(list(ids), list(session_ids), list(roles), vectors)
+                added += len(rows)
+        self.indexed += added
+        await self._save(user_id, index)
+        return added
+
+    def _search(self, index: "VectorIndex", vector: "np.ndarray", k: int, **filters) -> list[tuple[int, float]]:
+        started = time.perf_counter()
+        try:
+            return index.search(vector, k, **filters)
+        finally:
+            self.searches += 1
+            self.search_seconds += time.perf_counter() - started
+
+    # request path
+
+    async def lookup_answer(self, db: AsyncSession, user_id: int, prompt: str) -> Optional[str]:
+        """A stored answer to an earlier prompt of this user that means the same, or None."""
+        index = self._indexes.get(user_id)
+        if index is None:
+            self.cache_misses += 1
+            self.notify(user_id)
+            return None
+        try:
+            vector = await self.embed_text(prompt)
+        except Exception as e:
+            self.failures += 1
+            self.cache_misses += 1
+            logger.warning("embedding the prompt failed, skipping the semantic cache: %s", e)
+            return None
+        best = self._search(index, vector, 1, role="user", min_score=SEMANTIC_CACHE_THRESHOLD)
+        if best:
+            asked = await crud.get_messages_by_ids(db, [best[0][0]])
+            if asked:
+                question = asked[0]
+                reply = await crud.get_messages(db, question.session_id, limit=1, after=(question.created_at, question.id))
+                if reply and reply[0].role == "assistant" and not _is_error(reply[0].content):
+                    self.cache_hits += 1
+                    return reply[0].content
+        self.cache_misses += 1
+        return None
+
+    async def build_context(self, db: AsyncSession, user_id: int, session_id: int, prompt: str) -> list[dict]:
+        """
+        Summary and recent messages within HISTORY_RETRIEVAL_RECENT_TOKENS, then the
+        session's messages most similar to `prompt` in what is left of the budget.
+        Falls back to the recent-only context when there is nothing to retrieve.
+        """
+        budget = max(0, HISTORY_TOKEN_BUDGET - estimate_tokens(prompt))
+        index = self._indexes.get(user_id)
+        if index is None:
+            self.notify(user_id)
+            return await history_cache.get_context(db, session_id, budget)
+        recent = await history_cache.get_context(db, session_id, min(budget, HISTORY_RETRIEVAL_RECENT_TOKENS))
+        try:
+            vector = await self.embed_text(prompt)
+        except Exception as e:
+            self.failures += 1
+            logger.warning("embedding the prompt failed, sending recent history only: %s", e)
+            return await history_cache.get_context(db, session_id, budget)
+
+        seen = {(m["role"], m["content"]) for m in recent}
+        hits = self._search(index, vector, HISTORY_RETRIEVAL_K + len(recent), session_id=session_id)
+        rows = {m.id: m for m in await crud.get_messages_by_ids(db, [i for i, _ in hits])}
+        room = budget - sum(estimate_tokens(m["content"]) for m in recent) - estimate_tokens(_RETRIEVED_PREFIX)
+        picked = []
+        for message_id, _ in hits:  # best first
+            m = rows.get(message_id)
+            if m is None or (m.role, m.content) in seen:
+                continue
+            cost = estimate_tokens(m.content)
+            if cost > room:
+                continue
+            picked.append(m)
+            room -= cost
+            if len(picked) == HISTORY_RETRIEVAL_K:
+                break
+        if not picked:
+            return await history_cache.get_context(db, session_id, budget)
+
+        self.retrievals += 1
+        self.retrieved_messages += len(picked)
+        picked.sort(key=lambda m: (m.created_at, m.id))
+        note = {"role": "system", "content": _RETRIEVED_PREFIX + "\n".join(f"{m.role}: {m.content}" for m in picked)}
+        # after the summary header, before the verbatim recent turns
+        at = 1 if recent and recent[0]["role"] == "system" else 0
+        return recent[:at] + [note] + recent[at:]
+
+    def stats(self) -> dict:
+        loaded = [index for index in self._indexes.values() if index is not None]
+        return {
+            "enabled": self.enabled,
+            "cache_enabled": SEMANTIC_CACHE_ENABLED,
+            "retrieval_enabled": HISTORY_RETRIEVAL_ENABLED,
+            "model": self.model,
+            "users": len(self._indexes),
+            "vectors": sum(len(index) for index in loaded),
+            "bytes": sum(index.nbytes() for index in loaded),
+            "pending": len(self._pending),
+            "embeddings": self.embeddings,
+            "memo_hits": self.memo_hits,
+            "indexed": self.indexed,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "retrievals": self.retrievals,
+            "retrieved_messages": self.retrieved_messages,
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0,
+            "failures": self.failures,
+        }
+
+
+semantic_index = SemanticIndex()
@@ -0,0 +1,303 @@
+"""
+Resumable generations for /api/chat/stream.
+
+Each streamed answer is produced by its own task, which writes frames
+into a Generation's ring buffer; HTTP responses only read from it. A
+client that lost its connection reconnects to
+GET /api/chat/stream/{stream_id}?offset=<bytes received> and gets the rest
+of the same answer instead of a new one. Offsets count response bytes,
+since HTTP chunk boundaries do not survive proxies and client libraries.
+
+When the last reader goes away mid-answer, a STREAM_RESUME_GRACE timer
+starts; if nobody reattaches before it fires, the producer task is
+cancelled, which closes the upstream request and stops Ollama generating
+for nobody. Finished generations stay readable for STREAM_RETAIN_SECONDS.
+
+Memory is bounded twice: a generation keeps at most STREAM_BUFFER_BYTES
+(oldest frames are dropped first, so only the tail stays resumable), and
+once all buffers together pass STREAM_BUFFER_TOTAL_BYTES, finished
+generations are dropped oldest first, then the largest live buffers trimmed.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import AsyncGenerator, Awaitable, Callable, Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds a generation with no reader keeps running before the upstream request is cancelled
+STREAM_RESUME_GRACE = float(os.getenv("STREAM_RESUME_GRACE", "30"))
+# Seconds a finished generation stays resumable
+STREAM_RETAIN_SECONDS = float(os.getenv("STREAM_RETAIN_SECONDS", "60"))
+# Resumable tail kept per generation
+STREAM_BUFFER_BYTES = int(os.getenv("STREAM_BUFFER_BYTES", str(1 << 20)))
+# Cap on all generation buffers together
+STREAM_BUFFER_TOTAL_BYTES = int(os.getenv("STREAM_BUFFER_TOTAL_BYTES", str(64 << 20)))
+
+
+class StreamGone(Exception):
+    """Unknown or expired stream id (404), or an offset the buffer no longer holds (410/416)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Generation:
+    """One streamed answer: frames at byte offsets base..size, plus who is reading them."""
+
+    def __init__(self, registry: "StreamRegistry", stream_id: str, media_type: str, owner: Optional[int] = None):
+        self.registry = registry
+        self.id = stream_id
+        self.media_type = media_type
+        self.owner = owner  # user id whose token is required to resume, None for anonymous streams
+        self._frames: Deque[Tuple[int, bytes]] = deque()  # (offset, data)
+        self.base = 0  # offset of the first byte still buffered
+        self.size = 0  # bytes produced so far
+        self.done = False
+        self.abandoned = False
+        self.readers = 0
+        self.resumes = 0
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._more = asyncio.Event()
+
+    @property
+    def buffered(self) -> int:
+        return self.size - self.base
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self._frames.append((self.size, data))
+        self.size += len(data)
+        self.registry._written(self, len(data))
+        more, self._more = self._more, asyncio.Event()
+        more.set()
+
+    def _trim(self, keep: int) -> int:
+        """Drop oldest frames until at most `keep` bytes are buffered; returns the bytes freed."""
+        freed = 0
+        while self._frames and self.buffered > keep:
+            offset, data = self._frames.popleft()
+            self.base = offset + len(data)
+            freed += len(data)
+        return freed
+
+    def _finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._more.set()
+
+    def reader(self, offset: int = 0) -> "StreamReader":
+        if offset > self.size:
+            raise StreamGone(416, f"offset {offset} is beyond the {self.size} bytes produced so far")
+        if offset < self.base:
+            raise StreamGone(410, f"bytes before offset {self.base} are no longer buffered")
+        return StreamReader(self, offset)
+
+    async def _frames_from(self, position: int) -> AsyncGenerator[bytes, None]:
+        while True:
+            if position < self.size:
+                if position < self.base:
+                    # a reader too slow for the ring buffer; it can reconnect from the tail
+                    yield b"\n[stream error] fell behind the resume buffer\n"
+                    return
+                pending = [data[max(0, position - offset):] for offset, data in self._frames if offset + len(data) > position]
+                position = self.size
+                for data in pending:
+                    yield data
+            elif self.done:
+                return
+            else:
+                await self._more.wait()
+
+
+class StreamReader:
+    """Async iterator over a generation from `offset`; counts as attached while iterating."""
+
+    def __init__(self, generation: Generation, offset: int):
+        self.generation = generation
+        self.offset = offset
+        self._attached = False
+
+    async def __aiter__(self) -> AsyncGenerator[bytes, None]:
+        self.generation.registry._attach(self.generation)
+        self._attached = True
+        try:
+            async for data in self.generation._frames_from(self.offset):
+                yield data
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        # also run as the response's background task: a disconnect can leave the iterator suspended
+        if self._attached:
+            self._attached = False
+            self.generation.registry._detach(self.generation)
+
+
+Produce = Callable[[Generation], Awaitable[None]]
+
+
+class StreamRegistry:
+    def __init__(
+        self,
+        grace: float = STREAM_RESUME_GRACE,
+        retain: float = STREAM_RETAIN_SECONDS,
+        max_bytes: int = STREAM_BUFFER_BYTES,
+        max_total_bytes: int = STREAM_BUFFER_TOTAL_BYTES,
+    ):
+        self.grace = grace
+        self.retain = retain
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self._generations: "OrderedDict[str, Generation]" = OrderedDict()
+        self.buffered_bytes = 0
+        self.started = 0
+        self.completed = 0
+        self.resumes = 0
+        self.abandoned = 0
+        self.expired = 0
+        self.evicted = 0
+        self.trimmed_bytes = 0
+        self.reclaimed_bytes = 0
+
+    def start(
+        self, produce: Produce, media_type: str = "text/plain; charset=utf-8", owner: Optional[int] = None
+    ) -> Generation:
+        """Run `produce(generation)` as a task writing into a new generation; nobody is reading yet."""
+        generation = Generation(self, secrets.token_urlsafe(16), media_type, owner)
+        self._generations[generation.id] = generation
+        self.started += 1
+        generation.task = asyncio.get_running_loop().create_task(self._run(generation, produce))
+        # a response body that is never iterated must not keep the generation alive either
+        self._arm(generation)
+        return generation
+
+    def get(self, stream_id: str) -> Generation:
+        generation = self._generations.get(stream_id)
+        if generation is None:
+            raise StreamGone(404, "unknown or expired stream")
+        return generation
+
+    def resume(self, stream_id: str, offset: int) -> StreamReader:
+        reader = self.get(stream_id).reader(offset)
+        reader.generation.resumes += 1
+        self.resumes += 1
+        return reader
+
+    async def _run(self, generation: Generation, produce: Produce) -> None:
+        try:
+            await produce(generation)
+            self.completed += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("stream %s failed", generation.id)
+        finally:
+            self._disarm(generation)
+            generation._finish()
+            asyncio.get_running_loop().call_later(self.retain, self._expire, generation.id)
+
+    # readers
+
+    def _attach(self, generation: Generation) -> None:
+        generation.readers += 1
+        self._disarm(generation)
+
+    def _detach(self, generation: Generation) -> None:
+        generation.readers -= 1
+        if generation.readers == 0:
+            self._arm(generation)
+
+    def _arm(self, generation: Generation) -> None:
+        if not generation.done and generation._timer is None:
+            generation._timer = asyncio.get_running_loop().call_later(self.grace, self._abandon, generation)
+
+    def _disarm(self, generation: Generation) -> None:
+        if generation._timer is not None:
+            generation._timer.cancel()
+            generation._timer = None
+
+    def _abandon(self, generation: Generation) -> None:
+        generation._timer = None
+        if generation.readers == 0 and not generation.done:
+            # cancelling the producer closes the upstream request, which makes Ollama stop
+            generation.abandoned = True
+            self.abandoned += 1
+            generation.task.cancel()
+
+    # memory
+
+    def _written(self, generation: Generation, nbytes: int) -> None:
+        self.buffered_bytes += nbytes
+        if generation.buffered > self.max_bytes:
+            freed = generation._trim(self.max_bytes)
+            self.buffered_bytes -= freed
+            self.trimmed_bytes += freed
+        if self.buffered_bytes > self.max_total_bytes:
+            self._reclaim()
+
+    def _reclaim(self) -> None:
+        for generation in [g for g in self._generations.values() if g.done]:
+            if self.buffered_bytes <= self.max_total_bytes:
+                return
+            self._drop(generation.id)
+            self.evicted += 1
+        while self.buffered_bytes > self.max_total_bytes:
+            largest = max(self._generations.values(), key=lambda g: g.buffered)
+            freed = largest._trim(max(0, largest.buffered - (self.buffered_bytes - self.max_total_bytes)))
+            if not freed:
+                return
+            self.buffered_bytes -= freed
+            self.trimmed_bytes += freed
+
+    def _drop(self, stream_id: str) -> None:
+        generation = self._generations.pop(stream_id, None)
+        if generation is not None:
+            freed = generation._trim(0)
+            self.buffered_bytes -= freed
+            self.reclaimed_bytes += freed
+
+    def _expire(self, stream_id: str) -> None:
+        if stream_id in self._generations:
+            self.expired += 1
+            self._drop(stream_id)
+
+    async def stop(self) -> None:
+        tasks = [g.task for g in self._generations.values() if g.task is not None and not g.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for stream_id in list(self._generations):
+            self._drop(stream_id)
+
+    def stats(self) -> dict:
+        live = [g for g in self._generations.values() if not g.done]
+        return {
+            "live": len(live),
+            "finished": len(self._generations) - len(live),
+            "readers": sum(g.readers for g in self._generations.values()),
+            "detached": sum(1 for g in live if g.readers == 0),
+            "buffered_bytes": self.buffered_bytes,
+            "max_bytes": self.max_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "grace_seconds": self.grace,
+            "started": self.started,
+            "completed": self.completed,
+            "resumes": self.resumes,
+            "abandoned": self.abandoned,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "trimmed_bytes": self.trimmed_bytes,
+            "reclaimed_bytes": self.reclaimed_bytes,
+        }
+
+
+stream_registry = StreamRegistry()
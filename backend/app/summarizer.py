@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from . import crud, db, llm_service
+from .history import estimate_tokens, history_cache
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Compact once messages outside the summary and the recent window exceed this many estimated tokens
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "1500"))
+# The most recent messages are always sent verbatim and never folded
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "8"))
+# Upper bound on new conversation fed to one summarization call
+SUMMARY_MAX_FOLD_TOKENS = int(os.getenv("SUMMARY_MAX_FOLD_TOKENS", "4000"))
+# Uncovered messages read per step of one compaction, besides the recent window
+SUMMARY_READ_BATCH = int(os.getenv("SUMMARY_READ_BATCH", "500"))
+SUMMARY_TARGET_WORDS = int(os.getenv("SUMMARY_TARGET_WORDS", "250"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "") or llm_service.OLLAMA_MODEL
+
+Summarize = Callable[[Optional[str], list[dict]], Awaitable[str]]
+
+
+async def summarize_with_llm(previous: Optional[str], messages: list[dict]) -> str:
+    """Extend `previous` with `messages` in one LLM call, in the scheduler's background lane behind interactive chats."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Update the running summary of a conversation with the new messages below. "
+        "Keep names, facts, decisions, preferences and open questions; drop small talk. "
+        f"Stay under {SUMMARY_TARGET_WORDS} words and reply with the summary only.\n\n"
+        f"Current summary:\n{previous or '(none yet)'}\n\nNew messages:\n{transcript}"
+    )
+    async with scheduler.slot("system:summarizer", background=True):
+        text = await llm_service.call_chat(prompt, model=SUMMARY_MODEL)
+    if text.startswith("(ollama-http-"):
+        raise RuntimeError(text)
+    return text.strip()
+
+
+class ConversationSummarizer:
+    """
+    Background compaction of long sessions into SessionSummary rows.
+
+    notify() marks a session after new messages were written; the worker
+    then folds messages that are older than the last `keep_recent` and not
+    yet covered into the existing summary, so each message is summarized
+    once and a compaction call only ever sees the previous summary plus a
+    bounded slice of new conversation.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Summarize] = None,
+        trigger_tokens: int = SUMMARY_TRIGGER_TOKENS,
+        keep_recent: int = SUMMARY_KEEP_RECENT,
+        max_fold_tokens: int = SUMMARY_MAX_FOLD_TOKENS,
+        read_batch: int = SUMMARY_READ_BATCH,
+        session_factory: Optional[Callable] = None,
+        enabled: bool = SUMMARY_ENABLED,
+    ):
+        self._summarize = summarize or summarize_with_llm
+        self.trigger_tokens = trigger_tokens
+        self.keep_recent = keep_recent
+        self.max_fold_tokens = max(max_fold_tokens, trigger_tokens)
+        self.read_batch = read_batch
+        self._session_factory = session_factory
+        self.enabled = enabled
+        self._pending: dict[int, None] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.compactions = 0
+        self.folded_messages = 0
+        self.failures = 0
+
+    def notify(self, session_id: int) -> None:
+        if not self.enabled:
+            return
+        self._pending[session_id] = None
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def start(self) -> None:
+        if self.enabled:
+            self._ensure_worker()
+
+    async def stop(self) -> None:
+        # summaries are an optimisation: pending sessions are picked up again on their next turn
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.run_pending()
+
+    async def run_pending(self) -> None:
+        while self._pending:
+            session_id = next(iter(self._pending))
+            del self._pending[session_id]
+            try:
+                await self.compact(session_id)
+            except Exception:
+                self.failures += 1
+                logger.exception("summarizing session %s failed", session_id)
+
+    async def compact(self, session_id: int) -> int:
+        """Fold uncovered older messages into the session summary; returns how many were folded."""
+        factory = self._session_factory or db.AsyncSessionLocal
+        folded = 0
+        async with factory() as session:
+            summary = await crud.get_summary(session, session_id)
+            after = (summary.through_created_at, summary.through_message_id) if summary else None
+            previous = summary.content if summary else None
+            while True:
+                # a long uncovered stretch is read read_batch messages at a time
+                limit = self.read_batch + self.keep_recent
+                rows = await crud.get_messages(session, session_id, limit=limit, after=after)
+                candidates = rows[: max(0, len(rows) - self.keep_recent)]
+                step = 0
+                while sum(estimate_tokens(m.content) for m in candidates) >= self.trigger_tokens:
+                    batch, used = [], 0
+                    for m in candidates:
+                        used += estimate_tokens(m.content)
+                        if batch and used > self.max_fold_tokens:
+                            break
+                        batch.append(m)
+                    previous = await self._summarize(previous, [{"role": m.role, "content": m.content} for m in batch])
+                    last = batch[-1]
+                    after = (last.created_at, last.id)
+                    await crud.save_summary(session, session_id, previous, after, len(batch))
+                    candidates = candidates[len(batch):]
+                    step += len(batch)
+                    self.compactions += 1
+                folded += step
+                if not step or len(rows) < limit:
+                    break
+        if folded:
+            self.folded_messages += folded
+            # reloaded with the new summary on the next turn
+            history_cache.invalidate(session_id)
+        return folded
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "trigger_tokens": self.trigger_tokens,
+            "keep_recent": self.keep_recent,
+            "compactions": self.compactions,
+            "folded_messages": self.folded_messages,
+            "failures": self.failures,
+        }
+
+
+summarizer = ConversationSummarizer()
@@ -0,0 +1,267 @@
+"""
+NDJSON export and import of a user's sessions and messages.
+
+Format, one JSON object per line:
+    {"type": "export", "version": 1, "user": ..., "exported_at": ...}
+    {"type": "session", "id": ..., "name": ..., "created_at": ...}      (all sessions first)
+    {"type": "message", "session_id": ..., "role": ..., "content": ..., "created_at": ...}
+
+Export streams rows from a server-side cursor as plain Core rows (no ORM
+identity map), so memory stays flat however long the history is. Import
+reads and validates the whole body first, then writes it in executemany
+batches inside one transaction; session ids are remapped, timestamps kept
+(as naive UTC). The transaction only starts once the upload is complete,
+but on SQLite it still holds the database write lock while it inserts,
+so an import is refused above IMPORT_MAX_ROWS sessions and messages.
+
+CLI, from backend/:
+    python -m app.transfer export alice > alice.ndjson
+    python -m app.transfer import bob < alice.ndjson
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from sqlalchemy import insert, null, select, union_all
+
+from . import db
+from .archive import decompress_content
+from .models import ArchivedMessage, Message, Session as ChatSession
+
+try:
+    from orjson import dumps as _orjson_dumps, loads as _json_loads
+
+    def _dumps(obj: dict) -> bytes:
+        return _orjson_dumps(obj, default=str)
+
+except ModuleNotFoundError:
+    _json_loads = json.loads
+
+    def _dumps(obj: dict) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+# Rows fetched per round trip while exporting
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+# Messages per executemany INSERT while importing
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Sessions plus messages accepted in one import; it is written as one transaction
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "100000"))
+# Longest line accepted while importing; a body without newlines is refused past it
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(16 * 1024 * 1024)))
+
+FORMAT_VERSION = 1
+_ROLES = ("system", "user", "assistant")
+
+
+class ImportFormatError(ValueError):
+    def __init__(self, line: int, detail: str):
+        super().__init__(f"line {line}: {detail}")
+        self.line = line
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat()
+
+
+async def export_lines(user_id: int, username: str = "") -> AsyncIterator[bytes]:
+    """NDJSON lines (newline-terminated) for every session and message of the user."""
+    sessions = ChatSession.__table__
+    messages = Message.__table__
+    archived = ArchivedMessage.__table__
+    yield _dumps(
+        {"type": "export", "version": FORMAT_VERSION, "user": username, "exported_at": _timestamp(datetime.utcnow())}
+    ) + b"\n"
+    async with db.session_factory()() as session:
+        stmt = (
+            select(sessions.c.id, sessions.c.name, sessions.c.created_at)
+            .where(sessions.c.user_id == user_id)
+            .order_by(sessions.c.id)
+        )
+        result = await session.stream(stmt, execution_options={"yield_per": EXPORT_FETCH_SIZE})
+        async for rows in result.partitions(EXPORT_FETCH_SIZE):
+            yield b"".join(
+                _dumps({"type": "session", "id": r.id, "name": r.name, "created_at": _timestamp(r.created_at)}) + b"\n"
+                for r in rows
+            )
+
+        # hot and archived messages in one ordered stream; archived content is decompressed per row
+        columns = ("session_id", "role", "content", "blob", "created_at", "id")
+        hot = select(
+            *(c.label(name) for c, name in zip(
+                (messages.c.session_id, messages.c.role, messages.c.content, null(), messages.c.created_at, messages.c.id), columns
+            ))
+        ).join(sessions, sessions.c.id == messages.c.session_id)
+        cold = select(
+            *(c.label(name) for c, name in zip(
+                (archived.c.session_id, archived.c.role, null(), archived.c.content, archived.c.created_at, archived.c.id), columns
+            ))
+        ).join(sessions, sessions.c.id == archived.c.session_id)
+        stmt = union_all(hot.where(sessions.c.user_id == user_id), cold.where(sessions.c.user_id == user_id)).order_by(
+            "session_id", "created_at", "id"
+        )
+        result = await session.stream(stmt, execution_options={"yield_per": EXPORT_FETCH_SIZE})
+        async for rows in result.partitions(EXPORT_FETCH_SIZE):
+            yield b"".join(
+                _dumps(
+                    {
+                        "type": "message",
+                        "session_id": r.session_id,
+                        "role": r.role,
+                        "content": r.content if r.blob is None else decompress_content(r.blob),
+                        "created_at": _timestamp(r.created_at),
+                    }
+                )
+                + b"\n"
+                for r in rows
+            )
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Split a byte stream (e.g. a request body) into lines without holding more than one line."""
+    max_line = max_line or IMPORT_MAX_LINE_BYTES
+    buf = bytearray()
+    lineno = 0
+    async for chunk in chunks:
+        # only the new bytes are searched for newlines; the unfinished line is never rescanned
+        scan = len(buf)
+        buf += chunk
+        start = 0
+        while (end := buf.find(b"\n", scan)) != -1:
+            if end - start > max_line:
+                raise ImportFormatError(lineno + 1, f"line longer than {max_line} bytes")
+            lineno += 1
+            yield bytes(buf[start:end])
+            start = scan = end + 1
+        del buf[:start]
+        if len(buf) > max_line:
+            raise ImportFormatError(lineno + 1, f"line longer than {max_line} bytes")
+    if buf:
+        yield bytes(buf)
+
+
+def _parse_time(value, line: int) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ImportFormatError(line, f"bad created_at {value!r}")
+    if parsed.tzinfo is not None:
+        # stored as naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _is_key(value) -> bool:
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+async def import_lines(
+    user_id: int, lines: AsyncIterable[bytes], batch_size: Optional[int] = None, max_rows: Optional[int] = None
+) -> dict:
+    """
+    Add the sessions and messages in `lines` to the user's account, all or
+    nothing. Raises ImportFormatError (nothing is written) on a malformed line
+    or past `max_rows` sessions and messages.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    max_rows = max_rows or IMPORT_MAX_ROWS
+    sessions: dict = {}  # exported id -> (name, created_at)
+    messages: list[tuple] = []
+    lineno = 0
+    async for raw in lines:
+        lineno += 1
+        if not raw.strip():
+            continue
+        try:
+            obj = _json_loads(raw)
+        except ValueError:
+            raise ImportFormatError(lineno, "not JSON")
+        kind = obj.get("type") if isinstance(obj, dict) else None
+        if kind == "export":
+            if obj.get("version") != FORMAT_VERSION:
+                raise ImportFormatError(lineno, f"unsupported version {obj.get('version')!r}")
+            continue
+        if kind == "session":
+            if not isinstance(obj.get("name"), str) or not _is_key(obj.get("id")):
+                raise ImportFormatError(lineno, "session needs an int or string id and a name")
+            sessions[obj["id"]] = (obj["name"], _parse_time(obj.get("created_at"), lineno))
+        elif kind == "message":
+            key = obj.get("session_id")
+            if not _is_key(key) or key not in sessions:
+                raise ImportFormatError(lineno, f"message for unknown session {key!r}")
+            if obj.get("role") not in _ROLES or not isinstance(obj.get("content"), str):
+                raise ImportFormatError(lineno, "message needs a valid role and string content")
+            messages.append((key, obj["role"], obj["content"], _parse_time(obj.get("created_at"), lineno)))
+        else:
+            raise ImportFormatError(lineno, f"unknown type {kind!r}")
+        if len(sessions) + len(messages) > max_rows:
+            raise ImportFormatError(lineno, f"more than {max_rows} sessions and messages; split the export")
+
+    async with db.session_factory()() as session:
+        try:
+            session_ids = {}
+            for key, (name, created_at) in sessions.items():
+                result = await session.execute(
+                    insert(ChatSession.__table__).values(name=name, user_id=user_id, created_at=created_at)
+                )
+                session_ids[key] = result.inserted_primary_key[0]
+            for start in range(0, len(messages), batch_size):
+                batch = [
+                    {"session_id": session_ids[key], "role": role, "content": content, "created_at": created_at}
+                    for key, role, content, created_at in messages[start : start + batch_size]
+                ]
+                await session.execute(insert(Message.__table__), batch)
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+    return {"sessions": len(sessions), "messages": len(messages)}
+
+
+async def _cli(args) -> None:
+    import sys
+
+    from . import crud
+
+    async with db.session_factory()() as session:
+        user = await crud.get_user_by_username(session, args.username)
+    if user is None:
+        raise SystemExit(f"no such user: {args.username}")
+
+    if args.command == "export":
+        out = open(args.file, "wb") if args.file else sys.stdout.buffer
+        try:
+            async for chunk in export_lines(user.id, user.username):
+                out.write(chunk)
+        finally:
+            if args.file:
+                out.close()
+    else:
+        src = open(args.file, "rb") if args.file else sys.stdin.buffer
+
+        async def chunks():
+            while True:
+                data = src.read(1 << 16)
+                if not data:
+                    return
+                yield data
+
+        try:
+            counts = await import_lines(user.id, iter_lines(chunks()))
+        finally:
+            if args.file:
+                src.close()
+        print(json.dumps(counts), file=sys.stderr)
+    await db.get_engine().dispose()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="export or import a user's sessions and messages as NDJSON")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("username")
+    parser.add_argument("--file", default=None, help="read/write this file instead of stdin/stdout")
+    asyncio.run(_cli(parser.parse_args()))
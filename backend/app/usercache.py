@@ -0,0 +1,100 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .models import User
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+class AuthCache:
+    """
+    Bounded TTL cache for authentication: token -> subject (skips JWT decode)
+    and subject -> detached User row (skips the user lookup). Lives outside
+    auth.py so crud can invalidate it without a circular import.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._tokens: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._users: "OrderedDict[str, tuple[float, User]]" = OrderedDict()
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+        self.invalidations = 0
+
+    def _get(self, store: OrderedDict, key: str):
+        item = store.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return value
+
+    def _put(self, store: OrderedDict, key: str, value, ttl: float) -> None:
+        store[key] = (time.monotonic() + ttl, value)
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get_subject(self, token: str) -> Optional[str]:
+        subject = self._get(self._tokens, token)
+        if subject is None:
+            self.token_misses += 1
+        else:
+            self.token_hits += 1
+        return subject
+
+    def put_subject(self, token: str, subject: str, exp: Optional[float] = None) -> None:
+        # never keep a token past its own expiry
+        ttl = self.ttl if exp is None else min(self.ttl, exp - time.time())
+        if ttl > 0:
+            self._put(self._tokens, token, subject, ttl)
+
+    def get_user(self, subject: str) -> Optional[User]:
+        user = self._get(self._users, subject)
+        if user is None:
+            self.user_misses += 1
+        else:
+            self.user_hits += 1
+        return user
+
+    def put_user(self, subject: str, user: User) -> None:
+        """`user` must be detached from its session (expunged) so it stays clean."""
+        self._put(self._users, subject, user, self.ttl)
+
+    def invalidate_user(self, user_id: Optional[int] = None, username: Optional[str] = None) -> None:
+        for subject, (_, user) in list(self._users.items()):
+            if subject == username or (user_id is not None and user.id == user_id):
+                del self._users[subject]
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._users.clear()
+
+    def stats(self) -> dict:
+        def rate(hits: int, misses: int) -> float:
+            return hits / (hits + misses) if hits + misses else 0.0
+
+        return {
+            "tokens": len(self._tokens),
+            "users": len(self._users),
+            "token_hits": self.token_hits,
+            "token_misses": self.token_misses,
+            "token_hit_rate": rate(self.token_hits, self.token_misses),
+            "user_hits": self.user_hits,
+            "user_misses": self.user_misses,
+            "user_hit_rate": rate(self.user_hits, self.user_misses),
+            "invalidations": self.invalidations,
+        }
+
+
+auth_cache = AuthCache()
@@ -0,0 +1,184 @@
+"""
+In-memory vector index over message embeddings, one per user.
+
+Rows live in preallocated NumPy arrays that grow by doubling, so adding
+messages one turn at a time stays amortised O(1). Vectors are stored
+L2-normalised as float32, which makes cosine similarity a single
+matrix-vector product; top-k uses argpartition. A filter that selects
+few rows (one session) scores only those rows, so the full product over
+100k 768-dimensional vectors is only paid for user-wide searches.
+
+On disk an index is a series of .npz segments in one directory: save()
+writes only the rows added since the last save, and once there are
+more than `max_segments` it rewrites everything as a new base segment.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+ROLES = ("system", "user", "assistant")
+_SEGMENT = re.compile(r"^(\d{8})(\.base)?\.npz$")
+
+
+class VectorIndex:
+    def __init__(self, dim: int, model: str = "", capacity: int = 256):
+        self.dim = dim
+        self.model = model
+        self.size = 0
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._sessions = np.zeros(capacity, dtype=np.int64)
+        self._roles = np.zeros(capacity, dtype=np.int8)
+        self._saved = 0  # rows already written to disk
+        self._segments = 0
+        self._next_segment = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def max_id(self) -> int:
+        # rows are mostly but not strictly in id order: late-committed messages are appended when found
+        return int(self._ids[: self.size].max()) if self.size else 0
+
+    def contains(self, ids: Sequence[int]) -> "np.ndarray":
+        """Boolean mask of which `ids` are already in the index."""
+        return np.isin(np.asarray(ids, dtype=np.int64), self._ids[: self.size])
+
+    @property
+    def dirty(self) -> bool:
+        return self._saved < self.size
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_vectors", "_ids", "_sessions", "_roles"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def add(self, ids: Sequence[int], session_ids: Sequence[int], roles: Sequence[str], vectors) -> None:
+        """Append rows; ids must not be in the index already."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        end = self.size + len(ids)
+        self._grow(end)
+        self._vectors[self.size:end] = vectors
+        self._ids[self.size:end] = ids
+        self._sessions[self.size:end] = session_ids
+        self._roles[self.size:end] = [ROLES.index(r) for r in roles]
+        self.size = end
+
+    def search(
+        self,
+        query,
+        k: int,
+        session_id: Optional[int] = None,
+        role: Optional[str] = None,
+        exclude: Iterable[int] = (),
+        min_score: float = -1.0,
+    ) -> list[tuple[int, float]]:
+        """[(message_id, cosine similarity)] of the k best matches, best first."""
+        if not self.size or k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        norm = float(np.linalg.norm(q))
+        if norm == 0:
+            return []
+        q = q / norm
+        mask = np.ones(self.size, dtype=bool)
+        if session_id is not None:
+            mask &= self._sessions[: self.size] == session_id
+        if role is not None:
+            mask &= self._roles[: self.size] == ROLES.index(role)
+        exclude = list(exclude)
+        if exclude:
+            mask &= ~np.isin(self._ids[: self.size], exclude)
+        rows = np.flatnonzero(mask)
+        if len(rows) * 2 < self.size:
+            # selective filter (e.g. one session): score only its rows
+            scores = self._vectors[rows] @ q
+        else:
+            scores = (self._vectors[: self.size] @ q)[rows]
+        keep = scores >= min_score
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(self._ids[i]), float(scores[j])) for i, j in zip(rows[order], order)]
+
+    # persistence
+
+    def _write(self, directory: Path, start: int, base: bool) -> None:
+        name = f"{self._next_segment:08d}{'.base' if base else ''}.npz"
+        tmp = directory / f".{name}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                vectors=self._vectors[start : self.size],
+                ids=self._ids[start : self.size],
+                sessions=self._sessions[start : self.size],
+                roles=self._roles[start : self.size],
+                model=np.array(self.model),
+            )
+        os.replace(tmp, directory / name)
+        self._next_segment += 1
+
+    def save(self, directory, max_segments: int = 8) -> None:
+        """Persist rows added since the last save, compacting into a new base segment when there are too many."""
+        directory = Path(directory)
+        if not self.dirty:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        if self._segments == 0 or self._segments >= max_segments:
+            # a new base supersedes every older segment, including any left by another model
+            old = [p for p in directory.iterdir() if _SEGMENT.match(p.name)]
+            self._next_segment = max((int(_SEGMENT.match(p.name).group(1)) + 1 for p in old), default=self._next_segment)
+            self._write(directory, 0, base=True)
+            for path in old:
+                path.unlink()
+            self._segments = 1
+        else:
+            self._write(directory, self._saved, base=False)
+            self._segments += 1
+        self._saved = self.size
+
+    @classmethod
+    def load(cls, directory, model: str = "") -> Optional["VectorIndex"]:
+        """The index saved in `directory`; None if there is none or it was built with another model."""
+        directory = Path(directory)
+        segments = sorted(p for p in directory.iterdir() if _SEGMENT.match(p.name)) if directory.is_dir() else []
+        bases = [i for i, p in enumerate(segments) if p.name.endswith(".base.npz")]
+        if not bases:
+            return None
+        segments = segments[bases[-1]:]
+        index = None
+        for path in segments:
+            with np.load(path) as data:
+                if str(data["model"]) != model:
+                    return None
+                if index is None:
+                    index = cls(data["vectors"].shape[1], model, capacity=max(256, len(data["ids"])))
+                n = len(data["ids"])
+                index._grow(index.size + n)
+                index._vectors[index.size : index.size + n] = data["vectors"]
+                index._ids[index.size : index.size + n] = data["ids"]
+                index._sessions[index.size : index.size + n] = data["sessions"]
+                index._roles[index.size : index.size + n] = data["roles"]
+                index.size += n
+        index._saved = index.size
+        index._segments = len(segments)
+        index._next_segment = int(_SEGMENT.match(segments[-1].name).group(1)) + 1
+        return index
+
+    def nbytes(self) -> int:
+        return self.size * (self.dim * 4 + 8 + 8 + 1)
@@ -0,0 +1,178 @@
+"""
+Keeps the configured models resident on every Ollama host.
+
+Ollama unloads a model keep_alive after its last request, and the next
+request then waits seconds for the load. At startup each model in
+OLLAMA_WARM_MODELS is loaded on each host that serves it, in the
+background so the app serves (and /api/health answers) right away;
+stats() reports "ready" once the loads are done. Afterwards a keeper
+polls /api/ps and re-pings a model that is missing or due to unload
+within OLLAMA_KEEPER_MARGIN seconds.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+import httpx
+
+from .backends import Backend, BackendPool, backend_pool, model_name
+from .llm_service import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, keep_alive_value
+
+logger = logging.getLogger(__name__)
+
+# comma-separated; empty -> OLLAMA_MODEL
+OLLAMA_WARM_MODELS = os.getenv("OLLAMA_WARM_MODELS", "")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes")
+# the startup warm-up gives up on loads still running after this long
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "120"))
+# 0 disables the keeper
+OLLAMA_KEEPER_INTERVAL = float(os.getenv("OLLAMA_KEEPER_INTERVAL", "60"))
+OLLAMA_KEEPER_MARGIN = float(os.getenv("OLLAMA_KEEPER_MARGIN", "120"))
+
+
+def warm_models() -> list[str]:
+    models = [m.strip() for m in OLLAMA_WARM_MODELS.split(",") if m.strip()]
+    return models or [OLLAMA_MODEL]
+
+
+def _parse_expiry(value: Optional[str]) -> Optional[datetime]:
+    try:
+        expires = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return expires if expires.tzinfo else expires.replace(tzinfo=timezone.utc)
+
+
+class ModelKeeper:
+    def __init__(
+        self,
+        pool: BackendPool,
+        models: Iterable[str],
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        interval: float = OLLAMA_KEEPER_INTERVAL,
+        margin: float = OLLAMA_KEEPER_MARGIN,
+    ):
+        self.pool = pool
+        self.models = list(models)
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.margin = margin
+        self._task: Optional[asyncio.Task] = None
+        self._warmup: Optional[asyncio.Task] = None
+        self.ready = False
+        self.pings = 0
+        self.ping_failures = 0
+        self.checks = 0
+        self.resident = 0
+        self.last_warmup_seconds = 0.0
+
+    async def ping(self, client: httpx.AsyncClient, backend: Backend, model: str) -> bool:
+        """Load `model` on `backend` (a prompt-less /api/generate) and refresh its keep_alive."""
+        payload = {"model": model, "stream": False}
+        if self.keep_alive:
+            payload["keep_alive"] = keep_alive_value(self.keep_alive)
+        self.pings += 1
+        try:
+            r = await client.post(f"{backend.url}/api/generate", json=payload)
+            r.raise_for_status()
+        except httpx.HTTPError as e:
+            self.ping_failures += 1
+            logger.warning("could not load %s on %s: %r", model, backend.url, e)
+            return False
+        return True
+
+    def _targets(self) -> list[tuple[Backend, str]]:
+        return [(b, m) for b in self.pool.backends if b.available() for m in self.models if b.serves(m)]
+
+    async def warm_all(self, client: httpx.AsyncClient) -> None:
+        started = time.perf_counter()
+        # discover which host serves what before loading anything
+        await self.pool.check_all(client)
+        await asyncio.gather(*(self.ping(client, b, m) for b, m in self._targets()))
+        self.last_warmup_seconds = round(time.perf_counter() - started, 3)
+        logger.info("warmed %s on %d host(s) in %.1fs", ", ".join(self.models), len(self.pool.backends), self.last_warmup_seconds)
+
+    async def keep(self, client: httpx.AsyncClient, backend: Backend) -> None:
+        """Re-ping the models /api/ps shows as unloaded or about to unload on `backend`."""
+        try:
+            r = await client.get(f"{backend.url}/api/ps", timeout=self.pool.health_timeout)
+            r.raise_for_status()
+            loaded = {model_name(m.get("name") or m.get("model", "")): _parse_expiry(m.get("expires_at"))
+                      for m in r.json().get("models", [])}
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("could not read /api/ps on %s: %r", backend.url, e)
+            return
+        now = datetime.now(timezone.utc)
+        for model in self.models:
+            if not backend.serves(model):
+                continue
+            name = model_name(model)
+            expires = loaded.get(name)
+            if name in loaded and (expires is None or (expires - now).total_seconds() > self.margin):
+                self.resident += 1
+                continue
+            if await self.ping(client, backend, model):
+                self.resident += 1
+
+    async def keep_all(self, client: httpx.AsyncClient) -> None:
+        self.checks += 1
+        self.resident = 0
+        await asyncio.gather(*(self.keep(client, b) for b in self.pool.backends if b.available()))
+
+    async def _run(self, get_client: Callable[[], httpx.AsyncClient]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.keep_all(get_client())
+            except Exception:
+                logger.exception("model keeper failed")
+
+    async def _warm(self, get_client: Callable[[], httpx.AsyncClient]) -> None:
+        try:
+            await asyncio.wait_for(self.warm_all(get_client()), OLLAMA_WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("model warm-up still running after %ss; gave up", OLLAMA_WARMUP_TIMEOUT)
+        except Exception:
+            logger.exception("model warm-up failed")
+        self.ready = True
+
+    async def start(self, get_client: Callable[[], httpx.AsyncClient], warmup: bool = OLLAMA_WARMUP) -> None:
+        """Start the warm-up and the keeper in the background; returns without waiting for either."""
+        if warmup and self._warmup is None:
+            self._warmup = asyncio.create_task(self._warm(get_client))
+        else:
+            self.ready = True
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(get_client))
+
+    async def wait_ready(self) -> None:
+        """Wait for the startup warm-up to finish (for scripts and tests)."""
+        if self._warmup is not None:
+            await asyncio.shield(self._warmup)
+
+    async def stop(self) -> None:
+        for task in (self._warmup, self._task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._warmup = self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "models": len(self.models),
+            "resident": self.resident,
+            "pings": self.pings,
+            "ping_failures": self.ping_failures,
+            "checks": self.checks,
+            "last_warmup_seconds": self.last_warmup_seconds,
+        }
+
+
+model_keeper = ModelKeeper(backend_pool, warm_models())
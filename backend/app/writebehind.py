@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import insert
+
+from . import db
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many rows are buffered...
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+# ...or after this many seconds, whichever comes first
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+# Hard cap on buffered rows if the database is unreachable
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+# A row (or turn) that keeps failing while others around it are written is dropped after failing in this many flushes
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for Message rows. submit() and submit_turn() are
+    synchronous and never touch the database; a background task flushes
+    the buffer in one multi-row INSERT per batch. stop() flushes whatever
+    is left.
+
+    The buffer holds entries, a single row or the user and assistant rows
+    of one turn, which are always written, kept or dropped together and in
+    order. A failed batch is retried entry by entry, so one row the
+    database will never accept (bad encoding, constraint violation) cannot
+    hold back the entries queued behind it; a failed entry is not tried
+    again before the next flush, and is dropped, and logged, after failing
+    in `max_attempts` flushes that wrote other entries. When no entry at
+    all can be written the database is taken to be down and everything is
+    kept for the next tick.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS,
+        session_factory: Optional[Callable] = None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._session_factory = session_factory
+        self._buffer: list[list[dict]] = []  # entries, each one row or one turn's rows
+        self._pending_rows = 0
+        self._pending_sessions: dict[int, int] = {}
+        self._attempts: dict[int, int] = {}  # id(entry) -> flushes in which it failed
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.rows_written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def _ensure_worker(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            if self._flush_lock is None:
+                self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def start(self) -> None:
+        self._ensure_worker()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def submit(self, session_id: int, role: str, content: str) -> None:
+        self._submit(session_id, [(role, content)])
+
+    def submit_turn(self, session_id: int, prompt: str, answer: str) -> None:
+        """Queue a prompt and its answer; they are never written or dropped one without the other."""
+        self._submit(session_id, [("user", prompt), ("assistant", answer)])
+
+    def _submit(self, session_id: int, messages: list[tuple[str, str]]) -> None:
+        now = datetime.utcnow()
+        self._buffer.append(
+            [{"session_id": session_id, "role": role, "content": content, "created_at": now} for role, content in messages]
+        )
+        self._pending_rows += len(messages)
+        self._pending_sessions[session_id] = self._pending_sessions.get(session_id, 0) + 1
+        while self._pending_rows > self.max_pending and len(self._buffer) > 1:
+            dropped = self._buffer.pop(0)
+            self._attempts.pop(id(dropped), None)
+            self._forget(dropped)
+            self.dropped += len(dropped)
+            logger.warning("write-behind buffer full; dropped oldest messages for session %s", dropped[0]["session_id"])
+        self._ensure_worker()
+        if self._pending_rows >= self.batch_size:
+            self._wakeup.set()
+
+    def has_pending(self, session_id: int) -> bool:
+        return session_id in self._pending_sessions
+
+    def _forget(self, entry: list[dict]) -> None:
+        self._pending_rows -= len(entry)
+        session_id = entry[0]["session_id"]
+        left = self._pending_sessions.get(session_id, 0) - 1
+        if left > 0:
+            self._pending_sessions[session_id] = left
+        else:
+            self._pending_sessions.pop(session_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            # not wait_for: before 3.12 it swallows a cancel from stop() that lands as the event is set
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait([waiter], timeout=self.flush_interval)
+            finally:
+                waiter.cancel()
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _insert(self, rows: list[dict]) -> None:
+        factory = self._session_factory or db.AsyncSessionLocal
+        async with factory() as session:
+            await session.execute(insert(Message.__table__).values(rows))
+            await session.commit()
+
+    def _remove(self, entries: list[list[dict]]) -> None:
+        gone = {id(entry) for entry in entries}
+        self._buffer = [entry for entry in self._buffer if id(entry) not in gone]
+        for entry in entries:
+            self._attempts.pop(id(entry), None)
+            self._forget(entry)
+
+    def _next_batch(self, skip: dict) -> list[list[dict]]:
+        batch, rows = [], 0
+        for entry in self._buffer:
+            if rows >= self.batch_size:
+                break
+            if id(entry) not in skip:
+                batch.append(entry)
+                rows += len(entry)
+        return batch
+
+    async def _isolate(self, batch: list[list[dict]], failed: dict) -> int:
+        """Retry a failed batch one entry at a time; returns rows written, or -1 if none could be."""
+        written = []
+        for entry in batch:
+            try:
+                await self._insert(entry)
+            except Exception as e:
+                failed[id(entry)] = (entry, e)
+            else:
+                written.append(entry)
+        if not written:
+            return -1
+        self._remove(written)
+        rows = sum(len(entry) for entry in written)
+        self.rows_written += rows
+        return rows
+
+    def _count_failures(self, failed: dict) -> None:
+        for entry, error in failed.values():
+            attempts = self._attempts.get(id(entry), 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[id(entry)] = attempts
+                continue
+            self._remove([entry])
+            self.dropped += len(entry)
+            logger.error(
+                "write-behind dropped %d message(s) for session %s after %d failed flushes: %s",
+                len(entry), entry[0]["session_id"], attempts, error,
+            )
+
+    async def flush(self) -> int:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            written = 0
+            failed: dict = {}  # id(entry) -> (entry, error); left for the next flush
+            while batch := self._next_batch(failed):
+                try:
+                    await self._insert([row for entry in batch for row in entry])
+                except Exception:
+                    self.failures += 1
+                    logger.exception("write-behind flush of %d entries failed; retrying them one by one", len(batch))
+                    isolated = await self._isolate(batch, failed)
+                    if isolated < 0:
+                        # nothing went in: the database is unreachable, retry on the next tick
+                        break
+                    written += isolated
+                    continue
+                self._remove(batch)
+                rows = sum(len(entry) for entry in batch)
+                self.rows_written += rows
+                self.batches += 1
+                written += rows
+            if written:
+                # others went in, so these entries are at fault; one attempt per flush however often they were tried
+                self._count_failures(failed)
+            return written
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending_rows,
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+message_writer = MessageWriter()
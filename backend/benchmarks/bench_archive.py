@@ -0,0 +1,159 @@
+"""
+Cold-message archival: space reclaimed and hot-path latency before/after.
+
+Seeds a history where most sessions went quiet long ago, times the
+queries on active sessions (context window, oldest listing page, which
+is served from the archive afterwards, listing validators, search and a
+full count of the message table), runs one archival pass, VACUUMs
+(SQLite) and times the same queries again. Table and index sizes come
+from dbstat on SQLite and pg_total_relation_size on Postgres.
+
+Run from backend/:
+    python -m benchmarks.bench_archive                       # 1M messages, temp SQLite file
+    python -m benchmarks.bench_archive --messages 200000 --active 20 --out archive.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.archive import MessageArchiver
+from app.models import Message
+from app.search import ensure_search_index, search_messages
+from benchmarks.loadtest import _git_commit, summarize_ms
+
+WORDS = [f"w{i}" for i in range(5000)]
+
+
+async def _sizes(engine) -> dict:
+    async with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            rows = await conn.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+            sizes = {name: size for name, size in rows}
+            page = (await conn.execute(text("PRAGMA page_size"))).scalar()
+            total = (await conn.execute(text("PRAGMA page_count"))).scalar() * page
+        else:
+            rows = await conn.execute(
+                text("SELECT relname, pg_total_relation_size(oid) FROM pg_class WHERE relname IN ('message', 'archivedmessage')")
+            )
+            sizes = {name: size for name, size in rows}
+            total = (await conn.execute(text("SELECT pg_database_size(current_database())"))).scalar()
+    hot = sum(size for name, size in sizes.items() if name.startswith(("message", "ix_message", "sqlite_autoindex_message")))
+    cold = sum(size for name, size in sizes.items() if "archivedmessage" in name)
+    return {"hot_table_and_indexes_bytes": hot, "archive_bytes": cold, "database_bytes": total}
+
+
+async def seed(engine, messages: int, sessions: int, active: int, batch: int) -> tuple[int, list[int]]:
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        user = await crud.create_user(db, "bench", "x")
+        ids = [(await crud.create_session(db, f"s{i}", user_id=user.id)).id for i in range(sessions)]
+        hot_ids = ids[-active:]
+        for offset in range(0, messages, batch):
+            rows = []
+            for n in range(offset, min(offset + batch, messages)):
+                sid = ids[n % sessions]
+                # quiet sessions stopped a year ago; active ones span the last year
+                age = timedelta(days=rng.uniform(0, 365)) + (timedelta(0) if sid in hot_ids else timedelta(days=365))
+                rows.append(
+                    {"session_id": sid, "role": "user" if n % 2 else "assistant",
+                     "content": " ".join(rng.choices(WORDS, k=rng.randint(8, 60))), "created_at": now - age}
+                )
+            await db.execute(insert(Message.__table__), rows)
+        await db.commit()
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_search_index)
+    return user.id, hot_ids
+
+
+async def measure(engine, user_id: int, hot_ids: list[int], rounds: int) -> dict:
+    rng = random.Random(1)
+    timings: dict = {"recent_context": [], "oldest_page": [], "listing_version": [], "search": [], "count_hot_table": []}
+    async with AsyncSession(engine) as db:
+        for _ in range(rounds):
+            sid = rng.choice(hot_ids)
+            for name, call in (
+                ("recent_context", lambda: crud.get_recent_messages(db, sid, 20)),
+                ("oldest_page", lambda: crud.get_messages(db, sid, limit=50)),
+                ("listing_version", lambda: crud.get_messages_version(db, sid)),
+                ("search", lambda: search_messages(db, user_id, " ".join(rng.sample(WORDS[100:1000], 2)))),
+                ("count_hot_table", lambda: db.execute(select(func.count()).select_from(Message))),
+            ):
+                started = time.perf_counter()
+                await call()
+                timings[name].append(time.perf_counter() - started)
+            db.expunge_all()
+    return {name: summarize_ms(values) for name, values in timings.items()}
+
+
+async def main(args: argparse.Namespace) -> dict:
+    engine = create_async_engine(args.url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    user_id, hot_ids = await seed(engine, args.messages, args.sessions, args.active, args.batch)
+
+    before = {"sizes": await _sizes(engine), "latency_ms": await measure(engine, user_id, hot_ids, args.rounds)}
+    archiver = MessageArchiver(
+        after_days=args.after_days, inactive_days=args.inactive_days, batch_size=args.batch,
+        session_factory=sessionmaker(engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    started = time.perf_counter()
+    await archiver.archive_once()
+    archive_seconds = time.perf_counter() - started
+    if engine.dialect.name == "sqlite":
+        async with engine.connect() as conn:
+            await (await conn.execution_options(isolation_level="AUTOCOMMIT")).execute(text("VACUUM"))
+    after = {"sizes": await _sizes(engine), "latency_ms": await measure(engine, user_id, hot_ids, args.rounds)}
+    await engine.dispose()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "url": args.url.split("@")[-1],
+            "messages": args.messages,
+            "sessions": args.sessions,
+            "active_sessions": args.active,
+        },
+        "archive": {**archiver.stats(), "seconds": round(archive_seconds, 2)},
+        "before": before,
+        "after": after,
+        "p50_speedup": {
+            name: round(before["latency_ms"][name]["p50"] / max(after["latency_ms"][name]["p50"], 0.001), 2)
+            for name in before["latency_ms"]
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=None, help="async database URL (default: temporary SQLite file)")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--active", type=int, default=50, help="sessions with recent messages")
+    parser.add_argument("--after-days", type=float, default=180)
+    parser.add_argument("--inactive-days", type=float, default=30)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--out", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+    if args.url is None:
+        args.url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    result = asyncio.run(main(args))
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
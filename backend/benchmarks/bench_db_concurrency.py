@@ -0,0 +1,87 @@
+"""
+Concurrent read/write throughput: default engine vs app.db.build_engine.
+
+Readers page through a session's messages while writers append to it, for
+a fixed duration. The default aiosqlite engine opens a connection per
+session (NullPool) in rollback-journal mode, so readers queue behind
+writers and writers may hit "database is locked".
+
+Run from backend/:
+    python -m benchmarks.bench_db_concurrency --readers 8 --writers 2 --seconds 5
+    python -m benchmarks.bench_db_concurrency --url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app import models  # noqa: F401
+from app.db import build_engine
+
+
+async def _run(label: str, engine, readers: int, writers: int, seconds: float) -> dict:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        sid = (await crud.create_session(db, label)).id
+        await crud.create_messages(db, [{"session_id": sid, "role": "user", "content": f"seed {i}"} for i in range(200)])
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    deadline = time.perf_counter() + seconds
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            try:
+                async with factory() as db:
+                    await crud.get_recent_messages(db, sid, 50)
+                counts["reads"] += 1
+            except Exception:
+                counts["errors"] += 1
+
+    async def writer():
+        i = 0
+        while time.perf_counter() < deadline:
+            try:
+                async with factory() as db:
+                    await crud.create_message_pair(db, sid, f"q{i}", f"a{i}")
+                counts["writes"] += 1
+            except Exception:
+                counts["errors"] += 1
+            i += 1
+
+    await asyncio.gather(*([reader() for _ in range(readers)] + [writer() for _ in range(writers)]))
+    await engine.dispose()
+    return {
+        "engine": label,
+        "reads_per_sec": round(counts["reads"] / seconds, 1),
+        "writes_per_sec": round(counts["writes"] / seconds, 1),
+        "errors": counts["errors"],
+    }
+
+
+async def main(url, readers: int, writers: int, seconds: float) -> list:
+    results = []
+    for label in ("default", "tuned"):
+        target = url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        engine = create_async_engine(target) if label == "default" else build_engine(target)
+        results.append(await _run(label, engine, readers, writers, seconds))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="concurrent DB throughput, default vs tuned engine")
+    parser.add_argument("--url", default=None, help="async database URL (default: a fresh temporary SQLite file per run)")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.url, args.readers, args.writers, args.seconds)), indent=2))
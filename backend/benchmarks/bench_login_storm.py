@@ -0,0 +1,78 @@
+"""
+Event-loop latency during a login storm: inline Argon2 vs the hash pool.
+
+A ticker coroutine sleeps TICK seconds in a loop and records how late it
+wakes up; meanwhile N concurrent "logins" verify a password. Inline
+verification blocks the loop, so the ticker lag grows with the number of
+logins. With verify_password_async it should stay flat.
+
+Run from backend/:
+    python -m benchmarks.bench_login_storm --logins 32
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app import auth
+
+TICK = 0.005
+
+
+async def _ticker(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def _storm(mode: str, logins: int, hashed: str) -> dict:
+    async def inline_login():
+        await asyncio.sleep(0)
+        auth.verify_password("correct horse", hashed)
+
+    async def pooled_login():
+        await auth.verify_password_async("correct horse", hashed)
+
+    login = inline_login if mode == "inline" else pooled_login
+    lags: list = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(TICK * 4)
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    lags.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "loop_lag_p50_ms": round(statistics.median(lags) * 1000, 2),
+        "loop_lag_p99_ms": round(lags[int(0.99 * (len(lags) - 1))] * 1000, 2),
+        "loop_lag_max_ms": round(lags[-1] * 1000, 2),
+    }
+
+
+async def main(logins: int) -> list:
+    hashed = auth.get_password_hash("correct horse")
+    results = [await _storm("inline", logins, hashed), await _storm("pooled", logins, hashed)]
+    auth.shutdown_hash_executor()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="event-loop latency during a login storm")
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps({
+        "argon2": {
+            "time_cost": auth.ARGON2_TIME_COST,
+            "memory_cost": auth.ARGON2_MEMORY_COST,
+            "parallelism": auth.ARGON2_PARALLELISM,
+            "workers": auth.PASSWORD_HASH_WORKERS,
+        },
+        "results": asyncio.run(main(args.logins)),
+    }, indent=2))
@@ -0,0 +1,106 @@
+"""
+Full-text search vs a LIKE scan over a synthetic message corpus.
+
+Reports index build time and per-query p50/p95 for both approaches.
+
+Run from backend/:
+    python -m benchmarks.bench_search                        # 1M messages, temp SQLite file
+    python -m benchmarks.bench_search --messages 100000 --queries 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app import models  # noqa: F401
+from app.search import ensure_search_index, search_messages
+
+# Zipf-ish vocabulary so most query terms are selective, as real chat text is.
+VOCAB = [f"w{i}" for i in range(20_000)]
+WEIGHTS = [1 / (i + 1) for i in range(len(VOCAB))]
+
+
+_LIKE = text(
+    "SELECT message.id FROM message JOIN session ON session.id = message.session_id "
+    "WHERE session.user_id = :user_id AND message.content LIKE :pattern "
+    "ORDER BY message.created_at DESC LIMIT 20"
+)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summary(case: str, samples: list[float]) -> dict:
+    return {
+        "case": case,
+        "queries": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+    }
+
+
+async def main(url: str, messages: int, queries: int, batch: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        user = await crud.create_user(db, "bench", "x")
+        session = await crud.create_session(db, "bench", user_id=user.id)
+        for start in range(0, messages, batch):
+            n = min(batch, messages - start)
+            await crud.create_messages(
+                db,
+                [
+                    {"session_id": session.id, "role": "user", "content": " ".join(rng.choices(VOCAB, WEIGHTS, k=24))}
+                    for _ in range(n)
+                ],
+            )
+
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_search_index)
+    results = [{"case": "index build", "messages": messages, "seconds": round(time.perf_counter() - start, 4)}]
+
+    terms = [" ".join(rng.sample(VOCAB[50:2000], 2)) for _ in range(queries)]
+    fts, like = [], []
+    async with AsyncSession(engine) as db:
+        for q in terms:
+            t0 = time.perf_counter()
+            await search_messages(db, user.id, q)
+            fts.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await db.execute(_LIKE, {"user_id": user.id, "pattern": f"%{q.split()[0]} %"})
+            like.append(time.perf_counter() - t0)
+    results += [_summary("search_messages (ranked)", fts), _summary("LIKE scan (unranked, one term)", like)]
+    await engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=None, help="async database URL (default: temporary SQLite file)")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    results = asyncio.run(main(url, args.messages, args.queries, args.batch, args.seed))
+    print(json.dumps({"url": url.split("@")[-1], "results": results}, indent=2))
@@ -0,0 +1,109 @@
+"""
+VectorIndex at scale: search latency, append throughput and persistence.
+
+Fills one index with random unit vectors spread over sessions, the way a
+heavy user's history looks to semantic.py, then times top-k searches over
+the whole index (semantic cache), within one session (history retrieval),
+appends of one turn at a time, an incremental save and a full reload.
+
+Run from backend/:
+    python -m benchmarks.bench_semantic                      # 100k x 768
+    python -m benchmarks.bench_semantic --vectors 200000 --dim 1024 --out semantic.json
+"""
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.vectorindex import VectorIndex
+from benchmarks.loadtest import _git_commit, summarize_ms
+
+
+def _timed(call, rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return summarize_ms(timings)
+
+
+def main(args: argparse.Namespace) -> dict:
+    rng = np.random.default_rng(0)
+    index = VectorIndex(args.dim, "bench")
+    started = time.perf_counter()
+    for start in range(0, args.vectors, args.batch):
+        n = min(args.batch, args.vectors - start)
+        index.add(
+            range(start + 1, start + n + 1),
+            rng.integers(1, args.sessions + 1, size=n),
+            ["user" if i % 2 else "assistant" for i in range(n)],
+            rng.standard_normal((n, args.dim), dtype=np.float32),
+        )
+    fill_seconds = time.perf_counter() - started
+    queries = rng.standard_normal((args.rounds, args.dim), dtype=np.float32)
+    q = iter(queries.tolist() * 4)
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        index.save(directory)
+        base_seconds = time.perf_counter() - started
+        next_id = args.vectors + 1
+
+        def append_turn():
+            nonlocal next_id
+            index.add([next_id, next_id + 1], [1, 1], ["user", "assistant"], rng.standard_normal((2, args.dim)))
+            next_id += 2
+
+        latency = {
+            "search_all_top1_user": _timed(lambda: index.search(next(q), 1, role="user", min_score=0.9), args.rounds),
+            "search_all_top10": _timed(lambda: index.search(next(q), 10), args.rounds),
+            "search_session_top6": _timed(lambda: index.search(next(q), 6, session_id=7), args.rounds),
+            "append_turn": _timed(append_turn, args.rounds),
+        }
+        started = time.perf_counter()
+        index.save(directory)
+        segment_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        loaded = VectorIndex.load(directory, "bench")
+        load_seconds = time.perf_counter() - started
+        assert len(loaded) == len(index)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "vectors": args.vectors,
+            "dim": args.dim,
+            "sessions": args.sessions,
+            "rounds": args.rounds,
+        },
+        "index_mb": round(index.nbytes() / 2**20, 1),
+        "fill_seconds": round(fill_seconds, 2),
+        "latency_ms": latency,
+        "persistence_seconds": {
+            "base_save": round(base_seconds, 3),
+            "incremental_save": round(segment_seconds, 4),
+            "load": round(load_seconds, 3),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768, help="nomic-embed-text produces 768")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--out", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    result = main(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
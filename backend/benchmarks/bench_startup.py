@@ -0,0 +1,146 @@
+"""
+Backend cold-start cost: import time and time to the first healthy /api/health.
+
+Each run is a fresh interpreter. `python -X importtime -c "import app.main"`
+gives the cumulative import time of the app (and the heaviest modules);
+then uvicorn is started and /api/health polled until it answers 200,
+timed from process spawn. Medians over --runs are compared with the
+budgets and the exit status is 1 when either is exceeded, so CI can
+catch a new eager import or import-time side effect.
+
+Run from backend/:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --budget-import-ms 900 --budget-health-ms 1500 --out startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.loadtest import _free_port, _git_commit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> dict:
+    """{module: (self_us, cumulative_us)} from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        modules[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return modules
+
+
+def _env(tmpdir: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'startup.db')}",
+        # measure the app, not model loading on whatever Ollama is reachable
+        OLLAMA_WARMUP="false",
+        OLLAMA_HOSTS=f"http://127.0.0.1:{_free_port()}",
+    )
+    return env
+
+
+def measure_import(env: dict) -> tuple[float, dict]:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = parse_importtime(out.stderr)
+    return modules["app.main"][1] / 1000, modules
+
+
+def measure_health(env: dict, timeout: float) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=0.5) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                        return (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    pass
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {proc.returncode}")
+                time.sleep(0.005)
+        raise RuntimeError(f"/api/health not healthy after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def _summary(values: list) -> dict:
+    return {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+
+
+def main(args: argparse.Namespace) -> dict:
+    tmpdir = tempfile.mkdtemp()
+    env = _env(tmpdir)
+    measure_import(env)  # unmeasured: writes __pycache__ like any deploy after its first start
+
+    import_ms, health_ms, heaviest = [], [], {}
+    for _ in range(args.runs):
+        total, modules = measure_import(env)
+        import_ms.append(total)
+        for name, (self_us, _) in modules.items():
+            heaviest.setdefault(name, []).append(self_us / 1000)
+        health_ms.append(measure_health(env, args.timeout))
+
+    top = sorted(((name, statistics.median(v)) for name, v in heaviest.items()), key=lambda kv: -kv[1])[: args.top]
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "runs": args.runs,
+        },
+        "import_app_main_ms": _summary(import_ms),
+        "time_to_healthy_ms": _summary(health_ms),
+        "heaviest_modules_self_ms": [[name, round(ms, 1)] for name, ms in top],
+        "budgets_ms": {"import": args.budget_import_ms, "healthy": args.budget_health_ms},
+    }
+    over = []
+    if result["import_app_main_ms"]["median"] > args.budget_import_ms:
+        over.append(f"import app.main: {result['import_app_main_ms']['median']} ms > {args.budget_import_ms} ms")
+    if result["time_to_healthy_ms"]["median"] > args.budget_health_ms:
+        over.append(f"time to healthy: {result['time_to_healthy_ms']['median']} ms > {args.budget_health_ms} ms")
+    result["over_budget"] = over
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-import-ms", type=float, default=1500.0)
+    parser.add_argument("--budget-health-ms", type=float, default=3000.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="give up on /api/health after this many seconds")
+    parser.add_argument("--top", type=int, default=10, help="heaviest modules to list")
+    parser.add_argument("--out", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    result = main(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    for line in result["over_budget"]:
+        print(f"OVER BUDGET {line}", file=sys.stderr)
+    sys.exit(1 if result["over_budget"] else 0)
@@ -0,0 +1,83 @@
+"""
+CPU cost per streamed token: str relay (stream_chat + encode) vs the byte relay.
+
+The upstream is an in-memory httpx transport yielding one NDJSON line per
+read, like Ollama does, so the numbers isolate parsing/re-encoding work
+from network and model time.
+
+Run from backend/:
+    python -m benchmarks.bench_stream_relay --tokens 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from app import llm_service
+
+
+def _install(tokens: int) -> None:
+    lines = [
+        (json.dumps({"model": "m", "message": {"role": "assistant", "content": f" word{i % 97}"}, "done": False}) + "\n").encode()
+        for i in range(tokens)
+    ]
+    lines.append(b'{"model":"m","done":true}\n')
+
+    def handler(request):
+        async def body():
+            for line in lines:
+                yield line
+
+        return httpx.Response(200, content=body())
+
+    llm_service._client = httpx.AsyncClient(base_url="http://fake", transport=httpx.MockTransport(handler))
+
+
+async def _str_relay() -> int:
+    n = 0
+    async for chunk in llm_service.stream_chat("hi"):
+        n += len(chunk.encode("utf-8"))
+    return n
+
+
+async def _byte_relay(pass_through: bool = False) -> int:
+    n = 0
+    # no time-based holding, so the comparison measures CPU rather than sleeps
+    async for frame in llm_service.stream_chat_bytes("hi", pass_through=pass_through, frame_max_delay=0):
+        n += len(frame)
+    return n
+
+
+async def _measure(label: str, fn, tokens: int) -> dict:
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    nbytes = await fn()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return {
+        "relay": label,
+        "tokens": tokens,
+        "bytes_out": nbytes,
+        "cpu_us_per_token": round(cpu / tokens * 1e6, 2),
+        "wall_seconds": round(wall, 3),
+    }
+
+
+async def main(tokens: int) -> dict:
+    _install(tokens)
+    await _str_relay()  # warm up
+    results = [
+        await _measure("str (aiter_lines + json + encode)", _str_relay, tokens),
+        await _measure("bytes (split + fast json + frames)", _byte_relay, tokens),
+        await _measure("bytes pass-through", lambda: _byte_relay(pass_through=True), tokens),
+    ]
+    return {"json_decoder": llm_service._json_loads.__module__, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU per streamed token, str vs byte relay")
+    parser.add_argument("--tokens", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.tokens)), indent=2))
@@ -0,0 +1,186 @@
+"""
+NDJSON export/import throughput and peak memory over a large history.
+
+Seeding, export and import each run in a fresh interpreter so every
+phase reports its own peak RSS (ru_maxrss) next to rows/sec. The
+"materialized" phase loads the same messages through crud.get_messages
+as the pre-streaming baseline: its peak grows with the history while
+the streamed export should stay flat.
+
+Run from backend/:
+    python -m benchmarks.bench_transfer                      # 1M messages, temp SQLite file
+    python -m benchmarks.bench_transfer --messages 200000 --sessions 50 --out transfer.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, db, transfer
+from app.models import Message
+from benchmarks.loadtest import _git_commit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = [f"w{i}" for i in range(5000)]
+
+
+def _peak_rss_mb() -> float:
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _use(url: str):
+    engine = create_async_engine(url)
+    db.AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    return engine
+
+
+async def seed(url: str, messages: int, sessions: int, batch: int) -> dict:
+    rng = random.Random(0)
+    engine = _use(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    start = datetime(2024, 1, 1)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        await crud.create_user(session, "source", "x")
+        await crud.create_user(session, "target", "x")
+        user = await crud.get_user_by_username(session, "source")
+        ids = [(await crud.create_session(session, f"s{i}", user_id=user.id)).id for i in range(sessions)]
+        for offset in range(0, messages, batch):
+            rows = [
+                {
+                    "session_id": ids[n % sessions],
+                    "role": "user" if n % 2 else "assistant",
+                    "content": " ".join(rng.choices(WORDS, k=rng.randint(8, 60))),
+                    "created_at": start + timedelta(seconds=n),
+                }
+                for n in range(offset, min(offset + batch, messages))
+            ]
+            await session.execute(insert(Message.__table__), rows)
+        await session.commit()
+    await engine.dispose()
+    return {"messages": messages, "sessions": sessions}
+
+
+async def export(url: str, path: str) -> dict:
+    engine = _use(url)
+    async with db.AsyncSessionLocal() as session:
+        user = await crud.get_user_by_username(session, "source")
+    started = time.perf_counter()
+    lines = 0
+    with open(path, "wb") as out:
+        async for chunk in transfer.export_lines(user.id, user.username):
+            lines += chunk.count(b"\n")
+            out.write(chunk)
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return {"rows": lines - 1, "seconds": round(elapsed, 2), "bytes": os.path.getsize(path)}
+
+
+async def materialized(url: str) -> dict:
+    engine = _use(url)
+    started = time.perf_counter()
+    rows = 0
+    async with db.AsyncSessionLocal() as session:
+        user = await crud.get_user_by_username(session, "source")
+        listed = await crud.get_sessions(session, user_id=user.id, limit=1_000_000)
+        kept = [await crud.get_messages(session, s.id) for s in listed]
+        rows = len(listed) + sum(len(k) for k in kept)
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return {"rows": rows, "seconds": round(elapsed, 2)}
+
+
+async def import_(url: str, path: str, batch: int) -> dict:
+    engine = _use(url)
+    async with db.AsyncSessionLocal() as session:
+        user = await crud.get_user_by_username(session, "target")
+
+    async def chunks():
+        with open(path, "rb") as f:
+            while data := f.read(1 << 16):
+                yield data
+
+    started = time.perf_counter()
+    counts = await transfer.import_lines(user.id, transfer.iter_lines(chunks()), batch_size=batch)
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return {"rows": counts["sessions"] + counts["messages"], "seconds": round(elapsed, 2)}
+
+
+def _phase(args: argparse.Namespace) -> dict:
+    if args.phase == "seed":
+        result = asyncio.run(seed(args.url, args.messages, args.sessions, args.batch))
+    elif args.phase == "export":
+        result = asyncio.run(export(args.url, args.file))
+    elif args.phase == "materialized":
+        result = asyncio.run(materialized(args.url))
+    else:
+        result = asyncio.run(import_(args.url, args.file, args.batch))
+    if result.get("seconds"):
+        result["rows_per_sec"] = round(result["rows"] / result["seconds"])
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _run_phase(phase: str, args: argparse.Namespace, path: str) -> dict:
+    cmd = [
+        sys.executable, "-m", "benchmarks.bench_transfer", "--phase", phase, "--url", args.url, "--file", path,
+        "--messages", str(args.messages), "--sessions", str(args.sessions), "--batch", str(args.batch),
+    ]
+    out = subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return {"phase": phase, **json.loads(out.stdout)}
+
+
+def main(args: argparse.Namespace) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "export.ndjson")
+    phases = ["seed", "export", "import"] + (["materialized"] if args.materialized else [])
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "url": args.url.split("@")[-1],
+            "messages": args.messages,
+            "sessions": args.sessions,
+            "batch": args.batch,
+        },
+        "results": [_run_phase(phase, args, path) for phase in phases],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=None, help="async database URL (default: temporary SQLite file)")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=transfer.IMPORT_BATCH_SIZE, help="seed and import batch size")
+    parser.add_argument("--materialized", action="store_true", help="also time the load-everything baseline")
+    parser.add_argument("--out", default=None, help="write the JSON result here as well as to stdout")
+    parser.add_argument("--phase", default=None, choices=["seed", "export", "materialized", "import"], help=argparse.SUPPRESS)
+    parser.add_argument("--file", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.url is None:
+        args.url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    if args.phase:
+        print(json.dumps(_phase(args)))
+        sys.exit(0)
+    result = main(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
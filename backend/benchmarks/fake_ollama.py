@@ -0,0 +1,201 @@
+"""
+Local stand-in for the parts of Ollama's HTTP API the backend uses.
+
+POST /api/chat streams NDJSON ({"message": {"content": ...}, "done": false}
+per token, then {"done": true}) or returns a single JSON object when
+"stream" is false. POST /api/embeddings hashes the prompt's words into
+a fixed-size unit vector, so texts sharing words come out similar.
+Models are "loaded" on first use (costing --load-delay) and unloaded
+keep_alive seconds after their last request; /api/ps and model-only
+/api/generate calls behave like Ollama's. Behaviour is tunable so
+benchmarks can model slow, flaky, stalling or cold hosts.
+
+Run standalone from backend/:
+    python -m benchmarks.fake_ollama --port 11435 --token-delay 0.02 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+@dataclass
+class FakeOllamaConfig:
+    tokens: int = 64
+    token_delay: float = 0.01  # seconds between streamed tokens
+    error_rate: float = 0.0  # fraction of requests answered with HTTP 500
+    stall_rate: float = 0.0  # fraction of streams that pause mid-answer
+    stall_seconds: float = 2.0
+    models: tuple = ("llama3.1:8b", "nomic-embed-text:latest")
+    load_delay: float = 0.0  # seconds to "load" a model that is not resident
+    keep_alive: float = 300.0  # default seconds a model stays loaded after a request
+    embedding_dim: int = 64
+    seed: int = 0
+
+
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _duration(value, default: float) -> float:
+    """Seconds from an Ollama keep_alive (number of seconds or Go duration); negative = forever."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        parts = re.findall(r"(-?[\d.]+)(ms|s|m|h)", value)
+        if not parts:
+            return default
+        seconds = sum(float(n) * _UNITS[u] for n, u in parts)
+    return float("inf") if seconds < 0 else seconds
+
+
+def create_app(config: FakeOllamaConfig = None) -> Starlette:
+    config = config or FakeOllamaConfig()
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "errors": 0, "stalls": 0, "loads": 0, "pings": 0, "embeddings": 0}
+    loaded: dict = {}  # model -> monotonic unload time
+
+    async def load(body: dict) -> int:
+        """Make the model resident; returns the load_duration in nanoseconds."""
+        model = body.get("model", config.models[0])
+        model = model if ":" in model else f"{model}:latest"
+        now = time.monotonic()
+        started = time.perf_counter()
+        if loaded.get(model, 0) <= now:
+            stats["loads"] += 1
+            if config.load_delay:
+                await asyncio.sleep(config.load_delay)
+        loaded[model] = time.monotonic() + _duration(body.get("keep_alive"), config.keep_alive)
+        return int((time.perf_counter() - started) * 1e9)
+
+    def token(i: int) -> str:
+        return f"tok{i} "
+
+    async def chat(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        model = body.get("model", config.models[0])
+
+        if not body.get("stream", True):
+            load_ns = await load(body)
+            await asyncio.sleep(config.token_delay * config.tokens)
+            content = "".join(token(i) for i in range(config.tokens))
+            return JSONResponse(
+                {"model": model, "message": {"role": "assistant", "content": content}, "done": True, "load_duration": load_ns}
+            )
+
+        stall_at = rng.randrange(config.tokens) if rng.random() < config.stall_rate else -1
+
+        async def gen():
+            load_ns = await load(body)
+            for i in range(config.tokens):
+                if i == stall_at:
+                    stats["stalls"] += 1
+                    await asyncio.sleep(config.stall_seconds)
+                elif config.token_delay:
+                    await asyncio.sleep(config.token_delay)
+                evt = {"model": model, "message": {"role": "assistant", "content": token(i)}, "done": False}
+                yield (json.dumps(evt) + "\n").encode()
+            yield (json.dumps({"model": model, "done": True, "load_duration": load_ns}) + "\n").encode()
+
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+    async def generate(request: Request):
+        # only the model-load form (no prompt) is supported
+        body = await request.json()
+        stats["pings"] += 1
+        load_ns = await load(body)
+        return JSONResponse({"model": body.get("model"), "done": True, "done_reason": "load", "load_duration": load_ns})
+
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["embeddings"] += 1
+        await load(body)
+        vector = [0.0] * config.embedding_dim
+        for word in re.findall(r"\w+", body.get("prompt", "").lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+            vector[h % config.embedding_dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return JSONResponse({"embedding": [v / norm for v in vector]})
+
+    async def ps(request: Request):
+        now, wall = time.monotonic(), datetime.now(timezone.utc)
+        models = []
+        for name, until in loaded.items():
+            if until > now:
+                expires = wall + timedelta(seconds=min(until - now, 10 * 365 * 86400))
+                models.append({"name": name, "model": name, "expires_at": expires.isoformat()})
+        return JSONResponse({"models": models})
+
+    async def tags(request: Request):
+        return JSONResponse({"models": [{"name": m, "model": m} for m in config.models]})
+
+    async def fake_stats(request: Request):
+        return JSONResponse(stats)
+
+    app = Starlette(
+        routes=[
+            Route("/api/chat", chat, methods=["POST"]),
+            Route("/api/generate", generate, methods=["POST"]),
+            Route("/api/embeddings", embeddings, methods=["POST"]),
+            Route("/api/ps", ps, methods=["GET"]),
+            Route("/api/tags", tags, methods=["GET"]),
+            Route("/_stats", fake_stats, methods=["GET"]),
+        ]
+    )
+    app.state.config = config
+    app.state.stats = stats
+    app.state.loaded = loaded
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-seconds", type=float, default=2.0)
+    parser.add_argument("--load-delay", type=float, default=0.0, help="seconds to load a model that is not resident")
+    parser.add_argument("--keep-alive", type=float, default=300.0, help="default seconds a model stays loaded")
+    parser.add_argument("--model", action="append", dest="models", help="model name to advertise (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOllamaConfig:
+    return FakeOllamaConfig(
+        tokens=args.tokens,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        models=tuple(args.models or FakeOllamaConfig.models),
+        load_delay=args.load_delay,
+        keep_alive=args.keep_alive,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,240 @@
+"""
+Load test for /api/chat and /api/chat/stream.
+
+By default this starts a fake Ollama (benchmarks/fake_ollama.py) and the
+backend in-process with uvicorn on free ports, so it needs nothing else
+running; pass --target to hit an already running backend instead. The
+load generator shares the process with the servers, so compare numbers
+between commits on the same machine rather than reading them as absolute
+capacity.
+
+Reports time-to-first-token, tokens/sec, p50/p95/p99 latency and error
+rate as JSON. --compare flags regressions against an earlier result.
+
+Run from backend/:
+    python -m benchmarks.loadtest --concurrency 16 --requests 200 --out bench.json
+    python -m benchmarks.loadtest --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+
+from benchmarks import fake_ollama
+
+ERROR_MARKERS = ("[stream error]", "(ollama-http-")
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize_ms(values: list) -> dict:
+    return {
+        "p50": round(percentile(values, 0.50) * 1000, 2),
+        "p95": round(percentile(values, 0.95) * 1000, 2),
+        "p99": round(percentile(values, 0.99) * 1000, 2),
+        "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _serve(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def _one_chat(client: httpx.AsyncClient, prompt: str) -> dict:
+    start = time.perf_counter()
+    try:
+        r = await client.post("/api/chat", json={"prompt": prompt})
+        text = r.json().get("response", "") if r.status_code == 200 else ""
+        ok = r.status_code == 200 and not text.startswith(ERROR_MARKERS)
+    except Exception:
+        ok, text = False, ""
+    return {"ok": ok, "latency": time.perf_counter() - start, "tokens": len(text.split())}
+
+
+async def _one_stream(client: httpx.AsyncClient, prompt: str) -> dict:
+    start = time.perf_counter()
+    first: Optional[float] = None
+    parts = []
+    try:
+        async with client.stream("POST", "/api/chat/stream", json={"prompt": prompt}) as r:
+            async for chunk in r.aiter_bytes():
+                if first is None and chunk:
+                    first = time.perf_counter()
+                parts.append(chunk)
+            status = r.status_code
+        text = b"".join(parts).decode("utf-8", "replace")
+        ok = status == 200 and not any(m in text for m in ERROR_MARKERS)
+    except Exception:
+        ok, text = False, ""
+    end = time.perf_counter()
+    tokens = len(text.split())
+    ttft = (first - start) if first is not None else None
+    gen_time = end - first if first is not None else 0.0
+    return {
+        "ok": ok,
+        "latency": end - start,
+        "ttft": ttft,
+        "tokens": tokens,
+        "tokens_per_sec": tokens / gen_time if gen_time > 0 else 0.0,
+    }
+
+
+async def run_endpoint(client: httpx.AsyncClient, kind: str, requests: int, concurrency: int) -> dict:
+    one = _one_stream if kind == "chat_stream" else _one_chat
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"benchmark prompt {i}")
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            results.append(await one(client, prompt))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "requests_per_sec": round(len(results) / wall, 2),
+        "latency_ms": summarize_ms([r["latency"] for r in ok]),
+        "tokens_per_sec_total": round(sum(r["tokens"] for r in ok) / wall, 1),
+    }
+    if kind == "chat_stream":
+        summary["ttft_ms"] = summarize_ms([r["ttft"] for r in ok if r["ttft"] is not None])
+        per_stream = [r["tokens_per_sec"] for r in ok if r["tokens_per_sec"]]
+        summary["tokens_per_sec_per_stream"] = round(sum(per_stream) / len(per_stream), 1) if per_stream else 0.0
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+async def main(args: argparse.Namespace) -> dict:
+    servers = []
+    target = args.target
+    if target is None:
+        hosts = []
+        for i in range(args.fake_hosts):
+            fake_port = _free_port()
+            config = fake_ollama.config_from_args(args)
+            config.seed += i
+            servers.append(await _serve(fake_ollama.create_app(config), fake_port))
+            hosts.append(f"http://127.0.0.1:{fake_port}")
+        app_port = _free_port()
+        # llm_service / backends read OLLAMA_HOST(S) at import time
+        os.environ["OLLAMA_HOST"] = hosts[0]
+        os.environ["OLLAMA_HOSTS"] = ",".join(hosts)
+        from app.main import app
+
+        servers.append(await _serve(app, app_port))
+        target = f"http://127.0.0.1:{app_port}"
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    try:
+        async with httpx.AsyncClient(base_url=target, timeout=args.timeout, limits=limits) as client:
+            for kind in args.endpoints:
+                results[kind] = await run_endpoint(client, kind, args.requests, args.concurrency)
+    finally:
+        for server, task in reversed(servers):
+            server.should_exit = True
+            await task
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "target": args.target or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "fake_ollama": None if args.target else vars(fake_ollama.config_from_args(args)),
+            "fake_hosts": None if args.target else args.fake_hosts,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list:
+    """Latency/TTFT percentiles that got worse than baseline by more than max_regression (fraction)."""
+    regressions = []
+    for kind, now in current["results"].items():
+        before = baseline.get("results", {}).get(kind)
+        if not before:
+            continue
+        for metric in ("latency_ms", "ttft_ms"):
+            for p in ("p50", "p95", "p99"):
+                old, new = before.get(metric, {}).get(p), now.get(metric, {}).get(p)
+                if old and new and (new - old) / old > max_regression:
+                    regressions.append(f"{kind}.{metric}.{p}: {old} -> {new}")
+        if now["error_rate"] > before["error_rate"] + max_regression:
+            regressions.append(f"{kind}.error_rate: {before['error_rate']} -> {now['error_rate']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load test /api/chat and /api/chat/stream")
+    parser.add_argument("--target", default=None, help="base URL of a running backend (default: start one in-process)")
+    parser.add_argument("--endpoints", nargs="+", default=["chat", "chat_stream"], choices=["chat", "chat_stream"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--out", default=None, help="write the JSON result here as well as to stdout")
+    parser.add_argument("--compare", default=None, help="baseline JSON from an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    parser.add_argument("--fake-hosts", type=int, default=1, help="fake Ollama servers behind the in-process backend")
+    fake_ollama.add_arguments(parser)
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
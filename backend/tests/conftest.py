@@ -0,0 +1,87 @@
+import asyncio
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import db, llm_service, metrics, models  # noqa: F401 (registers tables)
+from app.backends import backend_pool, configured_hosts
+from app.db import get_session
+from app.history import history_cache
+from app.main import app
+from app.search import ensure_search_index
+from app.usercache import auth_cache
+from benchmarks import fake_ollama
+
+
+@pytest.fixture(autouse=True)
+def fresh_backend_pool():
+    # circuit-breaker state must not leak between tests that inject upstream failures
+    backend_pool.reset(configured_hosts())
+    yield backend_pool
+    backend_pool.reset(configured_hosts())
+
+
+@pytest.fixture(autouse=True)
+def fresh_history_cache():
+    # cached tails are keyed by session id, which every test database hands out from 1 again
+    history_cache.clear()
+    yield history_cache
+    history_cache.clear()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # NullPool: every asyncio.run() in a test gets fresh connections on its own loop
+    eng = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+
+    async def create():
+        async with eng.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(ensure_search_index)
+
+    asyncio.run(create())
+    return eng
+
+
+@pytest.fixture
+def app_db(engine, monkeypatch):
+    # background workers (write-behind, summarizer) open their own sessions
+    # setitem, not setattr: reading db.AsyncSessionLocal first would build the real engine via db.__getattr__
+    monkeypatch.setitem(vars(db), "AsyncSessionLocal", sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+
+    async def override():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override
+    auth_cache.clear()
+    yield engine
+    app.dependency_overrides.pop(get_session, None)
+    auth_cache.clear()
+
+
+@pytest.fixture
+def use_fake_ollama(monkeypatch):
+    """Point llm_service at an in-process fake Ollama: use_fake_ollama(**FakeOllamaConfig fields) -> its app."""
+
+    def use(**config):
+        app = fake_ollama.create_app(fake_ollama.FakeOllamaConfig(**{"token_delay": 0, "tokens": 3, **config}))
+        client = httpx.AsyncClient(base_url="http://fake", transport=httpx.ASGITransport(app=app))
+        monkeypatch.setattr(llm_service, "_client", client)
+        return app
+
+    return use
+
+
+@pytest.fixture
+def metric_value():
+    """Current value of a Prometheus sample, 0 when it hasn't been recorded yet."""
+
+    def value(name: str, **labels) -> float:
+        return metrics.registry.get_sample_value(name, labels) or 0.0
+
+    return value
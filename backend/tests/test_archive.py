@@ -0,0 +1,93 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main
+from app.archive import MessageArchiver
+from app.auth import create_access_token
+from app.models import ArchivedMessage, Message
+
+NOW = datetime(2026, 6, 1)
+
+
+async def _seed(engine):
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        user = await crud.create_user(db, "cold", "x")
+        active = await crud.create_session(db, "active", user_id=user.id)
+        idle = await crud.create_session(db, "idle", user_id=user.id)
+        rows = [
+            {"session_id": active.id, "role": "user", "content": f"old {i} " * 40, "created_at": NOW - timedelta(days=400, minutes=-i)}
+            for i in range(5)
+        ] + [
+            {"session_id": active.id, "role": "assistant", "content": f"new {i}", "created_at": NOW - timedelta(minutes=10 - i)}
+            for i in range(5)
+        ] + [
+            # inserted last: the idle session holds the highest ids
+            {"session_id": idle.id, "role": "user", "content": f"idle {i}", "created_at": NOW - timedelta(days=60, minutes=-i)}
+            for i in range(3)
+        ]
+        await db.execute(insert(Message.__table__), rows)
+        await db.commit()
+        return user, active, idle
+
+
+def test_archival_keeps_reads_transparent(app_db):
+    archiver = MessageArchiver(
+        after_days=180, inactive_days=30, batch_size=2,
+        session_factory=sessionmaker(app_db, class_=AsyncSession, expire_on_commit=False),
+    )
+
+    async def run():
+        user, active, idle = await _seed(app_db)
+        async with AsyncSession(app_db) as db:
+            before = {s: [(m.id, m.content) for m in await crud.get_messages(db, s)] for s in (active.id, idle.id)}
+        moved = await archiver.archive_once(now=NOW)
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            hot = (await db.execute(select(func.count()).select_from(Message))).scalar()
+            cold = (await db.execute(select(func.count()).select_from(ArchivedMessage))).scalar()
+            after = {s: [(m.id, m.content) for m in await crud.get_messages(db, s)] for s in (active.id, idle.id)}
+            recent = await crud.get_recent_messages(db, active.id, 7)
+            fresh = await crud.create_message(db, idle.id, "user", "back again")
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'cold'})}"}
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            first = await ac.get(f"/api/sessions/{active.id}/messages", params={"limit": 4}, headers=headers)
+            second = await ac.get(
+                f"/api/sessions/{active.id}/messages",
+                params={"limit": 4, "cursor": first.headers["x-next-cursor"]},
+                headers=headers,
+            )
+            exported = await ac.get("/api/export", headers=headers)
+        return moved, hot, cold, before, after, recent, fresh, first, second, exported
+
+    moved, hot, cold, before, after, recent, fresh, first, second, exported = asyncio.run(run())
+    # 5 aged messages + the idle session except its newest row, which keeps the highest id hot
+    assert moved == 7 and cold == 7 and hot == 6
+    assert after == before
+    assert [m.content for m in recent] == [f"old {i} " * 40 for i in (3, 4)] + [f"new {i}" for i in range(5)]
+    assert fresh.id > max(i for rows in before.values() for i, _ in rows)
+    assert [m["content"] for m in first.json() + second.json()] == [c for _, c in before[min(before)]][:8]
+    lines = [json.loads(line) for line in exported.text.splitlines()[3:]]
+    assert [m["content"] for m in lines] == [c for rows in before.values() for _, c in rows] + ["back again"]
+    stats = archiver.stats()
+    assert stats["archived_messages"] == 7 and stats["reclaimed_bytes"] > 0
+
+
+def test_messages_version_survives_archival(app_db):
+    async def run():
+        user, active, idle = await _seed(app_db)
+        async with AsyncSession(app_db) as db:
+            version = await crud.get_messages_version(db, active.id)
+        archiver = MessageArchiver(
+            after_days=0.001, inactive_days=0,
+            session_factory=sessionmaker(app_db, class_=AsyncSession, expire_on_commit=False),
+        )
+        await archiver.archive_once(now=NOW + timedelta(days=1))
+        async with AsyncSession(app_db) as db:
+            return version, await crud.get_messages_version(db, active.id)
+
+    version, archived_version = asyncio.run(run())
+    assert archived_version == version  # same listing, same validators
@@ -0,0 +1,48 @@
+import asyncio
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.auth import create_access_token, get_user_from_token
+from app.usercache import AuthCache, auth_cache
+
+
+def test_cached_user_skips_db_and_is_invalidated(engine):
+    auth_cache.clear()
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "cached", "h1")
+        token = create_access_token({"sub": "cached"})
+
+        async with AsyncSession(engine) as db:
+            first = await get_user_from_token(token, db)
+        before = len(statements)
+        async with AsyncSession(engine) as db:
+            second = await get_user_from_token(token, db)
+            assert second.hashed_password == "h1"
+        no_queries = len(statements) == before
+
+        async with AsyncSession(engine) as db:
+            await crud.update_user_password(db, user.id, "h2")
+        async with AsyncSession(engine) as db:
+            third = await get_user_from_token(token, db)
+        return first.id, second.id, third.hashed_password, no_queries
+
+    try:
+        first_id, second_id, password, no_queries = asyncio.run(run())
+    finally:
+        auth_cache.clear()
+    assert first_id == second_id
+    assert no_queries
+    assert password == "h2"
+    stats = auth_cache.stats()
+    assert stats["token_hits"] >= 2 and stats["invalidations"] == 1
+
+
+def test_token_ttl_capped_by_expiry():
+    c = AuthCache(ttl=60)
+    c.put_subject("expired", "u", exp=0)
+    assert c.get_subject("expired") is None
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import httpx
+
+from app import llm_service, metrics
+from app.backends import Backend, NoBackendAvailable
+from benchmarks import fake_ollama
+
+
+class HostRouter(httpx.AsyncBaseTransport):
+    """One fake Ollama app per host name; hosts mapped to None refuse connections."""
+
+    def __init__(self, hosts: dict):
+        self.hosts = {name: httpx.ASGITransport(app=app) if app else None for name, app in hosts.items()}
+
+    async def handle_async_request(self, request):
+        transport = self.hosts[request.url.host]
+        if transport is None:
+            raise httpx.ConnectError("connection refused", request=request)
+        return await transport.handle_async_request(request)
+
+
+def _pool(monkeypatch, pool, **hosts):
+    apps = {name: fake_ollama.create_app(fake_ollama.FakeOllamaConfig(token_delay=0, tokens=3, **cfg)) if cfg is not None else None
+            for name, cfg in hosts.items()}
+    monkeypatch.setattr(llm_service, "_client", httpx.AsyncClient(transport=HostRouter(apps)))
+    pool.reset([f"http://{name}:11434" for name in hosts])
+    return apps
+
+
+def test_least_outstanding_routing_spreads_concurrent_streams(monkeypatch, fresh_backend_pool):
+    apps = _pool(monkeypatch, fresh_backend_pool, a={}, b={}, c={})
+
+    async def run():
+        streams = [llm_service.stream_chat_bytes("hi") for _ in range(6)]
+        firsts = [await s.__anext__() for s in streams]  # all six open at once
+        load = [b.outstanding for b in fresh_backend_pool.backends]
+        for s in streams:
+            await s.aclose()
+        return firsts, load
+
+    firsts, load = asyncio.run(run())
+    assert all(f.startswith(b"tok0 ") for f in firsts)
+    assert load == [2, 2, 2]
+    assert [app.state.stats["requests"] for app in apps.values()] == [2, 2, 2]
+    assert fresh_backend_pool.stats()["outstanding"] == 0
+
+
+def test_routes_only_to_hosts_with_the_model(monkeypatch, fresh_backend_pool):
+    apps = _pool(monkeypatch, fresh_backend_pool, small={"models": ("llama3.1:8b",)}, big={"models": ("llama3.1:70b", "qwen2")})
+
+    async def run():
+        await fresh_backend_pool.check_all(llm_service.get_client())
+        for _ in range(3):
+            await llm_service.call_chat("hi", model="llama3.1:70b")
+        await llm_service.call_chat("hi", model="qwen2")  # bare name means :latest
+        try:
+            await llm_service.call_chat("hi", model="mistral")
+        except NoBackendAvailable:
+            return True
+
+    assert asyncio.run(run())
+    assert apps["small"].state.stats["requests"] == 0
+    assert apps["big"].state.stats["requests"] == 4
+    assert fresh_backend_pool.stats()["host"]["http://big:11434"]["models"] == ["llama3.1:70b", "qwen2:latest"]
+
+
+def test_failover_before_first_byte_and_breaker_ejects(monkeypatch, fresh_backend_pool):
+    apps = _pool(monkeypatch, fresh_backend_pool, down=None, flaky={"error_rate": 1.0}, good={})
+    monkeypatch.setattr(llm_service, "OLLAMA_RETRIES", 2)
+
+    async def run():
+        out = []
+        for _ in range(4):
+            out.append(b"".join([f async for f in llm_service.stream_chat_bytes("hi")]))
+            out.append((await llm_service.call_chat("hi")).encode())
+        return out
+
+    assert asyncio.run(run()) == [b"tok0 tok1 tok2 "] * 8
+    backends = fresh_backend_pool.stats()["host"]
+    assert backends["http://down:11434"]["state"] == "open"
+    assert backends["http://flaky:11434"]["state"] == "open"
+    assert backends["http://good:11434"]["failures"] == 0
+    # ejected hosts get no more traffic once their breakers are open
+    assert apps["flaky"].state.stats["requests"] == backends["http://flaky:11434"]["requests"] <= 3
+    assert fresh_backend_pool.stats()["failovers"] >= 3
+
+    text = metrics.render()[0].decode()
+    assert 'llm_backends_host_up{name="http://good:11434"} 1.0' in text
+    assert 'llm_backends_host_up{name="http://down:11434"} 0.0' in text
+
+
+def test_half_open_trial_and_health_check_recovery(monkeypatch, fresh_backend_pool):
+    apps = _pool(monkeypatch, fresh_backend_pool, solo={})
+    router = llm_service.get_client()._transport
+    solo = router.hosts["solo"]
+    router.hosts["solo"] = None
+    backend = fresh_backend_pool.backends[0]
+    backend.cooldown = 0
+
+    async def run():
+        client = llm_service.get_client()
+        for _ in range(3):
+            await fresh_backend_pool.check(client, backend)
+        assert backend.state == "half_open"  # cooldown 0: immediately eligible for one trial
+        backend.cooldown = 60
+        backend.opened_at -= 120
+        trial = backend.begin()  # a trial request is in flight: nobody else may use the host
+        try:
+            await llm_service.call_chat("hi")
+        except NoBackendAvailable:
+            pass
+        else:
+            raise AssertionError("expected NoBackendAvailable")
+        backend.end(None, trial=trial)
+        router.hosts["solo"] = solo
+        await fresh_backend_pool.check(client, backend)
+        return await llm_service.call_chat("hi")
+
+    assert asyncio.run(run()) == "tok0 tok1 tok2 "
+    assert backend.state == "closed" and backend.ejections == 1
+    assert apps["solo"].state.stats["requests"] == 1
+
+
+def test_only_the_trial_request_ends_the_trial():
+    backend = Backend("http://solo:11434", failure_threshold=1, cooldown=0)
+    assert backend.begin() is False  # started while the host was still healthy
+    backend.record_failure("boom")
+    trial = backend.begin()
+    assert trial and not backend.available()
+    backend.end(None)  # the old request finishing says nothing about the trial
+    assert not backend.available()
+    backend.end(True, trial=trial)
+    assert backend.state == "closed" and backend.available() and backend.outstanding == 0
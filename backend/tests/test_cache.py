@@ -0,0 +1,63 @@
+import asyncio
+from app import cache, llm_service
+from app.cache import InMemoryResponseCache, SingleFlight
+
+
+def test_lru_and_ttl():
+    async def run():
+        c = InMemoryResponseCache(max_entries=2, ttl=60)
+        await c.set("a", "1")
+        await c.set("b", "2")
+        assert await c.get("a") == "1"  # a is now most recent
+        await c.set("c", "3")  # evicts b
+        assert await c.get("b") is None
+        expired = InMemoryResponseCache(max_entries=2, ttl=0)
+        await expired.set("x", "y")
+        assert await expired.get("x") is None
+        return c.stats(), expired.stats()
+
+    s, e = asyncio.run(run())
+    assert s["evictions"] == 1 and s["hits"] == 1 and s["misses"] == 1
+    assert e["expirations"] == 1
+
+
+def test_single_flight_coalesces():
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do("k", upstream) for _ in range(5)))
+        return sf, results
+
+    sf, results = asyncio.run(run())
+    assert results == ["answer"] * 5
+    assert calls == 1
+    assert sf.coalesced == 4
+
+
+def test_call_chat_cached(monkeypatch):
+    calls = []
+
+    async def fake_call_chat(prompt, history=None, model=llm_service.OLLAMA_MODEL):
+        calls.append(prompt)
+        return "(ollama-http-500) boom" if prompt == "bad" else f"re: {prompt}"
+
+    monkeypatch.setattr(cache, "CHAT_CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "response_cache", InMemoryResponseCache())
+    monkeypatch.setattr(llm_service, "call_chat", fake_call_chat)
+
+    async def run():
+        await llm_service.call_chat_cached("hi", history=[{"role": "user", "content": "x"}])
+        await llm_service.call_chat_cached("hi", history=[{"role": "user", "content": "x"}])
+        await llm_service.call_chat_cached("bad")
+        await llm_service.call_chat_cached("bad")
+
+    asyncio.run(run())
+    # errors are never cached
+    assert calls == ["hi", "bad", "bad"]
@@ -0,0 +1,107 @@
+import asyncio
+from httpx import AsyncClient
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main
+from app.auth import create_access_token
+from app.compression import choose_encoding
+
+
+def test_listings_answer_304_without_loading_rows(app_db):
+    statements = []
+    event.listen(app_db.sync_engine, "before_cursor_execute", lambda c, cur, stmt, *a: statements.append(stmt))
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "etag", "x")
+            s = await crud.create_session(db, "polled", user_id=user.id)
+            await crud.create_message(db, s.id, "user", "hello")
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'etag'})}"}
+        url = f"/api/sessions/{s.id}/messages"
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            first = await ac.get(url, headers=headers)
+            etag = first.headers["etag"]
+            statements.clear()
+            again = await ac.get(url, headers={**headers, "If-None-Match": etag})
+            revalidate_sql = list(statements)
+            other_page = await ac.get(url, params={"limit": 1}, headers={**headers, "If-None-Match": etag})
+            sessions = await ac.get("/api/sessions", headers=headers)
+            sessions_again = await ac.get("/api/sessions", headers={**headers, "If-None-Match": sessions.headers["etag"]})
+
+            async with AsyncSession(app_db, expire_on_commit=False) as db:
+                await crud.create_message(db, s.id, "assistant", "hi there")
+                await crud.create_session(db, "another", user_id=user.id)
+            changed = await ac.get(url, headers={**headers, "If-None-Match": etag})
+            sessions_changed = await ac.get("/api/sessions", headers={**headers, "If-None-Match": sessions.headers["etag"]})
+        return first, again, revalidate_sql, other_page, sessions_again, changed, sessions_changed
+
+    first, again, sql, other_page, sessions_again, changed, sessions_changed = asyncio.run(run())
+    assert first.status_code == 200 and first.headers["cache-control"] == "private, no-cache"
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == first.headers["etag"]
+    assert not any("message.content" in stmt for stmt in sql)  # only the aggregate, no rows
+    assert "last-modified" not in first.headers
+    assert other_page.status_code == 200  # validators are per page
+    assert sessions_again.status_code == 304
+    assert changed.status_code == 200 and [m["content"] for m in changed.json()] == ["hello", "hi there"]
+    assert sessions_changed.status_code == 200 and len(sessions_changed.json()) == 2
+
+
+def test_same_second_write_and_delete_change_the_listing(app_db):
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "same", "x")
+            s = await crud.create_session(db, "busy", user_id=user.id)
+            first_msg = await crud.create_message(db, s.id, "user", "one")
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'same'})}"}
+        url = f"/api/sessions/{s.id}/messages"
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            before = await ac.get(url, headers=headers)
+            async with AsyncSession(app_db, expire_on_commit=False) as db:
+                await crud.create_message(db, s.id, "assistant", "two")  # within the same second
+            since = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+            written = await ac.get(url, headers={**headers, **since, "If-None-Match": before.headers["etag"]})
+            by_date = await ac.get(url, headers={**headers, **since})
+            async with AsyncSession(app_db, expire_on_commit=False) as db:
+                await db.delete(await db.get(type(first_msg), first_msg.id))
+                await db.commit()
+            deleted = await ac.get(url, headers={**headers, "If-None-Match": written.headers["etag"]})
+        return written, by_date, deleted
+
+    written, by_date, deleted = asyncio.run(run())
+    assert written.status_code == 200 and len(written.json()) == 2
+    assert by_date.status_code == 200  # If-Modified-Since alone is never trusted
+    assert deleted.status_code == 200 and [m["content"] for m in deleted.json()] == ["two"]
+
+
+def test_large_listings_compressed_but_stream_is_not(app_db, monkeypatch):
+    async def fake_stream_chat_bytes(prompt, history=None, model=None, pass_through=False):
+        for _ in range(50):
+            yield b"token " * 10
+
+    monkeypatch.setattr(main, "stream_chat_bytes", fake_stream_chat_bytes)
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "gz", "x")
+            s = await crud.create_session(db, "big", user_id=user.id)
+            await crud.create_messages(db, [{"session_id": s.id, "role": "user", "content": f"message {i} " * 20} for i in range(50)])
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'gz'})}", "Accept-Encoding": "gzip"}
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            listing = await ac.get(f"/api/sessions/{s.id}/messages", headers=headers)
+            small = await ac.get("/api/health", headers=headers)
+            stream = await ac.post("/api/chat/stream", json={"prompt": "go"}, headers=headers)
+        return listing, small, stream
+
+    listing, small, stream = asyncio.run(run())
+    assert listing.headers["content-encoding"] == "gzip" and "Accept-Encoding" in listing.headers["vary"]
+    assert int(listing.headers["content-length"]) < len(listing.content) / 4
+    assert len(listing.json()) == 50
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in stream.headers and stream.text == "token " * 500
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
@@ -0,0 +1,23 @@
+import asyncio
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+
+
+def test_bulk_and_paired_writes(engine):
+    async def run():
+        async with AsyncSession(engine) as db:  # default expire_on_commit=True
+            s, first = await crud.create_session_with_message(db, "bulk", "system", "be brief")
+            msgs = await crud.create_messages(
+                db, [{"session_id": s.id, "role": "user", "content": f"m{i}"} for i in range(3)]
+            )
+            user_msg, assistant_msg = await crud.create_message_pair(db, s.id, "q", "a")
+            stored = await crud.get_messages(db, s.id)
+        return s, first, msgs, user_msg, assistant_msg, stored
+
+    s, first, msgs, user_msg, assistant_msg, stored = asyncio.run(run())
+    # ids and timestamps are readable without a refresh
+    assert s.id and first.session_id == s.id and first.id and first.created_at
+    assert all(m.id and m.created_at for m in msgs)
+    assert user_msg.id < assistant_msg.id
+    assert [m.content for m in stored] == ["be brief", "m0", "m1", "m2", "q", "a"]
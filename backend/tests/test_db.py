@@ -0,0 +1,29 @@
+import asyncio
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.db import DB_POOL_SIZE, build_engine
+
+
+def test_sqlite_engine_pragmas_and_pool(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'tuned.db'}", pool_size=2, sqlite_busy_timeout_ms=1234)
+
+    async def run():
+        async with engine.connect() as conn:
+            values = {}
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size"):
+                values[pragma] = (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalar()
+        await engine.dispose()
+        return values
+
+    values = asyncio.run(run())
+    assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+    assert values["journal_mode"] == "wal"
+    assert values["synchronous"] == 1  # NORMAL
+    assert values["busy_timeout"] == 1234
+    assert values["mmap_size"] > 0
+
+
+def test_asyncpg_statement_cache_option():
+    engine = build_engine("postgresql+asyncpg://u:p@localhost/db", statement_cache_size=0)
+    assert engine.url.query["prepared_statement_cache_size"] == "0"
+    assert engine.pool.size() == DB_POOL_SIZE
@@ -0,0 +1,29 @@
+import asyncio
+
+from app import llm_service
+from benchmarks import loadtest
+
+
+def test_llm_service_against_fake_ollama(use_fake_ollama):
+    app = use_fake_ollama(tokens=5)
+
+    async def run():
+        streamed = [c async for c in llm_service.stream_chat("hi")]
+        whole = await llm_service.call_chat("hi")
+        return streamed, whole
+
+    streamed, whole = asyncio.run(run())
+    assert "".join(streamed) == whole == "tok0 tok1 tok2 tok3 tok4 "
+    assert app.state.stats["requests"] == 2
+
+
+def test_fake_ollama_error_injection(use_fake_ollama):
+    use_fake_ollama(error_rate=1.0)
+    assert asyncio.run(llm_service.call_chat("hi")).startswith("(ollama-http-500)")
+
+
+def test_compare_flags_regressions():
+    base = {"results": {"chat": {"error_rate": 0.0, "latency_ms": {"p50": 100, "p95": 200, "p99": 300}}}}
+    now = {"results": {"chat": {"error_rate": 0.0, "latency_ms": {"p50": 101, "p95": 260, "p99": 300}}}}
+    assert loadtest.compare(now, base, 0.10) == ["chat.latency_ms.p95: 200 -> 260"]
+    assert loadtest.percentile([1, 2, 3, 4], 0.5) == 2.5
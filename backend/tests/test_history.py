@@ -0,0 +1,66 @@
+import asyncio
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, history, main
+from app.auth import create_access_token
+from app.history import SessionHistoryCache, estimate_tokens
+
+
+def test_context_is_token_budgeted_and_incremental(engine):
+    async def run():
+        cache = SessionHistoryCache(tail_size=50)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            s = await crud.create_session(db, "budget")
+            for i in range(20):
+                await crud.create_message(db, s.id, "user", f"message number {i:02d}")
+            per_msg = estimate_tokens("message number 00")
+            ctx = await cache.get_context(db, s.id, budget=per_msg * 3)
+            assert [m["content"] for m in ctx] == [f"message number {i}" for i in (17, 18, 19)]
+
+            # new messages extend the cached tail without another DB load
+            cache.append(s.id, "assistant", "fresh reply")
+            ctx = await cache.get_context(db, s.id, budget=per_msg * 3)
+            assert ctx[-1] == {"role": "assistant", "content": "fresh reply"}
+            assert cache.misses == 1 and cache.hits == 1
+
+    asyncio.run(run())
+
+
+def test_chat_uses_session_history(app_db, monkeypatch):
+    seen = []
+
+    async def fake_call_chat_cached(prompt, history=None, model=None, upstream=None):
+        seen.append(history)
+        return f"echo {prompt}"
+
+    monkeypatch.setattr(main, "call_chat_cached", fake_call_chat_cached)
+    monkeypatch.setattr(history, "history_cache", SessionHistoryCache())
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            owner = await crud.create_user(db, "owner", "x")
+            await crud.create_user(db, "intruder", "x")
+            s = await crud.create_session(db, "chat", user_id=owner.id)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'owner'})}"}
+        other = {"Authorization": f"Bearer {create_access_token({'sub': 'intruder'})}"}
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            r1 = await ac.post("/api/chat", json={"prompt": "one", "session_id": s.id}, headers=headers)
+            r2 = await ac.post("/api/chat", json={"prompt": "two", "session_id": s.id}, headers=headers)
+            r3 = await ac.post("/api/chat", json={"prompt": "x", "session_id": 99999}, headers=headers)
+            # someone else's session is neither read into the prompt nor written to
+            anonymous = await ac.post("/api/chat", json={"prompt": "leak", "session_id": s.id})
+            foreign = await ac.post("/api/chat", json={"prompt": "leak", "session_id": s.id}, headers=other)
+            foreign_stream = await ac.post("/api/chat/stream", json={"prompt": "leak", "session_id": s.id}, headers=other)
+        async with AsyncSession(app_db) as db:
+            stored = [m.content for m in await crud.get_messages(db, s.id)]
+        return r1, r2, r3, anonymous, foreign, foreign_stream, stored
+
+    r1, r2, r3, anonymous, foreign, foreign_stream, stored = asyncio.run(run())
+    assert r1.status_code == 200 and r2.json()["response"] == "echo two"
+    assert r3.status_code == 404
+    assert anonymous.status_code == 401
+    assert foreign.status_code == foreign_stream.status_code == 404
+    assert len(seen) == 2 and stored == ["one", "echo one", "two", "echo two"]
+    assert seen[0] == []
+    assert seen[1] == [{"role": "user", "content": "one"}, {"role": "assistant", "content": "echo one"}]
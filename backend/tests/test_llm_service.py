@@ -0,0 +1,47 @@
+import asyncio
+import json
+import httpx
+from app import llm_service
+
+
+def _fake_ollama(request: httpx.Request) -> httpx.Response:
+    payload = json.loads(request.content)
+    if payload.get("stream"):
+        lines = [
+            json.dumps({"message": {"content": "hel"}, "done": False}),
+            json.dumps({"message": {"content": "lo"}, "done": False}),
+            json.dumps({"done": True}),
+        ]
+        return httpx.Response(200, content="\n".join(lines).encode())
+    return httpx.Response(200, json={"message": {"content": "pong"}})
+
+
+def _install_fake(monkeypatch):
+    client = httpx.AsyncClient(base_url="http://ollama.test", transport=httpx.MockTransport(_fake_ollama))
+    monkeypatch.setattr(llm_service, "_client", client)
+    return client
+
+
+def test_call_chat_reuses_shared_client(monkeypatch):
+    client = _install_fake(monkeypatch)
+
+    async def run():
+        a = await llm_service.call_chat("ping")
+        b = await llm_service.call_chat("ping")
+        return a, b
+
+    assert asyncio.run(run()) == ("pong", "pong")
+    assert llm_service.get_client() is client
+    stats = llm_service.pool_stats()
+    assert stats["in_flight"] == 0
+    assert stats["in_flight_peak"] >= 1
+
+
+def test_stream_chat_releases_slot(monkeypatch):
+    _install_fake(monkeypatch)
+
+    async def run():
+        return [c async for c in llm_service.stream_chat("ping")]
+
+    assert asyncio.run(run()) == ["hel", "lo"]
+    assert llm_service.pool_stats()["in_flight"] == 0
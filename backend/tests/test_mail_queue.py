@@ -0,0 +1,124 @@
+import asyncio
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main, mailer
+from app.mailer import MailQueue, OutgoingEmail, StubTransport
+
+
+def _mail(i: int) -> OutgoingEmail:
+    return OutgoingEmail(to_email=f"u{i}@example.com", subject="s", html_content="<p>x</p>")
+
+
+def test_queue_batches_and_retries():
+    transport = StubTransport(fail_times=2)
+
+    async def run():
+        q = MailQueue(transport=transport, batch_size=3, max_attempts=3, retry_base_delay=0.01)
+        for i in range(4):
+            assert q.enqueue(_mail(i))
+        await asyncio.sleep(0.1)
+        await q.stop()
+        return q.stats()
+
+    stats = asyncio.run(run())
+    assert sorted(m.to_email for m in transport.outbox) == [f"u{i}@example.com" for i in range(4)]
+    assert stats["sent"] == 4 and stats["retried"] == 2 and stats["failed"] == 0
+
+
+def test_gives_up_after_max_attempts():
+    async def run():
+        q = MailQueue(transport=StubTransport(fail_times=10), max_attempts=2, retry_base_delay=0.01)
+        q.enqueue(_mail(0))
+        await asyncio.sleep(0.1)
+        await q.stop()
+        return q.stats()
+
+    assert asyncio.run(run())["failed"] == 1
+
+
+def test_stop_sends_pending_retries_and_logs_the_rest(caplog):
+    class Stuck(StubTransport):
+        async def send_batch(self, messages):
+            await asyncio.sleep(60)
+
+    async def run():
+        # the retry would only be due in a minute: stop() sends it right away
+        q = MailQueue(transport=StubTransport(fail_times=1), max_attempts=3, retry_base_delay=60)
+        q.enqueue(_mail(0))
+        await asyncio.sleep(0.01)
+        retrying = q.stats()["retry_pending"]
+        await q.stop(timeout=1)
+        stuck = MailQueue(transport=Stuck(), batch_size=1)
+        for i in range(3):
+            stuck.enqueue(_mail(i))
+        await asyncio.sleep(0.01)
+        await stuck.stop(timeout=0.05)
+        return retrying, q
+
+    retrying, q = asyncio.run(run())
+    assert retrying == 1 and q.stats()["sent"] == 1 and q.transport.outbox[0].to_email == "u0@example.com"
+    assert "mail: 3 messages not delivered at shutdown (1 mid-send)" in caplog.text
+
+
+def test_restarted_worker_keeps_queued_mail():
+    class SlowFirst(StubTransport):
+        async def send_batch(self, messages):
+            if not self.outbox and messages[0].to_email == "u0@example.com":
+                await asyncio.sleep(60)
+            return await super().send_batch(messages)
+
+    transport = SlowFirst()
+    q = MailQueue(transport=transport, batch_size=1)
+
+    async def interrupted():
+        q.enqueue(_mail(0))
+        q.enqueue(_mail(1))
+        await asyncio.sleep(0.01)  # the loop closes with u0 mid-send and u1 queued
+
+    async def run():
+        q.enqueue(_mail(2))
+        await q.stop()
+
+    asyncio.run(interrupted())
+    asyncio.run(run())
+    assert [m.to_email for m in transport.outbox] == ["u1@example.com", "u2@example.com"]
+
+
+def test_reset_request_only_enqueues(app_db, monkeypatch):
+    transport = StubTransport()
+    monkeypatch.setattr(mailer, "mail_queue", MailQueue(transport=transport))
+    monkeypatch.setenv("FRONTEND_URL", "http://front.test")
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            await crud.create_user(db, "forgetful", "x", email="f@example.com")
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            r = await ac.post("/api/request-password-reset", json={"username": "forgetful"})
+            missing = await ac.post("/api/request-password-reset", json={"username": "nobody"})
+            await mailer.mail_queue.stop()
+            reset = await ac.post(
+                "/api/reset-password", json={"token": r.json()["reset_token"], "new_password": "brand-new-pass"}
+            )
+            login = await ac.post("/api/login", json={"username": "forgetful", "password": "brand-new-pass"})
+        return r, missing, reset, login
+
+    r, missing, reset, login = asyncio.run(run())
+    assert r.json()["ok"] is True and missing.json() == {"ok": True}
+    assert [m.to_email for m in transport.outbox] == ["f@example.com"]
+    assert "http://front.test/reset-password?token=" in transport.outbox[0].html_content
+    assert reset.status_code == 200 and login.status_code == 200
+
+
+def test_legacy_send_reset_email_only_enqueues(monkeypatch):
+    transport = StubTransport()
+    monkeypatch.setattr(mailer, "mail_queue", MailQueue(transport=transport))
+
+    async def run():
+        queued = mailer.send_reset_email("old@example.com", "https://front.test/reset?token=abc")
+        pending = mailer.mail_queue.stats()["queued"]
+        await mailer.mail_queue.stop()
+        return queued, pending
+
+    assert asyncio.run(run()) == (True, 1)
+    assert [m.to_email for m in transport.outbox] == ["old@example.com"]
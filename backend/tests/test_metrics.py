@@ -0,0 +1,48 @@
+import asyncio
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, llm_service, main, metrics
+
+
+def test_metrics_endpoint_records_routes(metric_value):
+    async def run():
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            await ac.get("/api/health")
+            return await ac.get("/metrics")
+
+    before = metric_value("http_request_duration_seconds_count", method="GET", route="/api/health", status="200")
+    r = asyncio.run(run())
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    assert "http_request_duration_seconds_bucket" in r.text
+    assert "llm_scheduler_active" in r.text
+    after = metric_value("http_request_duration_seconds_count", method="GET", route="/api/health", status="200")
+    assert after == before + 1
+
+
+def test_llm_stream_metrics(use_fake_ollama, metric_value):
+    use_fake_ollama(tokens=3)
+    chunks = metric_value("llm_stream_chunks_total")
+    nbytes = metric_value("llm_stream_bytes_total")
+    streams = metric_value("llm_upstream_duration_seconds_count", kind="stream", outcome="ok")
+
+    async def run():
+        return [c async for c in llm_service.stream_chat("hi")]
+
+    asyncio.run(run())
+    assert metric_value("llm_stream_chunks_total") == chunks + 3
+    assert metric_value("llm_stream_bytes_total") == nbytes + len("tok0 tok1 tok2 ")
+    assert metric_value("llm_upstream_duration_seconds_count", kind="stream", outcome="ok") == streams + 1
+    assert metric_value("llm_streams_in_flight") == 0
+
+
+def test_db_query_timing(engine, metric_value):
+    metrics.instrument_engine(engine.sync_engine)
+    before = metric_value("db_query_duration_seconds_count", verb="INSERT")
+
+    async def run():
+        async with AsyncSession(engine) as db:
+            await crud.create_session(db, "timed")
+
+    asyncio.run(run())
+    assert metric_value("db_query_duration_seconds_count", verb="INSERT") == before + 1
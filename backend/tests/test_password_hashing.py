@@ -0,0 +1,70 @@
+import asyncio
+from httpx import AsyncClient
+from passlib.context import CryptContext
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import auth, crud, main
+from app.models import User
+
+
+def test_async_hash_and_verify():
+    async def run():
+        h = await auth.get_password_hash_async("s3cret-pass")
+        return await auth.verify_password_async("s3cret-pass", h), await auth.verify_password_async("nope", h)
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_login_upgrades_outdated_hash(app_db):
+    weak = CryptContext(schemes=["argon2"], argon2__time_cost=1, argon2__memory_cost=1024, argon2__parallelism=1)
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "upgrader", weak.hash("longpassword"))
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            bad = await ac.post("/api/login", json={"username": "upgrader", "password": "wrong-pass"})
+            ok = await ac.post("/api/login", json={"username": "upgrader", "password": "longpassword"})
+        async with AsyncSession(app_db) as db:
+            stored = (await crud.get_user_by_username(db, "upgrader")).hashed_password
+        return bad.status_code, ok, stored
+
+    bad, ok, stored = asyncio.run(run())
+    assert bad == 401
+    assert ok.status_code == 200 and ok.json()["access_token"]
+    assert f"t={auth.ARGON2_TIME_COST}" in stored and not auth.pwd_context.needs_update(stored)
+
+
+def test_unknown_username_still_verifies_a_hash(app_db, monkeypatch):
+    checked = []
+    verify = auth._verify_and_update
+
+    def counting_verify(plain, hashed):
+        checked.append(hashed)
+        return verify(plain, hashed)
+
+    monkeypatch.setattr(auth, "_verify_and_update", counting_verify)
+
+    async def run():
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            return [(await ac.post("/api/login", json={"username": "ghost", "password": "whatever1"})).status_code for _ in range(2)]
+
+    assert asyncio.run(run()) == [401, 401]
+    # same work as a wrong password, against one dummy hash with the current parameters
+    assert len(checked) == 2 and checked[0] == checked[1]
+    assert not auth.pwd_context.needs_update(checked[0])
+
+
+def test_concurrent_registrations_of_one_username(app_db):
+    async def run():
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            creds = {"username": "twice", "password": "longpassword"}
+            # both pass the existence check while the other is still hashing
+            responses = await asyncio.gather(*(ac.post("/api/register", json=creds) for _ in range(2)))
+        async with AsyncSession(app_db) as db:
+            users = (await db.execute(select(User).where(User.username == "twice"))).scalars().all()
+        return sorted(r.status_code for r in responses), responses, len(users)
+
+    codes, responses, users = asyncio.run(run())
+    assert codes == [200, 400] and users == 1
+    assert any(r.json().get("detail") == "username already registered" for r in responses)
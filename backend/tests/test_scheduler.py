@@ -0,0 +1,146 @@
+import asyncio
+import time
+import pytest
+from httpx import AsyncClient
+
+from app import llm_service, main
+from app.scheduler import LLMScheduler, SchedulerRejected, iter_with_deadline
+
+
+def test_round_robin_across_users():
+    order = []
+
+    async def job(s, user, tag):
+        async with s.slot(user):
+            order.append(tag)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        s = LLMScheduler(max_concurrency=1, max_queue=10, max_queue_per_user=10)
+        await s.acquire("blocker")
+        tasks = [asyncio.create_task(job(s, "a", f"a{i}")) for i in range(3)]
+        tasks.append(asyncio.create_task(job(s, "b", "b0")))
+        await asyncio.sleep(0)
+        s.release()
+        await asyncio.gather(*tasks)
+        return s.stats()
+
+    stats = asyncio.run(run())
+    # b0 is served right after a0 instead of behind all of a's requests
+    assert order == ["a0", "b0", "a1", "a2"]
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_background_lane_waits_for_interactive_requests():
+    order = []
+
+    async def job(s, user, tag, background=False):
+        async with s.slot(user, background=background):
+            order.append(tag)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        s = LLMScheduler(max_concurrency=1, max_queue=10, max_queue_per_user=10)
+        await s.acquire("blocker")
+        tasks = [asyncio.create_task(job(s, "system:summarizer", "summary", background=True))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(job(s, user, user)) for user in ("a", "b")]
+        await asyncio.sleep(0)
+        queued = s.stats()["queued_background"]
+        s.release()
+        await asyncio.gather(*tasks)
+        return queued, s.stats()
+
+    queued, stats = asyncio.run(run())
+    # queued first, served last
+    assert order == ["a", "b", "summary"]
+    assert queued == 1 and stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_rejects_when_queue_full():
+    async def run():
+        s = LLMScheduler(max_concurrency=1, max_queue=1, max_queue_per_user=1, queue_timeout=5)
+        await s.acquire("a")
+        waiter = asyncio.create_task(s.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerRejected) as per_user:
+            await s.acquire("a")
+        with pytest.raises(SchedulerRejected) as full:
+            await s.acquire("b")
+        s.release()
+        await waiter
+        s.release()
+        return per_user.value, full.value, s.stats()
+
+    per_user, full, stats = asyncio.run(run())
+    assert full.status_code == 503 and full.retry_after >= 1
+    assert per_user.status_code == 429 and per_user.retry_after >= 1
+    assert stats["rejected"] == 2 and stats["active"] == 0
+
+
+def test_queue_timeout_frees_place():
+    async def run():
+        s = LLMScheduler(max_concurrency=1, max_queue=4, queue_timeout=0.01)
+        await s.acquire("a")
+        with pytest.raises(SchedulerRejected):
+            await s.acquire("b")
+        s.release()
+        return s.stats()
+
+    stats = asyncio.run(run())
+    assert stats["timed_out"] == 1 and stats["queued"] == 0 and stats["active"] == 0
+
+
+def test_iter_with_deadline():
+    async def slow():
+        yield "first"
+        await asyncio.sleep(1)
+        yield "never"
+
+    async def run():
+        got = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for item in iter_with_deadline(slow(), time.monotonic() + 0.05):
+                got.append(item)
+        return got
+
+    assert asyncio.run(run()) == ["first"]
+
+
+def test_release_feeds_retry_after():
+    async def run():
+        s = LLMScheduler(max_concurrency=1, max_queue=4)
+        for _ in range(10):
+            # the streaming path: acquire() and release() without slot()
+            acquired = await s.acquire("a")
+            await asyncio.sleep(0.05)
+            s.release(acquired)
+        await s.acquire("a")
+        waiter = asyncio.create_task(s.acquire("b"))
+        await asyncio.sleep(0)
+        retry_after = s._retry_after()
+        s.release()
+        await waiter
+        s.release()
+        return retry_after
+
+    # one queued: 2 x the 1s starting estimate, had the 0.05s holds not been recorded
+    assert asyncio.run(run()) == 1
+
+
+def test_chat_errors_never_bypass_the_scheduler(app_db, monkeypatch):
+    calls = []
+
+    async def broken_call_chat(prompt, history=None, model=None):
+        calls.append(prompt)
+        raise TypeError("bad payload")
+
+    monkeypatch.setattr(llm_service, "call_chat", broken_call_chat)
+
+    async def run():
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            return await ac.post("/api/chat", json={"prompt": "once only"})
+
+    r = asyncio.run(run())
+    # no unscheduled retry with the prompt alone
+    assert r.status_code == 500 and calls == ["once only"]
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime
+
+from httpx import AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main
+from app.archive import MessageArchiver
+from app.auth import create_access_token
+from app.models import Message
+
+
+def test_search_ranked_highlighted_and_scoped(app_db):
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            alice = await crud.create_user(db, "alice", "x")
+            bob = await crud.create_user(db, "bob", "x")
+            s1 = await crud.create_session(db, "travel", user_id=alice.id)
+            s2 = await crud.create_session(db, "bob's", user_id=bob.id)
+            await crud.create_messages(
+                db,
+                [
+                    {"session_id": s1.id, "role": "user", "content": "Best <b>pizza</b> in Naples?"},
+                    {"session_id": s1.id, "role": "assistant", "content": "Pizza pizza pizza: try Naples pizza"},
+                    {"session_id": s1.id, "role": "user", "content": "And pasta in Rome"},
+                    {"session_id": s2.id, "role": "user", "content": "pizza for bob"},
+                ],
+            )
+            # rows written after the index exists are picked up by the triggers
+            await crud.create_message(db, s1.id, "user", "cold pizza breakfast")
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            page1 = (await ac.get("/api/search", params={"q": "pizza", "limit": 2}, headers=headers)).json()
+            page2 = (await ac.get("/api/search", params={"q": "pizza", "limit": 2, "offset": 2}, headers=headers)).json()
+            odd = await ac.get("/api/search", params={"q": 'pizza" OR NEAR(', "limit": 5}, headers=headers)
+        return page1, page2, odd
+
+    page1, page2, odd = asyncio.run(run())
+    hits = page1["results"] + page2["results"]
+    assert len(hits) == 3 and page1["next_offset"] == 2 and page2["next_offset"] is None
+    assert all(h["session_name"] == "travel" for h in hits)
+    assert hits[0]["snippet"].count("<mark>") >= 3  # the message that says pizza most ranks first
+    escaped = next(h for h in hits if "Naples?" in h["snippet"])
+    assert "&lt;b&gt;<mark>pizza</mark>&lt;/b&gt;" in escaped["snippet"]
+    assert odd.status_code == 200
+
+
+def test_archived_messages_stay_searchable(app_db):
+    archiver = MessageArchiver(
+        after_days=30, inactive_days=0,
+        session_factory=sessionmaker(app_db, class_=AsyncSession, expire_on_commit=False),
+    )
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "dora", "x")
+            s = await crud.create_session(db, "old trip", user_id=user.id)
+            old = datetime(2026, 1, 1)
+            await db.execute(
+                insert(Message.__table__),
+                [
+                    {"session_id": s.id, "role": "user", "content": "Where is the best gelato?", "created_at": old},
+                    {"session_id": s.id, "role": "assistant", "content": "Gelato in Bologna", "created_at": old},
+                ],
+            )
+            await db.commit()
+            await crud.create_message(db, s.id, "user", "more gelato please")
+        moved = await archiver.archive_once(now=datetime(2026, 6, 1))
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'dora'})}"}
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            found = (await ac.get("/api/search", params={"q": "gelato"}, headers=headers)).json()
+            archived_only = (await ac.get("/api/search", params={"q": "Bologna"}, headers=headers)).json()
+        return moved, found, archived_only
+
+    moved, found, archived_only = asyncio.run(run())
+    assert moved == 2
+    assert len(found["results"]) == 3  # archived and hot messages ranked together
+    hit, = archived_only["results"]
+    assert hit["role"] == "assistant" and hit["session_name"] == "old trip"
+    assert hit["snippet"] == "Gelato in <mark>Bologna</mark>"
@@ -0,0 +1,273 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, history, llm_service, main, semantic
+from app.archive import MessageArchiver
+from app.auth import create_access_token
+from app.history import TRUNCATED_MARK, estimate_tokens, record_turn
+from app.models import Message
+from app.semantic import SemanticIndex
+from app.vectorindex import VectorIndex
+
+
+def _index(engine, tmp_path, **kwargs) -> SemanticIndex:
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    return SemanticIndex(directory=str(tmp_path / "index"), session_factory=factory, enabled=True, **kwargs)
+
+
+def test_paraphrased_first_prompt_served_from_semantic_cache(app_db, tmp_path, monkeypatch, use_fake_ollama):
+    stats = use_fake_ollama().state.stats
+    index = _index(app_db, tmp_path)
+    monkeypatch.setattr(main, "semantic_index", index)
+    monkeypatch.setattr(semantic, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(semantic, "SEMANTIC_CACHE_THRESHOLD", 0.9)
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "alice", "x")
+            first, second, third = [(await crud.create_session(db, n, user_id=user.id)).id for n in "abc"]
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            async def ask(session_id, prompt):
+                r = await client.post("/api/chat", json={"prompt": prompt, "session_id": session_id}, headers=headers)
+                assert r.status_code == 200
+                return r.json()["response"]
+
+            answer = await ask(first, "What is the capital of France?")
+            await index.sync(user.id)
+            calls = stats["requests"]
+            cached = await ask(second, "what is the capital of france please")
+            served_without_llm = stats["requests"] == calls
+            await ask(third, "How tall is Mount Everest?")  # unrelated: goes to the model
+            # a follow-up depends on its conversation, so it is never answered from the cache
+            await ask(second, "what is the capital of france please")
+        async with AsyncSession(app_db) as db:
+            stored = await crud.get_messages(db, second)
+        await index.stop()
+        return answer, cached, served_without_llm, stored
+
+    answer, cached, served_without_llm, stored = asyncio.run(run())
+    assert cached == answer and served_without_llm
+    assert [m.content for m in stored[:2]] == ["what is the capital of france please", answer]
+    assert stats["requests"] == 3
+    assert index.stats()["cache_hits"] == 1 and index.stats()["cache_misses"] == 2
+
+
+def test_retrieval_brings_back_relevant_old_messages(engine, tmp_path, monkeypatch, use_fake_ollama):
+    use_fake_ollama()
+    monkeypatch.setattr(semantic, "HISTORY_TOKEN_BUDGET", 400)
+    monkeypatch.setattr(semantic, "HISTORY_RETRIEVAL_RECENT_TOKENS", 150)
+    index = _index(engine, tmp_path)
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "bob", "x")
+            s = await crud.create_session(db, "long", user_id=user.id)
+            await record_turn(db, s.id, "My dog is called Biscuit and loves the beach", "Biscuit sounds like a happy dog")
+            for turn in range(30):
+                await record_turn(db, s.id, f"Question {turn} about tomorrow's weather forecast in town", f"Answer {turn}: mild")
+            await index.sync(user.id)
+            prompt = "What is my dog called?"
+            plain = await history.build_context(db, s.id, prompt, budget=400)
+            retrieved = await index.build_context(db, user.id, s.id, prompt)
+
+            broken = _index(engine, tmp_path / "broken", embed=_failing_embed)
+            broken._indexes[user.id] = index._indexes[user.id]
+            fallback = await broken.build_context(db, user.id, s.id, prompt)
+        return plain, retrieved, fallback
+
+    plain, retrieved, fallback = asyncio.run(run())
+    assert not any("Biscuit" in m["content"] for m in plain)
+    note = retrieved[0]
+    assert note["role"] == "system" and note["content"].startswith("Relevant earlier messages")
+    assert "user: My dog is called Biscuit" in note["content"]
+    assert retrieved[-1]["content"] == "Answer 29: mild"  # recent turns still verbatim, oldest first
+    assert sum(estimate_tokens(m["content"]) for m in retrieved) <= 400
+    assert fallback == plain  # embedding outage: recent history only
+    assert index.stats()["retrievals"] == 1
+
+
+async def _failing_embed(text):
+    raise httpx.ConnectError("embedding model unavailable")
+
+
+def test_index_persists_incrementally_and_reloads(engine, tmp_path, use_fake_ollama):
+    stats = use_fake_ollama().state.stats
+
+    numbers = iter(range(1000))
+
+    async def add_turns(session_id, n):
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            for _ in range(n):
+                i = next(numbers)
+                await crud.create_message_pair(db, session_id, f"prompt number {i}", f"reply number {i}")
+
+    def segments():
+        return sorted(p.name for p in (tmp_path / "index" / f"user-{uid}").iterdir())
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "carol", "x")
+            s = await crud.create_session(db, "s", user_id=user.id)
+        await add_turns(s.id, 10)
+        first = _index(engine, tmp_path, max_segments=3)
+        added = await first.sync(user.id)
+        await first.stop()
+        return user.id, s.id, added
+
+    uid, sid, added = asyncio.run(run())
+    assert added == 20 and segments() == ["00000000.base.npz"]
+
+    async def restart(turns, model=llm_service.OLLAMA_EMBED_MODEL):
+        await add_turns(sid, turns)
+        index = _index(engine, tmp_path, max_segments=3, model=model)
+        before = stats["embeddings"]
+        n = await index.sync(uid)
+        await index.stop()
+        return n, stats["embeddings"] - before
+
+    # only the new messages are embedded after a restart, and appended as a small segment
+    assert asyncio.run(restart(2)) == (4, 4)
+    assert segments() == ["00000000.base.npz", "00000001.npz"]
+    assert asyncio.run(restart(1)) == (2, 2)
+    assert asyncio.run(restart(1)) == (2, 2)  # third segment: compacted into a new base
+    assert segments() == ["00000003.base.npz"]
+
+    loaded = VectorIndex.load(tmp_path / "index" / f"user-{uid}", llm_service.OLLAMA_EMBED_MODEL)
+    assert len(loaded) == 28 and loaded.max_id == 28
+
+    # another embedding model: vectors are not comparable, so the index is rebuilt from scratch
+    assert asyncio.run(restart(1, model="other-embedder")) == (30, 30)
+    assert VectorIndex.load(tmp_path / "index" / f"user-{uid}", llm_service.OLLAMA_EMBED_MODEL) is None
+
+
+def test_vector_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(3000, 32)).astype(np.float32)
+    sessions = rng.integers(1, 20, size=3000)
+    roles = ["user" if i % 2 else "assistant" for i in range(3000)]
+    index = VectorIndex(32, capacity=4)
+    for start in range(0, 3000, 250):  # grows by doubling as turns arrive
+        stop = start + 250
+        index.add(list(range(start + 1, stop + 1)), sessions[start:stop], roles[start:stop], vectors[start:stop])
+    query = rng.normal(size=32)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    assert [i for i, _ in index.search(query, 5)] == list(np.argsort(-scores)[:5] + 1)
+
+    mask = (sessions == 7) & (np.arange(3000) % 2 == 1)
+    expected = np.flatnonzero(mask)[np.argsort(-scores[mask])[:3]] + 1
+    hits = index.search(query, 3, session_id=7, role="user")
+    assert [i for i, _ in hits] == list(expected)
+    assert hits[0][1] >= hits[1][1] >= hits[2][1]
+    assert index.search(query, 3, min_score=1.01) == []
+
+
+def test_sync_indexes_archived_messages_with_bounded_embeddings(engine, tmp_path):
+    in_flight = peak = 0
+
+    async def slow_embed(text):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return [1.0, float(len(text))]
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "erin", "x")
+            s = await crud.create_session(db, "s", user_id=user.id)
+            for i in range(10):
+                await crud.create_message_pair(db, s.id, f"prompt {i}", f"reply {i}")
+        archiver = MessageArchiver(
+            after_days=0.001, inactive_days=0,
+            session_factory=sessionmaker(engine, class_=AsyncSession, expire_on_commit=False),
+        )
+        archived = await archiver.archive_once(now=datetime.utcnow() + timedelta(days=1))
+        index = _index(engine, tmp_path, embed=slow_embed, sync_batch=8, embed_concurrency=3)
+        added = await index.sync(user.id)
+        await index.stop()
+        return archived, added
+
+    archived, added = asyncio.run(run())
+    # everything but the newest row was archived before the index existed
+    assert archived == 19 and added == 20
+    assert peak == 2  # one of the three slots stays free for request handlers
+
+
+def test_request_embedding_does_not_wait_for_background_catch_up(engine, tmp_path):
+    release = None
+
+    async def embed(text):
+        if text.startswith("old"):
+            await release.wait()
+        return [1.0, float(len(text))]
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "heidi", "x")
+            s = await crud.create_session(db, "s", user_id=user.id)
+            for i in range(8):
+                await crud.create_message_pair(db, s.id, f"old prompt {i}", f"old reply {i}")
+        index = _index(engine, tmp_path, embed=embed, embed_concurrency=2)
+        sync = asyncio.create_task(index.sync(user.id))
+        await asyncio.sleep(0.05)  # the catch-up batch is now queued on the embedding slots
+        await asyncio.wait_for(index.embed_text("new prompt"), timeout=1)
+        release.set()
+        added = await sync
+        await index.stop()
+        return added
+
+    assert asyncio.run(run()) == 16
+
+
+def test_truncated_answer_is_never_served_from_the_cache(engine, tmp_path, use_fake_ollama):
+    use_fake_ollama()
+    index = _index(engine, tmp_path)
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "frank", "x")
+            s = await crud.create_session(db, "cut off", user_id=user.id)
+            await crud.create_message_pair(db, s.id, "What is the capital of France?", "The capital is" + TRUNCATED_MARK)
+            added = await index.sync(user.id)
+            hit = await index.lookup_answer(db, user.id, "what is the capital of france please")
+        await index.stop()
+        return added, hit
+
+    added, hit = asyncio.run(run())
+    assert added == 1  # the prompt, not the cut-off answer
+    assert hit is None and index.stats()["cache_misses"] == 1
+
+
+def test_sync_picks_up_ids_committed_out_of_order(engine, tmp_path, use_fake_ollama):
+    use_fake_ollama()
+    index = _index(engine, tmp_path)
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "grace", "x")
+            s = await crud.create_session(db, "late", user_id=user.id)
+            # id 7 was handed out first but its transaction commits after id 8's
+            db.add(Message(id=8, session_id=s.id, role="user", content="committed first"))
+            await db.commit()
+            first = await index.sync(user.id)
+            embeddings = index.embeddings
+            db.add(Message(id=7, session_id=s.id, role="user", content="committed late"))
+            await db.commit()
+            second = await index.sync(user.id)
+        await index.stop()
+        return first, second, index.embeddings - embeddings, index._indexes[user.id]
+
+    first, second, embedded, loaded = asyncio.run(run())
+    assert (first, second, embedded) == (1, 1, 1)
+    assert sorted(loaded._ids[: loaded.size].tolist()) == [7, 8] and loaded.max_id == 8
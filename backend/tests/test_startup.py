@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.bench_startup import BACKEND_DIR, parse_importtime
+
+# heavy or optional modules that must not load just because the app was imported
+LAZY = ("jose", "passlib", "argon2", "sendgrid", "numpy")
+
+
+def test_importing_the_app_stays_lean():
+    probe = (
+        "import sys, app.main, app.db as db; "
+        f"print([m for m in {LAZY!r} if m in sys.modules]); print(db._engine is None)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, env=dict(os.environ), capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.split() == ["[]", "True"]
+    modules = parse_importtime(out.stderr)
+    assert "app.main" in modules and modules["app.main"][1] >= modules["app.db"][1]
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import httpx
+
+from app import llm_service
+
+
+def _install(monkeypatch, pieces):
+    """Fake Ollama whose streamed body arrives as the given byte pieces (floats are pauses)."""
+
+    async def body():
+        for piece in pieces:
+            if isinstance(piece, float):
+                await asyncio.sleep(piece)
+            else:
+                yield piece
+
+    def handler(request):
+        return httpx.Response(200, content=body())
+
+    client = httpx.AsyncClient(base_url="http://fake", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm_service, "_client", client)
+
+
+def _line(content=None, done=False) -> bytes:
+    evt = {"done": done}
+    if content is not None:
+        evt["message"] = {"role": "assistant", "content": content}
+    return (json.dumps(evt, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _collect(**kwargs):
+    async def run():
+        return [f async for f in llm_service.stream_chat_bytes("hi", **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_lines_split_across_reads(monkeypatch):
+    raw = _line("hé") + _line("llo") + _line(done=True)
+    # cut inside the multi-byte é and inside the second line
+    _install(monkeypatch, [raw[:27], raw[27:40], raw[40:]])
+    frames = _collect(frame_max_delay=0)
+    assert b"".join(frames).decode("utf-8") == "héllo"
+
+
+def test_coalesces_after_first_chunk(monkeypatch):
+    _install(monkeypatch, [_line(f"t{i} ") for i in range(10)] + [_line(done=True)])
+    frames = _collect(frame_bytes=1024, frame_max_delay=0.5)
+    assert frames[0] == b"t0 "
+    assert b"".join(frames) == b"".join(f"t{i} ".encode() for i in range(10))
+    assert len(frames) < 10
+
+
+def test_stall_flushes_pending_frame(monkeypatch):
+    _install(monkeypatch, [_line("a"), _line("b"), 0.2, _line("c"), _line(done=True)])
+    frames = _collect(frame_bytes=1024, frame_max_delay=0.02)
+    assert frames == [b"a", b"b", b"c"]
+
+
+def test_pass_through_is_verbatim(monkeypatch):
+    raw = [_line("x"), _line(done=True)]
+    _install(monkeypatch, raw)
+    assert b"".join(_collect(pass_through=True)) == b"".join(raw)
@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main
+from app.auth import create_access_token
+from app.scheduler import scheduler
+from app.streams import StreamGone, StreamRegistry
+from app.writebehind import message_writer
+
+
+class SlowUpstream:
+    """Stands in for stream_chat_bytes; records calls and whether the upstream stream was closed early."""
+
+    def __init__(self, frames: int = 20, delay: float = 0.01):
+        self.frames = frames
+        self.delay = delay
+        self.calls = 0
+        self.produced = 0
+        self.closed_early = False
+
+    async def __call__(self, prompt, history=None, model=None, pass_through=False):
+        self.calls += 1
+        try:
+            for i in range(self.frames):
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield f"part{i} ".encode()
+        except BaseException:
+            self.closed_early = True
+            raise
+
+    @property
+    def answer(self) -> bytes:
+        return b"".join(f"part{i} ".encode() for i in range(self.frames))
+
+
+async def post_then_disconnect(path: str, body: dict, after_bytes: int, token: str = "") -> tuple[dict, bytes]:
+    """POST straight to the ASGI app and hang up once `after_bytes` of the body have arrived."""
+    gone = asyncio.Event()
+    sent = False
+    headers: dict = {}
+    received = b""
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.start":
+            headers.update({k.decode(): v.decode() for k, v in message["headers"]})
+        elif message["type"] == "http.response.body":
+            received += message.get("body", b"")
+            if len(received) >= after_bytes:
+                gone.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json"), (b"host", b"test")]
+        + ([(b"authorization", f"Bearer {token}".encode())] if token else []),
+        "client": ("127.0.0.1", 1234), "server": ("test", 80),
+    }
+    await main.app(scope, receive, send)
+    return headers, received
+
+
+def test_reconnect_resumes_without_regenerating(app_db, monkeypatch):
+    upstream = SlowUpstream()
+    registry = StreamRegistry(grace=5)
+    monkeypatch.setattr(main, "stream_chat_bytes", upstream)
+    monkeypatch.setattr(main, "stream_registry", registry)
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "resumer", "x")
+            await crud.create_user(db, "snooper", "x")
+            s = await crud.create_session(db, "resume", user_id=user.id)
+        auth = {"Authorization": f"Bearer {create_access_token({'sub': 'resumer'})}", "Origin": "http://app.example"}
+        headers, first = await post_then_disconnect(
+            "/api/chat/stream", {"prompt": "go", "session_id": s.id}, 10, create_access_token({"sub": "resumer"})
+        )
+        stream_id = headers["x-stream-id"]
+        await asyncio.sleep(0.03)
+        detached = registry.stats()["detached"]
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            anonymous = await ac.get(f"/api/chat/stream/{stream_id}", params={"offset": len(first)})
+            other = await ac.get(
+                f"/api/chat/stream/{stream_id}",
+                params={"offset": len(first)},
+                headers={"Authorization": f"Bearer {create_access_token({'sub': 'snooper'})}"},
+            )
+            rest = await ac.get(f"/api/chat/stream/{stream_id}", params={"offset": len(first)}, headers=auth)
+            again = await ac.get(f"/api/chat/stream/{stream_id}", params={"offset": 0}, headers=auth)
+            beyond = await ac.get(f"/api/chat/stream/{stream_id}", params={"offset": 10_000}, headers=auth)
+            unknown = await ac.get("/api/chat/stream/nope")
+        await message_writer.stop()
+        async with AsyncSession(app_db) as db:
+            stored = [(m.role, m.content) for m in await crud.get_messages(db, s.id)]
+        await registry.stop()
+        return first, detached, anonymous, other, rest, again, beyond, unknown, stored
+
+    first, detached, anonymous, other, rest, again, beyond, unknown, stored = asyncio.run(run())
+    assert 10 <= len(first) < len(upstream.answer) and detached == 1
+    assert anonymous.status_code == 401 and other.status_code == 404  # only the session's owner may resume
+    assert {"X-Stream-Id", "X-Stream-Offset"} <= set(rest.headers["access-control-expose-headers"].split(", "))
+    assert rest.status_code == 200 and rest.headers["x-stream-offset"] == str(len(first))
+    assert first + rest.content == upstream.answer
+    assert again.content == upstream.answer  # finished streams stay readable for a while
+    assert upstream.calls == 1 and not upstream.closed_early
+    assert beyond.status_code == 416 and unknown.status_code == 404
+    assert stored == [("user", "go"), ("assistant", upstream.answer.decode())]
+    assert registry.stats()["resumes"] == 2 and registry.stats()["abandoned"] == 0
+
+
+def test_abandoned_stream_cancels_upstream(app_db, monkeypatch):
+    upstream = SlowUpstream(frames=200)
+    registry = StreamRegistry(grace=0.05)
+    monkeypatch.setattr(main, "stream_chat_bytes", upstream)
+    monkeypatch.setattr(main, "stream_registry", registry)
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            user = await crud.create_user(db, "leaver", "x")
+            s = await crud.create_session(db, "left", user_id=user.id)
+        headers, first = await post_then_disconnect(
+            "/api/chat/stream", {"prompt": "go", "session_id": s.id}, 1, create_access_token({"sub": "leaver"})
+        )
+        await asyncio.sleep(0.3)
+        await message_writer.stop()
+        async with AsyncSession(app_db) as db:
+            stored = [(m.role, m.content) for m in await crud.get_messages(db, s.id)]
+        return headers["x-stream-id"], stored
+
+    stream_id, stored = asyncio.run(run())
+    # what was generated before the cancel is kept, marked as cut off
+    assert stored[0] == ("user", "go") and stored[1][1].endswith(main.TRUNCATED_MARK)
+    assert stored[1][1].startswith("part0 ")
+    assert upstream.closed_early and upstream.produced < 50
+    assert registry.stats()["abandoned"] == 1 and registry.stats()["live"] == 0
+    assert scheduler.stats()["active"] == 0  # the slot went back when the generation was cancelled
+    assert registry.get(stream_id).abandoned
+
+
+def test_buffers_are_capped_and_reclaimed():
+    async def run():
+        registry = StreamRegistry(grace=5, retain=0.05, max_bytes=40, max_total_bytes=100)
+
+        async def produce(generation):
+            for _ in range(10):
+                generation.write(b"0123456789")
+
+        finished = registry.start(produce)
+        await asyncio.sleep(0)
+        # only the newest 40 bytes of 100 are kept; earlier offsets can no longer be resumed
+        assert (finished.base, finished.size, finished.buffered) == (60, 100, 40)
+        with pytest.raises(StreamGone) as gone:
+            registry.resume(finished.id, 0)
+        assert gone.value.status_code == 410
+        tail = [chunk async for chunk in registry.resume(finished.id, 75)]
+        assert b"".join(tail) == b"56789" + b"0123456789" * 2
+
+        release = asyncio.Event()
+
+        async def hold(generation):
+            for _ in range(8):
+                generation.write(b"x" * 10)
+            await release.wait()
+
+        for _ in range(2):
+            registry.start(hold)
+        await asyncio.sleep(0)
+        # over the global cap: the finished generation goes first, then live buffers are trimmed
+        assert registry.buffered_bytes <= 100 and finished.id not in registry._generations
+        assert registry.stats()["evicted"] == 1 and registry.stats()["trimmed_bytes"] > 0
+        release.set()
+        await asyncio.sleep(0.1)
+        stats = registry.stats()
+        assert stats["live"] == stats["finished"] == 0 and stats["expired"] == 2 and registry.buffered_bytes == 0
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["reclaimed_bytes"] > 0
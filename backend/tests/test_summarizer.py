@@ -0,0 +1,110 @@
+import asyncio
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.history import build_context, estimate_tokens, record_turn
+from app.summarizer import ConversationSummarizer
+
+
+class StubLLM:
+    """Summary = previous summary + one short line per folded batch; records every call."""
+
+    def __init__(self):
+        self.calls: list[tuple] = []
+
+    async def __call__(self, previous, messages):
+        self.calls.append((previous, [m["content"] for m in messages]))
+        first, last = messages[0]["content"].split()[1], messages[-1]["content"].split()[1]
+        lines = (previous.splitlines() if previous else [])[-4:]  # a real model keeps it bounded too
+        return "\n".join(lines + [f"talked about {first}..{last}"])
+
+
+def test_prompt_size_stays_bounded_as_session_grows(engine):
+    stub = StubLLM()
+    summarizer = ConversationSummarizer(
+        summarize=stub,
+        trigger_tokens=400,
+        keep_recent=4,
+        session_factory=lambda: AsyncSession(engine, expire_on_commit=False),
+    )
+
+    async def run():
+        sizes = []
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            s = await crud.create_session(db, "long")
+            for turn in range(120):
+                await record_turn(db, s.id, f"question {turn} " + "q" * 160, f"answer {turn} " + "a" * 320)
+                summarizer.notify(s.id)
+                await summarizer.run_pending()
+                # a huge budget: only the summary keeps the prompt small
+                context = await build_context(db, s.id, "next?", budget=10**9)
+                sizes.append(sum(estimate_tokens(m["content"]) for m in context))
+            summary = await crud.get_summary(db, s.id)
+            return s.id, sizes, context, summary
+
+    sid, sizes, context, summary = asyncio.run(run())
+
+    # grows at first, then stays flat no matter how long the session gets
+    assert max(sizes[40:]) <= max(sizes[:40]) + 50 < 400 + 4 * 120 + 100
+    assert sizes[-1] <= max(sizes[60:80])
+
+    assert context[0]["role"] == "system" and context[0]["content"].endswith(summary.content)
+    assert "answer 119" in context[-1]["content"]
+    assert all("question 0 " not in m["content"] for m in context[1:])
+
+    # incremental: every message was folded exactly once, oldest first, and never re-summarized
+    folded = [c for _, batch in stub.calls for c in batch]
+    assert len(folded) == len(set(folded)) == summary.messages
+    assert folded[0].startswith("question 0 ") and [c.split()[1] for c in folded[::2]] == [
+        str(i) for i in range(len(folded) // 2)
+    ]
+    assert all(prev is None for prev, _ in stub.calls[:1]) and all(prev for prev, _ in stub.calls[1:])
+    assert summarizer.stats()["folded_messages"] == summary.messages
+    assert 2 * 120 - summary.messages < 4 + 400 // 40  # only the recent window and one batch are verbatim
+
+
+def test_below_threshold_nothing_is_summarized(engine):
+    stub = StubLLM()
+    summarizer = ConversationSummarizer(
+        summarize=stub, trigger_tokens=10_000, session_factory=lambda: AsyncSession(engine, expire_on_commit=False)
+    )
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            s = await crud.create_session(db, "short")
+            await record_turn(db, s.id, "question 1", "answer 1")
+            folded = await summarizer.compact(s.id)
+            return folded, await crud.get_summary(db, s.id)
+
+    assert asyncio.run(run()) == (0, None)
+    assert stub.calls == []
+
+
+def test_long_backlog_is_read_in_batches(engine, monkeypatch):
+    stub = StubLLM()
+    summarizer = ConversationSummarizer(
+        summarize=stub, trigger_tokens=200, keep_recent=4, max_fold_tokens=400, read_batch=10,
+        session_factory=lambda: AsyncSession(engine, expire_on_commit=False),
+    )
+    read = []
+    get_messages = crud.get_messages
+
+    async def counting_get_messages(*args, **kwargs):
+        rows = await get_messages(*args, **kwargs)
+        read.append(len(rows))
+        return rows
+
+    monkeypatch.setattr(crud, "get_messages", counting_get_messages)
+
+    async def run():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            s = await crud.create_session(db, "backlog")
+            for turn in range(50):
+                await crud.create_message_pair(db, s.id, f"question {turn} " + "q" * 80, f"answer {turn} " + "a" * 80)
+            folded = await summarizer.compact(s.id)
+            return folded, await crud.get_summary(db, s.id)
+
+    folded, summary = asyncio.run(run())
+    # one compaction catches up on the whole backlog without loading it at once
+    assert folded == summary.messages and 100 - folded < 4 + 10
+    assert max(read) == 10 + 4 and len(read) > 5
@@ -0,0 +1,149 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlalchemy import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main, transfer
+from app.auth import create_access_token
+from app.models import Message
+
+
+def _headers(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+def test_export_then_import_into_another_account(app_db, monkeypatch):
+    monkeypatch.setattr(transfer, "EXPORT_FETCH_SIZE", 4)  # several partitions even for a small history
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            alice = await crud.create_user(db, "alice", "x")
+            await crud.create_user(db, "bob", "x")
+            first = await crud.create_session(db, "first", user_id=alice.id)
+            second = await crud.create_session(db, "second", user_id=alice.id)
+            start = datetime(2024, 1, 1)
+            await db.execute(
+                insert(Message.__table__),
+                [{"session_id": first.id, "role": "user", "content": f"q{i} é\n\"quoted\"", "created_at": start + timedelta(seconds=i)}
+                 for i in range(25)]
+                + [{"session_id": second.id, "role": "assistant", "content": "only", "created_at": start}],
+            )
+            await db.commit()
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            exported = await ac.get("/api/export", headers=_headers("alice"))
+            imported = await ac.post("/api/import", headers=_headers("bob"), content=exported.content)
+            reexported = await ac.get("/api/export", headers=_headers("bob"))
+            sessions = await ac.get("/api/sessions", headers=_headers("bob"))
+        return exported, imported, reexported, sessions
+
+    exported, imported, reexported, sessions = asyncio.run(run())
+    assert exported.status_code == 200
+    assert exported.headers["content-type"] == "application/x-ndjson"
+    assert "attachment" in exported.headers["content-disposition"]
+    lines = [json.loads(line) for line in exported.text.splitlines()]
+    assert lines[0]["type"] == "export" and lines[0]["user"] == "alice"
+    assert [line["type"] for line in lines[1:]] == ["session"] * 2 + ["message"] * 26
+    assert [m["content"] for m in lines[3:28]] == [f"q{i} é\n\"quoted\"" for i in range(25)]
+
+    assert imported.status_code == 200 and imported.json() == {"imported": {"sessions": 2, "messages": 26}}
+    assert {s["name"] for s in sessions.json()} == {"first", "second"}
+    strip = lambda rows: [{k: v for k, v in r.items() if k not in ("id", "session_id")} for r in rows]
+    again = [json.loads(line) for line in reexported.text.splitlines()]
+    assert strip(again[1:]) == strip(lines[1:])  # same content and timestamps, new ids
+
+
+def test_export_filename_survives_any_username(app_db):
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            await crud.create_user(db, '名前 "x"', "x")
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            return await ac.get("/api/export", headers=_headers('名前 "x"'))
+
+    r = asyncio.run(run())
+    assert r.status_code == 200
+    assert r.headers["content-disposition"] == (
+        "attachment; filename=\"____x_-export.ndjson\"; "
+        "filename*=UTF-8''%E5%90%8D%E5%89%8D%20%22x%22-export.ndjson"
+    )
+
+
+def test_bad_import_writes_nothing(app_db):
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            await crud.create_user(db, "carol", "x")
+        body = b"\n".join([
+            b'{"type": "session", "id": 7, "name": "ok", "created_at": "2024-01-01T00:00:00"}',
+            b'{"type": "message", "session_id": 7, "role": "user", "content": "kept?", "created_at": "2024-01-01T00:00:01"}',
+            b'{"type": "message", "session_id": 8, "role": "user", "content": "orphan", "created_at": "2024-01-01T00:00:02"}',
+        ])
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            bad = await ac.post("/api/import", headers=_headers("carol"), content=body)
+            garbage = await ac.post("/api/import", headers=_headers("carol"), content=b"not json\n")
+            sessions = await ac.get("/api/sessions", headers=_headers("carol"))
+        return bad, garbage, sessions
+
+    bad, garbage, sessions = asyncio.run(run())
+    assert bad.status_code == 400 and "line 3" in bad.json()["detail"]
+    assert garbage.status_code == 400 and "line 1" in garbage.json()["detail"]
+    assert sessions.json() == []
+
+
+def test_import_rejects_odd_ids_and_normalises_timezones(app_db, monkeypatch):
+    monkeypatch.setattr(transfer, "IMPORT_MAX_ROWS", 3)
+    session_line = b'{"type": "session", "id": 1, "name": "tz", "created_at": "2024-01-01T02:00:00+02:00"}'
+
+    def message(n: int) -> bytes:
+        return b'{"type": "message", "session_id": 1, "role": "user", "content": "m%d", "created_at": "2024-01-01T00:00:00Z"}' % n
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as db:
+            await crud.create_user(db, "dave", "x")
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            post = lambda body: ac.post("/api/import", headers=_headers("dave"), content=body)
+            list_id = await post(b'{"type": "session", "id": [1], "name": "x", "created_at": "2024-01-01T00:00:00"}')
+            dict_ref = await post(b"\n".join([session_line, b'{"type": "message", "session_id": {}, "role": "user", "content": "x"}']))
+            too_many = await post(b"\n".join([session_line, message(1), message(2), message(3)]))
+            ok = await post(b"\n".join([session_line, message(1), message(2)]))
+            exported = await ac.get("/api/export", headers=_headers("dave"))
+        return list_id, dict_ref, too_many, ok, exported
+
+    list_id, dict_ref, too_many, ok, exported = asyncio.run(run())
+    assert list_id.status_code == 400 and "line 1" in list_id.json()["detail"]
+    assert dict_ref.status_code == 400 and "line 2" in dict_ref.json()["detail"]
+    assert too_many.status_code == 400 and "line 4" in too_many.json()["detail"]
+    assert ok.status_code == 200 and ok.json() == {"imported": {"sessions": 1, "messages": 2}}
+    rows = [json.loads(line) for line in exported.text.splitlines()[1:]]
+    assert [r["created_at"] for r in rows] == ["2024-01-01T00:00:00"] * 3
+
+
+def test_iter_lines_joins_split_chunks():
+    async def chunks():
+        for part in (b'{"a"', b': 1}\n{"b": 2}\n', b'{"c"', b": 3}"):
+            yield part
+
+    async def collect():
+        return [line async for line in transfer.iter_lines(chunks())]
+
+    assert asyncio.run(collect()) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+def test_iter_lines_refuses_overlong_lines():
+    async def collect(parts, max_line):
+        async def chunks():
+            for part in parts:
+                yield part
+
+        lines = []
+        try:
+            async for line in transfer.iter_lines(chunks(), max_line=max_line):
+                lines.append(line)
+        except transfer.ImportFormatError as e:
+            return lines, e.line
+        return lines, None
+
+    # a body without newlines is refused as soon as it passes the cap, not buffered whole
+    assert asyncio.run(collect([b"ok\n"] + [b"x" * 10] * 1000, max_line=64)) == ([b"ok"], 2)
+    assert asyncio.run(collect([b"ok\n" + b"y" * 100 + b"\nz"], max_line=64)) == ([b"ok"], 2)
+    assert asyncio.run(collect([b"a" * 30, b"b" * 30 + b"\n", b"c"], max_line=64)) == ([b"a" * 30 + b"b" * 30, b"c"], None)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+import httpx
+
+from app import llm_service
+from app.warmup import ModelKeeper
+
+
+def test_keep_alive_sent_with_every_request(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json={"message": {"content": "pong"}, "done": True})
+
+    monkeypatch.setattr(llm_service, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(llm_service, "OLLAMA_KEEP_ALIVE", "300")
+    asyncio.run(llm_service.call_chat("hi"))
+    monkeypatch.setattr(llm_service, "OLLAMA_KEEP_ALIVE", "1h")
+    asyncio.run(llm_service.call_chat("hi"))
+    monkeypatch.setattr(llm_service, "OLLAMA_KEEP_ALIVE", "")
+    asyncio.run(llm_service.call_chat("hi"))
+    assert [p.get("keep_alive") for p in seen] == [300, "1h", None]
+
+
+def test_warmup_makes_first_stream_warm(use_fake_ollama, metric_value, fresh_backend_pool):
+    app = use_fake_ollama(load_delay=0.3)
+    keeper = ModelKeeper(fresh_backend_pool, [llm_service.OLLAMA_MODEL], interval=0)
+    cold = metric_value("llm_time_to_first_chunk_by_load_seconds_count", load="cold")
+    warm = metric_value("llm_time_to_first_chunk_by_load_seconds_count", load="warm")
+
+    async def stream():
+        return b"".join([f async for f in llm_service.stream_chat_bytes("hi")])
+
+    asyncio.run(stream())  # nothing resident yet: pays the load
+    assert metric_value("llm_time_to_first_chunk_by_load_seconds_count", load="cold") == cold + 1
+
+    app.state.loaded.clear()  # "unloaded" while idle
+
+    async def start():
+        await keeper.start(llm_service.get_client)
+        # startup does not wait for the loads
+        started = (keeper.stats()["ready"], app.state.stats["pings"])
+        await keeper.wait_ready()
+        return started
+
+    assert asyncio.run(start()) == (False, 0)
+    assert app.state.stats["pings"] == 1 and keeper.stats()["ping_failures"] == 0
+    assert keeper.stats()["ready"]
+    assert asyncio.run(stream()) == b"tok0 tok1 tok2 "
+    assert metric_value("llm_time_to_first_chunk_by_load_seconds_count", load="cold") == cold + 1
+    assert metric_value("llm_time_to_first_chunk_by_load_seconds_count", load="warm") == warm + 1
+    assert app.state.stats["loads"] == 2
+
+
+def test_keeper_repings_models_about_to_unload(use_fake_ollama, fresh_backend_pool):
+    app = use_fake_ollama(models=("llama3.1:8b", "qwen2:latest"))
+    keeper = ModelKeeper(fresh_backend_pool, ["llama3.1:8b", "qwen2"], keep_alive="10m", margin=60)
+
+    async def run():
+        client = llm_service.get_client()
+        await fresh_backend_pool.check_all(client)
+        await llm_service.call_chat("hi", model="qwen2")  # resident for OLLAMA_KEEP_ALIVE
+        await keeper.ping(client, fresh_backend_pool.backends[0], "llama3.1:8b")
+        app.state.loaded["llama3.1:8b"] -= 590  # ten seconds left, inside the margin
+        await keeper.keep_all(client)
+
+    asyncio.run(run())
+    # one explicit ping, then the keeper refreshed only the expiring model
+    assert app.state.stats["pings"] == 2
+    assert keeper.stats()["resident"] == 2
+    assert app.state.loaded["llama3.1:8b"] - time.monotonic() > 590
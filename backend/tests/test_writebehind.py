@@ -0,0 +1,100 @@
+import asyncio
+from httpx import AsyncClient
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, main
+from app.auth import create_access_token
+from app.writebehind import MessageWriter, message_writer
+
+
+def test_batches_and_flushes_on_stop(engine):
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def run():
+        async with factory() as session:
+            s = await crud.create_session(session, "wb")
+        writer = MessageWriter(batch_size=2, flush_interval=60, session_factory=factory)
+        for i in range(5):
+            writer.submit(s.id, "user", f"m{i}")
+        assert writer.has_pending(s.id)
+        await writer.stop()
+        async with factory() as session:
+            msgs = await crud.get_messages(session, s.id)
+        return writer, [m.content for m in msgs]
+
+    writer, contents = asyncio.run(run())
+    assert contents == [f"m{i}" for i in range(5)]
+    assert writer.batches == 3 and writer.stats()["pending"] == 0
+    assert not writer.has_pending(1)
+
+
+def test_unwritable_row_does_not_block_the_queue(engine):
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def run():
+        async with factory() as session:
+            s = await crud.create_session(session, "poison")
+        writer = MessageWriter(batch_size=10, flush_interval=60, max_attempts=2, session_factory=factory)
+        writer.submit(s.id, "user", None)  # NOT NULL: the database never accepts it
+        writer.submit(s.id, "user", "after the bad row")
+        first = await writer.flush()
+        writer.submit(s.id, "user", "later")
+        second = await writer.flush()
+        await writer.stop()
+        async with factory() as session:
+            msgs = await crud.get_messages(session, s.id)
+        return writer, first, second, [m.content for m in msgs]
+
+    writer, first, second, contents = asyncio.run(run())
+    assert (first, second) == (1, 1)
+    assert contents == ["after the bad row", "later"]
+    assert writer.stats()["dropped"] == 1 and writer.stats()["pending"] == 0
+
+
+def test_failing_turn_counts_one_attempt_per_flush_and_drops_whole(engine):
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def run():
+        async with factory() as session:
+            s = await crud.create_session(session, "turns")
+        writer = MessageWriter(batch_size=3, flush_interval=60, max_attempts=2, session_factory=factory)
+        writer.submit_turn(s.id, "kept with its answer?", None)
+        for i in range(6):
+            writer.submit(s.id, "user", f"m{i}")
+        await writer.flush()
+        after_first = writer.stats()
+        writer.submit_turn(s.id, "q", "a")
+        await writer.flush()
+        await writer.stop()
+        async with factory() as session:
+            msgs = await crud.get_messages(session, s.id)
+        return after_first, writer.stats(), [(m.role, m.content) for m in msgs]
+
+    after_first, stats, stored = asyncio.run(run())
+    # retried in several batches of the first flush, but that is one failed flush, not max_attempts
+    assert after_first["pending"] == 2 and after_first["dropped"] == 0 and after_first["rows_written"] == 6
+    assert stats["pending"] == 0 and stats["dropped"] == 2
+    assert stored == [("user", f"m{i}") for i in range(6)] + [("user", "q"), ("assistant", "a")]
+
+
+def test_streamed_turn_is_persisted(app_db, monkeypatch):
+    async def fake_stream_chat_bytes(prompt, history=None, model=None, pass_through=False):
+        for part in (b"stre", b"amed"):
+            yield part
+
+    monkeypatch.setattr(main, "stream_chat_bytes", fake_stream_chat_bytes)
+
+    async def run():
+        async with AsyncSession(app_db, expire_on_commit=False) as session:
+            user = await crud.create_user(session, "streamer", "x")
+            s = await crud.create_session(session, "stream", user_id=user.id)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'streamer'})}"}
+        async with AsyncClient(app=main.app, base_url="http://test") as ac:
+            r = await ac.post("/api/chat/stream", json={"prompt": "go", "session_id": s.id}, headers=headers)
+        assert r.text == "streamed"
+        await message_writer.stop()
+        async with AsyncSession(app_db) as session:
+            return [(m.role, m.content) for m in await crud.get_messages(session, s.id)]
+
+    assert asyncio.run(run()) == [("user", "go"), ("assistant", "streamed")]
@@ -1,24 +1,11 @@
 #!/usr/bin/env bash
-# Simple PostgreSQL backup helper using pg_dump
+# Online database backup (SQLite or PostgreSQL); see backend/app/backup.py
+#   scripts/backup_db.sh                      back up DATABASE_URL into ./backups and rotate
+#   scripts/backup_db.sh verify <backup>      check the checksum and that it restores
 set -e
-BACKUP_DIR=${BACKUP_DIR:-backups}
-mkdir -p "$BACKUP_DIR"
-TS=$(date -u +"%Y%m%dT%H%M%SZ")
-
-if [ -z "$DATABASE_URL" ]; then
-  if [ -f backend/.env ]; then
-    export $(grep -v '^#' backend/.env | xargs)
-  fi
+export BACKUP_DIR=${BACKUP_DIR:-$PWD/backups}
+cd "$(dirname "$0")/../backend"
+if [ $# -eq 0 ]; then
+  set -- create
 fi
-
-if [ -z "$DATABASE_URL" ]; then
-  echo "DATABASE_URL is not set. Set it in environment or backend/.env"
-  exit 1
-fi
-
-# Convert asyncpg URL to psql-friendly URL
-PG_URL=$(echo "$DATABASE_URL" | sed 's/+asyncpg//')
-
-pg_dump "$PG_URL" -Fc -f "$BACKUP_DIR/backup-$TS.dump"
-
-echo "Backup saved to $BACKUP_DIR/backup-$TS.dump"
+exec python -m app.backup "$@"